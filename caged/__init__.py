@@ -0,0 +1 @@
+from caged.estatisticas import AgregadoParcial, Estatistica, EstatisticasChave, combinar_agregados
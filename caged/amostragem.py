@@ -0,0 +1,293 @@
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from statistics import NormalDist
+
+from caged.erros import RegistroErros
+from caged.estatisticas import AgregadoParcial
+from caged.fatias import dividir_arquivos
+from caged.nucleo import format_string
+from caged.perfil import Perfil, combinar_perfis
+
+# Modo aproximado (--amostragem TAXA): em vez de ler todos os bytes, cada arquivo é dividido em blocos
+# de BLOCO_AMOSTRA bytes alinhados em quebras de linha (as mesmas fatias da execução exata, só que
+# pequenas) e só uma fração dos blocos de cada mês é lida, em ordem aleatória (reprodutível com a
+# semente). Cada mês é um estrato: a amostra de um mês não depende dos outros e as saídas continuam
+# por mês. Os blocos sorteados passam pelo mesmo núcleo (caged.nucleo) da execução exata, então as
+# regras, os motores e os erros são os mesmos.
+#
+# Cada média das saídas é a razão entre a soma dos valores e a contagem de linhas nos blocos sorteados
+# (estimador de razão por conglomerados). A variância vem da variação entre os blocos, com correção de
+# população finita, e o intervalo de confiança (CONFIANCA) é o da aproximação normal. O tamanho
+# efetivo da amostra é o número de linhas amostradas da média dividido pelo efeito do desenho (a
+# variância da amostra por blocos sobre a de uma amostra aleatória simples com as mesmas linhas):
+# linhas do mesmo bloco parecidas entre si valem menos que linhas independentes.
+#
+# Com --erro-alvo, a amostra de cada mês cresce em rodadas (mais uma fração TAXA dos blocos por rodada)
+# até que o intervalo da média salarial geral de toda chave com ao menos MINIMO_LINHAS linhas amostradas
+# tenha meia largura de no máximo erro_alvo da média, ou até que todos os blocos do mês sejam lidos.
+# Com todos os blocos, as médias são as exatas e os intervalos têm largura zero. Uma média vista em menos
+# de dois blocos sorteados fica sem intervalo (colunas em branco, tamanho efetivo 0) e, no refinamento,
+# conta como erro infinito.
+#
+# Amostrar linhas soltas exigiria ler todos os bytes, então a unidade é o bloco; blocos menores deixam a
+# amostra mais próxima de uma amostra de linhas. Chaves que não aparecem nos blocos sorteados ficam fora
+# das saídas. Os arquivos compactados e as entradas do armazenamento colunar não são divididos em blocos:
+# cada um é um bloco único
+
+BLOCO_AMOSTRA = 1024 * 1024
+CONFIANCA = 0.95
+MINIMO_LINHAS = 30
+
+_Z = NormalDist().inv_cdf(0.5 + CONFIANCA / 2)
+
+
+# Colunas extras das saídas no modo aproximado: intervalo de confiança e tamanho efetivo de cada média,
+# e a fração dos blocos do mês que foi lida
+def colunas_intervalos(nomes_faixas):
+    colunas = []
+    for media in ['media_salarial_geral', *nomes_faixas, 'media_idade_geral']:
+        colunas.extend([f'{media}_ic_inf', f'{media}_ic_sup', f'{media}_n_efetivo'])
+    return colunas + ['fracao_blocos']
+
+
+# Somas por bloco de uma média (x: linhas do bloco, y: soma dos valores do bloco), das quais saem a
+# razão e a variância entre blocos, e em quantos blocos a média apareceu
+class EstimativaRazao:
+    __slots__ = ('blocos', 'soma_x', 'soma_y', 'soma_x2', 'soma_y2', 'soma_xy')
+
+    def __init__(self):
+        self.blocos = 0
+        self.soma_x = 0
+        self.soma_y = 0.0
+        self.soma_x2 = 0
+        self.soma_y2 = 0.0
+        self.soma_xy = 0.0
+
+    def adicionar_bloco(self, estatistica):
+        x, y = estatistica.n, estatistica.soma
+        self.blocos += 1
+        self.soma_x += x
+        self.soma_y += y
+        self.soma_x2 += x * x
+        self.soma_y2 += y * y
+        self.soma_xy += x * y
+
+    # Intervalo de confiança e tamanho efetivo da média, com m de n_blocos blocos do mês lidos.
+    # `estatistica` é a estatística da média em todas as linhas amostradas (para a variância entre linhas).
+    # Uma média vista em menos de dois blocos não tem variância entre blocos estimável: o intervalo fica
+    # indefinido (infinito) e o tamanho efetivo é 0, em vez de um intervalo de largura zero
+    def intervalo(self, estatistica, m, n_blocos):
+        razao = self.soma_y / self.soma_x
+        fracao = m / n_blocos
+        if fracao >= 1:
+            return razao, razao, float(self.soma_x)
+        if m < 2 or self.blocos < 2:
+            return -math.inf, math.inf, 0.0
+        residuos = self.soma_y2 - 2 * razao * self.soma_xy + razao * razao * self.soma_x2
+        media_x = self.soma_x / m
+        variancia = (1 - fracao) * max(residuos, 0.0) / ((m - 1) * m * media_x * media_x)
+        margem = _Z * math.sqrt(variancia)
+        if variancia == 0:
+            n_efetivo = float(self.soma_x)
+        else:
+            # Variância de uma amostra aleatória simples de soma_x linhas sobre a da amostra por blocos
+            n_efetivo = (1 - fracao) * estatistica.variancia() / variancia
+        return razao - margem, razao + margem, n_efetivo
+
+
+# Saídas de um mês no modo aproximado: as estatísticas das linhas amostradas (as médias são as razões)
+# e, por dimensão e chave, os valores formatados das colunas de colunas_intervalos
+class AgregadoAmostra(AgregadoParcial):
+    __slots__ = ('intervalos',)
+
+    def __init__(self, agregado, intervalos):
+        super().__init__(agregado.quantis)
+        self.subclasses = agregado.subclasses
+        self.ocupacoes = agregado.ocupacoes
+        self.intervalos = intervalos
+
+
+# Amostra de um mês: os blocos em ordem de sorteio, quantos já foram lidos, o agregado das linhas
+# amostradas e as somas por bloco de cada média de cada chave
+class AmostraMes:
+    __slots__ = ('blocos', 'lidos', 'agregado', 'estimativas', 'erro_relativo', 'concluida')
+
+    def __init__(self, blocos, quantis=False):
+        self.blocos = blocos
+        self.lidos = 0
+        self.agregado = AgregadoParcial(quantis)
+        self.estimativas = {'subclasses': {}, 'ocupacoes': {}}
+        self.erro_relativo = None
+        self.concluida = False
+
+    # Próximos blocos do sorteio: uma fração `taxa` dos blocos do mês (na primeira rodada, ao menos dois,
+    # para que exista variância entre blocos)
+    def proximos(self, taxa):
+        quantidade = math.ceil(taxa * len(self.blocos))
+        if self.lidos == 0:
+            quantidade = max(quantidade, 2)
+        return self.blocos[self.lidos:self.lidos + quantidade]
+
+    # Um bloco que falhou conta como lido e sem linhas, como na execução exata
+    def registrar(self, agregado, nomes_faixas):
+        self.lidos += 1
+        if agregado is None:
+            return
+        self.agregado.combinar(agregado)
+        for dimensao, estimativas in self.estimativas.items():
+            for chave, estatisticas in getattr(agregado, dimensao).items():
+                medias = estimativas.get(chave)
+                if medias is None:
+                    medias = estimativas[chave] = {}
+                for media, estatistica in _medias(estatisticas, nomes_faixas):
+                    estimativa = medias.get(media)
+                    if estimativa is None:
+                        estimativa = medias[media] = EstimativaRazao()
+                    estimativa.adicionar_bloco(estatistica)
+
+    # Maior meia largura relativa do intervalo da média salarial geral entre as chaves com ao menos
+    # MINIMO_LINHAS linhas amostradas (None se nenhuma chave tem linhas suficientes)
+    def avaliar(self, erro_alvo):
+        maior = None
+        for dimensao, estimativas in self.estimativas.items():
+            estatisticas_por_chave = getattr(self.agregado, dimensao)
+            for chave, medias in estimativas.items():
+                estatistica = estatisticas_por_chave[chave].salario
+                if estatistica.n < MINIMO_LINHAS:
+                    continue
+                inferior, superior, _ = medias['media_salarial_geral'].intervalo(estatistica, self.lidos,
+                                                                                len(self.blocos))
+                erro = (superior - inferior) / 2 / abs(estatistica.media()) if estatistica.media() else math.inf
+                if math.isnan(erro):
+                    # Salários não numéricos (nan) deixam a média indefinida: o mês é lido até o fim
+                    erro = math.inf
+                maior = erro if maior is None else max(maior, erro)
+        self.erro_relativo = maior
+        self.concluida = (self.lidos >= len(self.blocos) or erro_alvo is None
+                          or (maior is not None and maior <= erro_alvo))
+
+    def agregado_final(self, nomes_faixas):
+        fracao = f'{self.lidos / len(self.blocos):.4f}'
+        intervalos = {}
+        for dimensao, estimativas in self.estimativas.items():
+            estatisticas_por_chave = getattr(self.agregado, dimensao)
+            valores_dimensao = intervalos[dimensao] = {}
+            for chave, medias in estimativas.items():
+                valores = valores_dimensao[chave] = {}
+                estatisticas = estatisticas_por_chave[chave]
+                for media, estatistica in _medias(estatisticas, nomes_faixas, todas=True):
+                    if estatistica is None:
+                        # Média sem linhas amostradas (0.00 nas saídas, como na execução exata)
+                        valores.update({f'{media}_ic_inf': '', f'{media}_ic_sup': '', f'{media}_n_efetivo': '0.0'})
+                        continue
+                    inferior, superior, n_efetivo = medias[media].intervalo(estatistica, self.lidos, len(self.blocos))
+                    if math.isinf(inferior) or math.isinf(superior):
+                        # Intervalo indefinido (média vista em menos de dois blocos): colunas em branco
+                        valores.update({f'{media}_ic_inf': '', f'{media}_ic_sup': '', f'{media}_n_efetivo': '0.0'})
+                        continue
+                    valores[f'{media}_ic_inf'] = f'{inferior:.2f}'
+                    valores[f'{media}_ic_sup'] = f'{superior:.2f}'
+                    valores[f'{media}_n_efetivo'] = f'{n_efetivo:.1f}'
+                valores['fracao_blocos'] = fracao
+        return AgregadoAmostra(self.agregado, intervalos)
+
+
+# Médias de uma chave com as suas estatísticas: salarial geral, por faixa etária e de idade.
+# Com todas=True, as faixas sem linhas aparecem com estatística None
+def _medias(estatisticas, nomes_faixas, todas=False):
+    yield 'media_salarial_geral', estatisticas.salario
+    for faixa in nomes_faixas:
+        estatistica = estatisticas.faixas.get(faixa)
+        if estatistica is not None or todas:
+            yield faixa, estatistica
+    yield 'media_idade_geral', estatisticas.idade
+
+
+# Tarefa do pool no modo aproximado: o agregado do bloco (None se falhou), o perfil e os erros
+def _tarefa_amostra(bloco, formatted_date, configuracao):
+    from caged.execucao import executar_tarefa
+
+    perfil = Perfil(os.getpid())
+    erros = RegistroErros()
+    return executar_tarefa(bloco, configuracao, perfil, erros=erros), formatted_date, perfil, erros
+
+
+# Função para sortear a ordem dos blocos de cada mês (a mesma com a mesma semente e os mesmos arquivos)
+def sortear_blocos(tarefas, semente=0):
+    por_data = {}
+    for tarefa in tarefas:
+        por_data.setdefault(format_string(tarefa.nome), []).append(tarefa)
+    gerador = random.Random(semente)
+    sorteio = {}
+    for formatted_date in sorted(por_data):
+        blocos = sorted(por_data[formatted_date], key=lambda tarefa: (tarefa.caminho, getattr(tarefa, 'inicio', 0)))
+        gerador.shuffle(blocos)
+        sorteio[formatted_date] = blocos
+    return sorteio
+
+
+# Backend do modo aproximado: lê em rodadas os blocos sorteados dos meses ainda não concluídos (num pool
+# de processos com mais de um trabalhador) e escreve as saídas com os intervalos no fim
+def executar_amostragem(configuracao, entradas, caminhos, perfil, inicio, erros=None):
+    from caged.execucao import _gravar_perfil, executar_tarefa
+
+    if erros is None:
+        erros = RegistroErros()
+    with perfil.etapa('listagem'):
+        blocos = dividir_arquivos(caminhos, configuracao.bloco_amostra, erros)
+        amostras = {formatted_date: AmostraMes(blocos_mes, configuracao.quantis)
+                    for formatted_date, blocos_mes in sortear_blocos(entradas + blocos, configuracao.semente).items()}
+    nomes_faixas = configuracao.nomes_faixas
+    perfis_processos = {}
+    executor = ProcessPoolExecutor(max_workers=configuracao.trabalhadores) if configuracao.trabalhadores > 1 else None
+    try:
+        rodada = 0
+        while True:
+            pendentes = [(formatted_date, bloco) for formatted_date, amostra in amostras.items() if not amostra.concluida
+                         for bloco in amostra.proximos(configuracao.amostragem)]
+            if not pendentes:
+                break
+            rodada += 1
+            perfil.iniciar_etapa('espera')
+            if executor is None:
+                resultados = ((executar_tarefa(bloco, configuracao, perfil, erros=erros), formatted_date, None, None)
+                              for formatted_date, bloco in pendentes)
+            else:
+                resultados = (future.result() for future in as_completed(
+                    [executor.submit(_tarefa_amostra, bloco, formatted_date, configuracao) for formatted_date, bloco in pendentes]))
+            for agregado, formatted_date, perfil_processo, erros_tarefa in resultados:
+                if perfil_processo is not None:
+                    combinar_perfis(perfis_processos, {perfil_processo.processo: perfil_processo})
+                    erros.combinar(erros_tarefa)
+                with perfil.etapa('combinacao'):
+                    amostras[formatted_date].registrar(agregado, nomes_faixas)
+            perfil.encerrar_etapa()
+
+            with perfil.etapa('estimacao'):
+                refinadas = [amostra for amostra in amostras.values() if not amostra.concluida]
+                for amostra in refinadas:
+                    amostra.avaliar(configuracao.erro_alvo)
+            lidos = sum(amostra.lidos for amostra in amostras.values())
+            total = sum(len(amostra.blocos) for amostra in amostras.values())
+            erros_relativos = [amostra.erro_relativo for amostra in refinadas if amostra.erro_relativo is not None]
+            maior = f'{max(erros_relativos):.2%}' if erros_relativos else '-'
+            print(f"Amostragem, rodada {rodada}: {lidos} de {total} blocos ({lidos / total:.1%}), maior erro relativo "
+                  f"{maior}, {sum(not amostra.concluida for amostra in amostras.values())} meses a refinar")
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    with configuracao.criar_escritor(amostras) as escritor:
+        for formatted_date, amostra in amostras.items():
+            with perfil.etapa('escrita'):
+                escritor.concluir(formatted_date, amostra.agregado_final(nomes_faixas))
+
+    resumo = {formatted_date: {'blocos_lidos': amostra.lidos, 'blocos': len(amostra.blocos),
+                               'erro_relativo': amostra.erro_relativo}
+              for formatted_date, amostra in amostras.items()}
+    _gravar_perfil(configuracao, [perfil] + sorted(perfis_processos.values(), key=lambda p: str(p.processo)), 'amostragem',
+                   configuracao.trabalhadores, inicio, erros=erros.como_dict(), amostragem=resumo,
+                   taxa=configuracao.amostragem, erro_alvo=configuracao.erro_alvo, semente=configuracao.semente)
+    return escritor
@@ -0,0 +1,94 @@
+import queue
+import threading
+
+# Leitura antecipada: um iterador de blocos é consumido numa thread separada enquanto o bloco anterior
+# é processado. A fila tem no máximo `profundidade` blocos prontos; quando enche, a thread espera
+# (a memória fica limitada a profundidade + 2 blocos). Descompressão e leitura de disco liberam o GIL,
+# então de fato correm em paralelo com o parse
+
+PROFUNDIDADE = 2
+
+_FIM = object()
+
+
+class _Falha:
+    __slots__ = ('erro',)
+
+    def __init__(self, erro):
+        self.erro = erro
+
+
+# Coloca um item na fila, desistindo se o consumidor já tiver parado
+def _colocar(fila, item, parar):
+    while not parar.is_set():
+        try:
+            fila.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+# Leitura antecipada em andamento: iterador dos blocos lidos pela thread. close() para a thread e espera
+# que ela termine em qualquer estado (antes do primeiro bloco, no meio ou depois do fim), liberando o
+# arquivo e os blocos na fila
+class LeituraAntecipada:
+    __slots__ = ('_fila', '_parar', '_thread', '_encerrada')
+
+    def __init__(self, fila, parar, thread):
+        self._fila = fila
+        self._parar = parar
+        self._thread = thread
+        self._encerrada = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._encerrada:
+            raise StopIteration
+        item = self._fila.get()
+        if item is _FIM:
+            self.close()
+            raise StopIteration
+        if isinstance(item, _Falha):
+            self.close()
+            raise item.erro
+        return item
+
+    def close(self):
+        if self._encerrada:
+            return
+        self._encerrada = True
+        self._parar.set()
+        self._thread.join()
+
+    # Uma leitura abandonada sem close() também para a thread (sem esperar por ela)
+    def __del__(self):
+        self._parar.set()
+
+
+# Função para iterar sobre `blocos` com leitura antecipada. A thread começa a ler imediatamente;
+# um erro na leitura é levantado no consumidor, na posição em que ocorreu.
+# O iterador devolvido deve ser esgotado ou fechado (close) para encerrar a thread
+def antecipar(blocos, profundidade=PROFUNDIDADE):
+    fila = queue.Queue(maxsize=max(profundidade, 1))
+    parar = threading.Event()
+
+    def produzir():
+        item = _FIM
+        try:
+            for bloco in blocos:
+                if not _colocar(fila, bloco, parar):
+                    return
+        except BaseException as e:
+            item = _Falha(e)
+        finally:
+            fechar = getattr(blocos, 'close', None)
+            if fechar is not None:
+                fechar()
+        _colocar(fila, item, parar)
+
+    thread = threading.Thread(target=produzir, name='caged-leitura-antecipada', daemon=True)
+    thread.start()
+    return LeituraAntecipada(fila, parar, thread)
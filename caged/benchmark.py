@@ -0,0 +1,179 @@
+import argparse
+import json
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import sys
+import time
+
+# Benchmark reproduzível dos caminhos de execução (sequencial, MPI, Dask e pool de processos) sobre dados
+# sintéticos. Cada execução roda o script do backend como subprocesso, num diretório com CAGEDMOV_downloads, e mede
+# o tempo de parede, o tempo informado pelo próprio script, linhas/s e o pico de memória residente.
+# Escala forte: mesmos dados, número crescente de processos. Escala fraca: dados crescem com os processos
+#
+#   python -m caged.benchmark --trabalhadores 1 2 4 --mpirun-args "--oversubscribe"
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT_MPI = os.path.join(RAIZ, 'cnaePorData.py')
+SCRIPT_DASK = os.path.join(RAIZ, 'cnaePorDatadex.py')
+SCRIPT_POOL = os.path.join(RAIZ, 'cnaePorPool.py')
+
+CAMINHOS = ('sequencial', 'mpi', 'dask', 'pool')
+
+_TEMPO_SCRIPT = re.compile(r'Tempo de execução: ([0-9.]+) segundos')
+
+
+# Função para gerar (ou reaproveitar) os dados sintéticos. O gerador roda em outro processo: o pico de
+# memória de um filho herda o do processo que o criou, então o benchmark não carrega NumPy nem os dados
+def gerar_dados(diretorio, meses, linhas_por_mes, semente):
+    ambiente = dict(os.environ)
+    ambiente['PYTHONPATH'] = os.pathsep.join(filter(None, [RAIZ, ambiente.get('PYTHONPATH')]))
+    subprocess.run([sys.executable, '-m', 'caged.sintetico', diretorio, '--meses', str(meses),
+                    '--linhas-por-mes', str(linhas_por_mes), '--semente', str(semente)], env=ambiente, check=True)
+    with open(os.path.join(diretorio, 'dados.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+# Função para montar a linha de comando de um caminho com `trabalhadores` processos
+def montar_comando(caminho, trabalhadores, argumentos_script=(), argumentos_mpirun=()):
+    if caminho == 'sequencial':
+        return [sys.executable, '-m', 'caged.execucao', '--backend', 'sequencial', *argumentos_script]
+    if caminho == 'mpi':
+        return ['mpirun', '-n', str(trabalhadores), *argumentos_mpirun, sys.executable, SCRIPT_MPI, *argumentos_script]
+    if caminho == 'dask':
+        return [sys.executable, SCRIPT_DASK, '--workers', str(trabalhadores), *argumentos_script]
+    if caminho == 'pool':
+        return [sys.executable, SCRIPT_POOL, '--trabalhadores', str(trabalhadores), *argumentos_script]
+    raise ValueError(f'Caminho desconhecido: {caminho}')
+
+
+# Função para executar um comando no diretório dos dados. O pico de memória vem do rusage do processo
+# (os.wait4): é o do maior processo da árvore (um rank MPI ou um worker), não a soma entre processos
+def executar(comando, diretorio):
+    shutil.rmtree(os.path.join(diretorio, 'output_caged'), ignore_errors=True)
+    log = os.path.join(diretorio, 'log_CAGEDERRORS.txt')
+    if os.path.exists(log):
+        os.remove(log)
+
+    ambiente = dict(os.environ)
+    ambiente['PYTHONPATH'] = os.pathsep.join(filter(None, [RAIZ, ambiente.get('PYTHONPATH')]))
+    with open(os.path.join(diretorio, 'saida_benchmark.txt'), mode='w+', encoding='utf-8') as saida:
+        inicio = time.perf_counter()
+        processo = subprocess.Popen(comando, cwd=diretorio, env=ambiente, stdout=saida, stderr=subprocess.STDOUT)
+        _, status, uso = os.wait4(processo.pid, 0)
+        parede = time.perf_counter() - inicio
+        processo.returncode = os.waitstatus_to_exitcode(status)
+        saida.seek(0)
+        texto = saida.read()
+
+    if processo.returncode != 0:
+        raise RuntimeError(f"Falha ({processo.returncode}) em {' '.join(comando)}:\n{texto[-2000:]}")
+    tempo_script = _TEMPO_SCRIPT.search(texto)
+    return {
+        'parede_s': parede,
+        'tempo_script_s': float(tempo_script.group(1)) if tempo_script else None,
+        'pico_rss_mb': uso.ru_maxrss / 1024,
+    }
+
+
+# Função para medir um caminho: melhor tempo entre as repetições e maior pico de memória
+def medir(caminho, trabalhadores, diretorio, resumo, repeticoes=1, argumentos_script=(), argumentos_mpirun=()):
+    comando = montar_comando(caminho, trabalhadores, argumentos_script, argumentos_mpirun)
+    execucoes = [executar(comando, diretorio) for _ in range(repeticoes)]
+    melhor = min(execucoes, key=lambda execucao: execucao['tempo_script_s'] or execucao['parede_s'])
+    tempo = melhor['tempo_script_s'] or melhor['parede_s']
+    return {
+        'caminho': caminho,
+        'trabalhadores': trabalhadores,
+        'linhas': resumo['linhas'],
+        'bytes': resumo['bytes'],
+        'tempo_s': tempo,
+        'parede_s': melhor['parede_s'],
+        'linhas_por_s': resumo['linhas'] / tempo if tempo else None,
+        'pico_rss_mb': max(execucao['pico_rss_mb'] for execucao in execucoes),
+        'repeticoes': [execucao['parede_s'] for execucao in execucoes],
+    }
+
+
+# Speedup e eficiência de cada medição em relação à referência do seu caminho (ou ao sequencial)
+def _calcular_escala(medicoes, fraca=False):
+    sequencial = next((medicao for medicao in medicoes if medicao['caminho'] == 'sequencial'), None)
+    for medicao in medicoes:
+        referencia = sequencial
+        if fraca or referencia is None:
+            referencia = min((m for m in medicoes if m['caminho'] == medicao['caminho']), key=lambda m: m['trabalhadores'])
+        if fraca:
+            # Na escala fraca o trabalho cresce com os processos: o ideal é o tempo constante
+            medicao['eficiencia'] = referencia['tempo_s'] / medicao['tempo_s']
+        else:
+            medicao['speedup'] = referencia['tempo_s'] / medicao['tempo_s']
+            medicao['eficiencia'] = medicao['speedup'] / medicao['trabalhadores']
+    return medicoes
+
+
+def escala_forte(args, caminhos, argumentos_script, argumentos_mpirun):
+    diretorio = os.path.join(args.diretorio, 'forte')
+    resumo = gerar_dados(diretorio, args.meses, args.linhas_por_mes, args.semente)
+    medicoes = []
+    for caminho in caminhos:
+        for trabalhadores in ([1] if caminho == 'sequencial' else args.trabalhadores):
+            print(f"[forte] {caminho} com {trabalhadores} processo(s)...", flush=True)
+            medicoes.append(medir(caminho, trabalhadores, diretorio, resumo, args.repeticoes, argumentos_script, argumentos_mpirun))
+    return _calcular_escala(medicoes)
+
+
+def escala_fraca(args, caminhos, argumentos_script, argumentos_mpirun):
+    medicoes = []
+    for trabalhadores in args.trabalhadores:
+        diretorio = os.path.join(args.diretorio, f'fraca-{trabalhadores}')
+        resumo = gerar_dados(diretorio, args.meses, args.linhas_por_mes * trabalhadores, args.semente)
+        for caminho in caminhos:
+            if caminho == 'sequencial':
+                continue
+            print(f"[fraca] {caminho} com {trabalhadores} processo(s), {resumo['linhas']} linhas...", flush=True)
+            medicoes.append(medir(caminho, trabalhadores, diretorio, resumo, args.repeticoes, argumentos_script, argumentos_mpirun))
+    return _calcular_escala(medicoes, fraca=True)
+
+
+# Função para imprimir uma tabela de medições
+def imprimir_tabela(titulo, medicoes):
+    print(f"\n{titulo}")
+    print(f"  {'caminho':<11}{'proc.':>6}{'linhas':>12}{'tempo (s)':>11}{'linhas/s':>13}{'pico RSS (MB)':>15}"
+          f"{'speedup':>9}{'eficiência':>12}")
+    for medicao in medicoes:
+        speedup = f"{medicao['speedup']:.2f}" if 'speedup' in medicao else '-'
+        print(f"  {medicao['caminho']:<11}{medicao['trabalhadores']:>6}{medicao['linhas']:>12}{medicao['tempo_s']:>11.2f}"
+              f"{medicao['linhas_por_s']:>13,.0f}{medicao['pico_rss_mb']:>15.1f}{speedup:>9}{medicao['eficiencia']:>12.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark dos caminhos sequencial, MPI, Dask e pool de processos sobre dados CAGEDMOV sintéticos')
+    parser.add_argument('--diretorio', default='benchmark_caged', help='onde ficam os dados gerados e as saídas')
+    parser.add_argument('--meses', type=int, default=3)
+    parser.add_argument('--linhas-por-mes', type=int, default=500_000,
+                        help='linhas por arquivo (na escala fraca, por arquivo e por processo)')
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--trabalhadores', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--caminhos', choices=CAMINHOS, nargs='+', default=list(CAMINHOS))
+    parser.add_argument('--escala', choices=['forte', 'fraca'], nargs='+', default=['forte', 'fraca'])
+    parser.add_argument('--repeticoes', type=int, default=1, help='execuções por medição (vale a de menor tempo)')
+    parser.add_argument('--script-args', default='', help="argumentos repassados aos scripts, ex.: '--motor vetorizado'")
+    parser.add_argument('--mpirun-args', default='', help="argumentos extras do mpirun, ex.: '--oversubscribe'")
+    parser.add_argument('--saida', default='benchmark_caged.json', help='arquivo JSON com todas as medições')
+    args = parser.parse_args()
+
+    argumentos_script = shlex.split(args.script_args)
+    argumentos_mpirun = shlex.split(args.mpirun_args)
+    relatorio = {'parametros': vars(args)}
+    if 'forte' in args.escala:
+        relatorio['forte'] = escala_forte(args, args.caminhos, argumentos_script, argumentos_mpirun)
+        imprimir_tabela('Escala forte (mesmos dados)', relatorio['forte'])
+    if 'fraca' in args.escala:
+        relatorio['fraca'] = escala_fraca(args, args.caminhos, argumentos_script, argumentos_mpirun)
+        imprimir_tabela('Escala fraca (dados proporcionais ao número de processos)', relatorio['fraca'])
+
+    with open(args.saida, mode='w', encoding='utf-8') as f:
+        json.dump(relatorio, f, indent=1)
+    print(f"\nMedições gravadas em {args.saida}")
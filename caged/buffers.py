@@ -0,0 +1,167 @@
+import numpy as np
+
+from caged.estatisticas import AgregadoParcial, Estatistica, EstatisticasChave
+from caged.quantis import N_BUCKETS, EsbocoQuantis
+
+# Representação densa dos agregados: dadas as listas de chaves de cada dimensão (subclasses e depois
+# ocupações, numa numeração única), as estatísticas viram arrays indexados por código de chave e por
+# estatística (salário, idade e salário em cada faixa etária). É o formato reduzido entre processos MPI
+# (caged.reducao) e escrito em memória compartilhada pelos processos do pool (caged.compartilhado).
+# Cada buffer pode ser alocado pelo NumPy ou sobre uma memória já existente
+
+# Campos somáveis de cada estatística
+N, SOMA, SOMA_QUADRADOS = range(3)
+
+
+# Estatísticas por chave: salário, idade e salário em cada faixa etária
+def _n_estatisticas(nomes_faixas):
+    return 2 + len(nomes_faixas)
+
+
+def _estatisticas_da_chave(estatisticas, nomes_faixas):
+    yield estatisticas.salario
+    yield estatisticas.idade
+    for faixa in nomes_faixas:
+        yield estatisticas.faixas.get(faixa)
+
+
+# Formato, tipo e valor inicial de cada buffer: somas (contagem, soma, soma dos quadrados), mínimos,
+# máximos e, no modo de quantis, as contagens por bucket dos esboços (no geral e por faixa)
+def formatos_buffers(n_chaves, nomes_faixas, quantis=False):
+    n_estatisticas = _n_estatisticas(nomes_faixas)
+    formatos = [
+        ((n_chaves, n_estatisticas, 3), np.float64, 0.0),
+        ((n_chaves, n_estatisticas), np.float64, np.inf),
+        ((n_chaves, n_estatisticas), np.float64, -np.inf),
+    ]
+    if quantis:
+        formatos.append(((n_chaves, 1 + len(nomes_faixas), N_BUCKETS), np.int64, 0))
+    return formatos
+
+
+# Bytes ocupados pelos buffers (todos os tipos têm 8 bytes, então não há alinhamento a corrigir)
+def tamanho_buffers(n_chaves, nomes_faixas, quantis=False):
+    return sum(int(np.prod(formato)) * np.dtype(tipo).itemsize
+               for formato, tipo, _ in formatos_buffers(n_chaves, nomes_faixas, quantis))
+
+
+# Função para criar os buffers, em sequência sobre `memoria` (ex.: SharedMemory.buf) ou alocados pelo NumPy.
+# Com inicializar=False, os valores já presentes na memória são mantidos
+def alocar_buffers(n_chaves, nomes_faixas, quantis=False, memoria=None, inicializar=True):
+    buffers = []
+    deslocamento = 0
+    for formato, tipo, inicial in formatos_buffers(n_chaves, nomes_faixas, quantis):
+        if memoria is None:
+            buffer = np.full(formato, inicial, dtype=tipo)
+        else:
+            buffer = np.ndarray(formato, dtype=tipo, buffer=memoria, offset=deslocamento)
+            deslocamento += buffer.nbytes
+            if inicializar:
+                buffer.fill(inicial)
+        buffers.append(buffer)
+    return buffers
+
+
+# Função para montar os buffers densos (somas, mínimos, máximos) de um agregado.
+# Se `buffers` for dado, escreve neles (já inicializados) em vez de alocar
+def para_buffers(agregado, chaves, nomes_faixas, buffers=None):
+    subclasses, ocupacoes = chaves
+    if buffers is None:
+        buffers = alocar_buffers(len(subclasses) + len(ocupacoes), nomes_faixas)
+    somas, minimos, maximos = buffers[:3]
+
+    deslocamento = 0
+    for dimensao, lista in ((agregado.subclasses, subclasses), (agregado.ocupacoes, ocupacoes)):
+        for codigo, chave in enumerate(lista, start=deslocamento):
+            estatisticas = dimensao.get(chave)
+            if estatisticas is None:
+                continue
+            for e, estatistica in enumerate(_estatisticas_da_chave(estatisticas, nomes_faixas)):
+                if estatistica is None:
+                    continue
+                somas[codigo, e] = (estatistica.n, estatistica.soma, estatistica.soma_quadrados)
+                minimos[codigo, e] = estatistica.minimo
+                maximos[codigo, e] = estatistica.maximo
+        deslocamento += len(lista)
+    return somas, minimos, maximos
+
+
+# Função para reconstruir o agregado a partir dos buffers reduzidos
+def de_buffers(buffers, chaves, nomes_faixas):
+    somas, minimos, maximos = buffers[:3]
+    subclasses, ocupacoes = chaves
+    agregado = AgregadoParcial()
+
+    def estatistica(codigo, e):
+        n, soma, soma_quadrados = somas[codigo, e]
+        return Estatistica(int(n), float(soma), float(soma_quadrados), float(minimos[codigo, e]), float(maximos[codigo, e]))
+
+    deslocamento = 0
+    for dimensao, lista in ((agregado.subclasses, subclasses), (agregado.ocupacoes, ocupacoes)):
+        for codigo, chave in enumerate(lista, start=deslocamento):
+            if somas[codigo, 0, N] == 0:
+                continue
+            estatisticas = EstatisticasChave()
+            estatisticas.salario = estatistica(codigo, 0)
+            estatisticas.idade = estatistica(codigo, 1)
+            for f, faixa in enumerate(nomes_faixas, start=2):
+                if somas[codigo, f, N]:
+                    estatisticas.faixas[faixa] = estatistica(codigo, f)
+            dimensao[chave] = estatisticas
+        deslocamento += len(lista)
+    return agregado
+
+
+# Função para montar o buffer de contagens dos esboços de quantis: (chaves x (1 + faixas) x buckets).
+# Se `contagens` for dado (zerado), escreve nele em vez de alocar
+def quantis_para_buffer(agregado, chaves, nomes_faixas, contagens=None):
+    subclasses, ocupacoes = chaves
+    if contagens is None:
+        contagens = np.zeros((len(subclasses) + len(ocupacoes), 1 + len(nomes_faixas), N_BUCKETS), dtype=np.int64)
+
+    deslocamento = 0
+    for dimensao, lista in ((agregado.subclasses, subclasses), (agregado.ocupacoes, ocupacoes)):
+        for codigo, chave in enumerate(lista, start=deslocamento):
+            estatisticas = dimensao.get(chave)
+            if estatisticas is None or estatisticas.quantis is None:
+                continue
+            esbocos = [estatisticas.quantis] + [estatisticas.quantis_faixas.get(faixa) for faixa in nomes_faixas]
+            for e, esboco in enumerate(esbocos):
+                if esboco is not None and esboco.contagens:
+                    contagens[codigo, e, list(esboco.contagens)] = list(esboco.contagens.values())
+        deslocamento += len(lista)
+    return contagens
+
+
+# Função para devolver ao agregado reconstruído os esboços do buffer de contagens reduzido
+def quantis_de_buffer(contagens, agregado, chaves, nomes_faixas):
+    subclasses, ocupacoes = chaves
+
+    def esboco(codigo, e):
+        buckets = np.flatnonzero(contagens[codigo, e])
+        return EsbocoQuantis(dict(zip(buckets.tolist(), contagens[codigo, e, buckets].tolist())))
+
+    agregado.quantis = True
+    deslocamento = 0
+    for dimensao, lista in ((agregado.subclasses, subclasses), (agregado.ocupacoes, ocupacoes)):
+        for codigo, chave in enumerate(lista, start=deslocamento):
+            estatisticas = dimensao.get(chave)
+            if estatisticas is None:
+                continue
+            estatisticas.quantis = esboco(codigo, 0)
+            for e, faixa in enumerate(nomes_faixas, start=1):
+                if faixa in estatisticas.faixas:
+                    estatisticas.quantis_faixas[faixa] = esboco(codigo, e)
+        deslocamento += len(lista)
+    return agregado
+
+
+# Função para combinar buffers de origem nas linhas `codigos` dos buffers de destino (um código por
+# linha da origem, sem repetição): soma as contagens e somas e fica com os extremos
+def combinar_buffers(destino, origem, codigos):
+    destino[0][codigos] += origem[0]
+    destino[1][codigos] = np.minimum(destino[1][codigos], origem[1])
+    destino[2][codigos] = np.maximum(destino[2][codigos], origem[2])
+    for buffer_destino, buffer_origem in zip(destino[3:], origem[3:]):
+        buffer_destino[codigos] += buffer_origem
+    return destino
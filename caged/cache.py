@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+import pickle
+
+# Cache persistente de agregados parciais por fatia de arquivo.
+# O manifesto guarda, para cada caminho, tamanho, mtime e hash do conteúdo: se tamanho e mtime não
+# mudaram o hash é reaproveitado sem reler o arquivo. Os parciais ficam em arquivos nomeados pelo
+# hash do conteúdo, pela versão das regras de filtragem e pela faixa de bytes da fatia. Com o cache, as
+# fatias têm tamanho fixo (TAMANHO_FATIA_CACHE, salvo --tamanho-fatia explícito) em vez do dimensionado
+# pelo total de bytes e pelos trabalhadores: as faixas de um arquivo não mudam quando chega um mês novo
+# ou muda o número de processos, e só os arquivos novos ou alterados são reprocessados
+
+DIRETORIO_CACHE = '.cache_caged'
+
+TAMANHO_FATIA_CACHE = 64 * 1024 * 1024
+
+# Incrementar sempre que mudarem as regras de filtragem, as faixas etárias ou o formato do agregado
+VERSAO_REGRAS = '2'
+
+_BLOCO_HASH = 8 * 1024 * 1024
+
+
+# Função para calcular o hash do conteúdo de um arquivo
+def hash_arquivo(caminho):
+    resumo = hashlib.blake2b(digest_size=16)
+    with open(caminho, mode='rb') as arquivo:
+        while True:
+            dados = arquivo.read(_BLOCO_HASH)
+            if not dados:
+                break
+            resumo.update(dados)
+    return resumo.hexdigest()
+
+
+class CacheParciais:
+    def __init__(self, diretorio=DIRETORIO_CACHE, versao_regras=VERSAO_REGRAS):
+        self.diretorio = diretorio
+        self.versao_regras = versao_regras
+        self.caminho_manifesto = os.path.join(diretorio, 'manifesto.json')
+        self.manifesto = {}
+        if os.path.exists(self.caminho_manifesto):
+            with open(self.caminho_manifesto, encoding='utf-8') as f:
+                self.manifesto = json.load(f)
+
+    # Hash do conteúdo do arquivo, recalculado só quando tamanho ou mtime mudaram
+    def identificar(self, caminho):
+        chave = os.path.abspath(caminho)
+        info = os.stat(caminho)
+        entrada = self.manifesto.get(chave)
+        if entrada and entrada['tamanho'] == info.st_size and entrada['mtime_ns'] == info.st_mtime_ns:
+            return entrada['hash']
+        hash_conteudo = hash_arquivo(caminho)
+        self.manifesto[chave] = {'tamanho': info.st_size, 'mtime_ns': info.st_mtime_ns, 'hash': hash_conteudo}
+        return hash_conteudo
+
+    def _caminho_parcial(self, hash_conteudo, fatia):
+        return os.path.join(self.diretorio, f'{hash_conteudo}-v{self.versao_regras}-{fatia.inicio}-{fatia.fim}.pkl')
+
+    def obter(self, hash_conteudo, fatia):
+        caminho = self._caminho_parcial(hash_conteudo, fatia)
+        try:
+            with open(caminho, mode='rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    # Função para verificar se há um parcial para a fatia, sem lê-lo (os parciais são gravados de forma
+    # atômica; um parcial ilegível é reprocessado pelo trabalhador, como se não existisse)
+    def disponivel(self, hash_conteudo, fatia):
+        return os.path.exists(self._caminho_parcial(hash_conteudo, fatia))
+
+    # Escrita atômica: outro processo nunca lê um parcial pela metade
+    def guardar(self, hash_conteudo, fatia, agregado):
+        os.makedirs(self.diretorio, exist_ok=True)
+        caminho = self._caminho_parcial(hash_conteudo, fatia)
+        temporario = f'{caminho}.{os.getpid()}.tmp'
+        with open(temporario, mode='wb') as f:
+            pickle.dump(agregado, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporario, caminho)
+
+    def salvar_manifesto(self):
+        os.makedirs(self.diretorio, exist_ok=True)
+        temporario = f'{self.caminho_manifesto}.{os.getpid()}.tmp'
+        with open(temporario, mode='w', encoding='utf-8') as f:
+            json.dump(self.manifesto, f, indent=1, sort_keys=True)
+        os.replace(temporario, self.caminho_manifesto)
+
+    # Função para remover do manifesto os arquivos que sumiram e apagar parciais de conteúdos antigos
+    def remover_orfaos(self):
+        self.manifesto = {caminho: entrada for caminho, entrada in self.manifesto.items() if os.path.exists(caminho)}
+        validos = {entrada['hash'] for entrada in self.manifesto.values()}
+        if not os.path.isdir(self.diretorio):
+            return
+        for nome in os.listdir(self.diretorio):
+            if nome.endswith('.pkl') and nome.split('-', 1)[0] not in validos:
+                os.remove(os.path.join(self.diretorio, nome))
@@ -0,0 +1,262 @@
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+
+from caged.compactados import eh_compactado, fatias_compactadas
+from caged.cubo import Cubo
+from caged.estatisticas import AgregadoParcial
+from caged.fatias import TAMANHO_BLOCO, fatia_inteira, ler_blocos
+from caged.perfil import MOTIVOS_REJEICAO, Perfil
+from caged.nucleo import format_string
+from caged.regras import como_regras
+from caged.vetorizado import (COLUNAS_NECESSARIAS, acumular_dimensao, aplicar_regras, delimitar_campos,
+                              extrair_colunas, _codificar_chaves)
+
+# Armazenamento colunar dos arquivos CAGEDMOV: cada arquivo mensal é convertido uma única vez em um
+# diretório de arrays .npy (lidos depois com memmap) só com as linhas de admissão e os campos usados
+# pelo processamento. Subclasse e ocupação são codificadas por dicionário; salário, horas e idade
+# ficam tipados, junto com o estado da conversão, então as regras podem mudar sem nova conversão
+
+DIRETORIO_ARMAZENAMENTO = 'armazenamento_caged'
+
+# Incrementar quando mudar o conjunto ou o tipo das colunas gravadas
+VERSAO_FORMATO = 2
+
+LINHAS_POR_BLOCO = 4 * 1024 * 1024
+
+_COLUNAS = {
+    'salario': np.float64,
+    'estado_salario': np.int8,
+    'unidade': np.int16,
+    'horas': np.float64,
+    'estado_horas': np.int8,
+    'idade': np.float64,
+    'estado_idade': np.int8,
+    'subclasse': np.int32,
+    'cbo': np.int32,
+    'uf': np.int32,
+}
+
+# A UF só é usada pelo cubo (caged.cubo); arquivos sem a coluna gravam UF vazia
+_DIMENSOES = (('subclasse', 'subclasse'), ('cbo', 'cbo2002ocupação'), ('uf', 'uf'))
+
+
+# Uma entrada do armazenamento, tratada pelos escalonadores como uma tarefa (como uma fatia).
+# nome é o do arquivo de texto de origem (o interno, se a origem for compactada), usado para obter a data
+class EntradaColunar:
+    __slots__ = ('caminho', 'diretorio', 'tamanho', 'nome')
+
+    armazenada = True
+
+    def __init__(self, caminho, diretorio, tamanho, nome=None):
+        self.caminho = caminho
+        self.diretorio = diretorio
+        self.tamanho = tamanho
+        self.nome = nome or os.path.basename(caminho)
+
+    def __repr__(self):
+        return f'EntradaColunar({os.path.basename(self.caminho)!r})'
+
+
+def diretorio_entrada(caminho, diretorio_armazenamento):
+    return os.path.join(diretorio_armazenamento, os.path.basename(caminho))
+
+
+# Função para verificar se o armazenamento tem uma conversão atual do arquivo de origem
+def entrada_atualizada(caminho, diretorio_armazenamento):
+    destino = diretorio_entrada(caminho, diretorio_armazenamento)
+    try:
+        with open(os.path.join(destino, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    info = os.stat(caminho)
+    if meta.get('versao') != VERSAO_FORMATO or meta.get('tamanho') != info.st_size or meta.get('mtime_ns') != info.st_mtime_ns:
+        return None
+    tamanho = sum(entrada.stat().st_size for entrada in os.scandir(destino) if entrada.is_file())
+    return EntradaColunar(caminho, destino, tamanho, meta.get('origem'))
+
+
+# Função para converter um arquivo de texto para o armazenamento colunar. A origem pode ser um
+# compactado com um único arquivo de texto (descompactado em fluxo)
+def converter_arquivo(caminho, diretorio_armazenamento=DIRETORIO_ARMAZENAMENTO, tamanho_bloco=TAMANHO_BLOCO):
+    if eh_compactado(caminho):
+        fatias = fatias_compactadas(caminho)
+        if len(fatias) != 1:
+            raise ValueError(f"O arquivo compactado deve conter um único arquivo de texto: {os.path.basename(caminho)}")
+        fatia = fatias[0]
+    else:
+        fatia = fatia_inteira(caminho)
+    if not all(field in fatia.colunas for field in COLUNAS_NECESSARIAS):
+        raise ValueError(f"As colunas necessárias não foram encontradas no arquivo CSV: {os.path.basename(caminho)}")
+    indices_colunas = {nome: fatia.colunas.index(nome) for nome in COLUNAS_NECESSARIAS}
+    if 'uf' in fatia.colunas:
+        indices_colunas['uf'] = fatia.colunas.index('uf')
+    info = os.stat(caminho)
+
+    partes = {nome: [] for nome in _COLUNAS}
+    dicionarios = {dimensao: {} for dimensao, _ in _DIMENSOES}
+    linhas_totais = 0
+    for dados in ler_blocos(fatia, tamanho_bloco):
+        arr, campos = delimitar_campos(dados, indices_colunas)
+        with np.errstate(invalid='ignore', over='ignore'):
+            colunas = extrair_colunas(arr, campos)
+        linhas = colunas.pop('linhas')
+        linhas_totais += len(campos['saldomovimentação'][0])
+        for nome, valores in colunas.items():
+            partes[nome].append(valores)
+        # Chaves do bloco remapeadas para o dicionário do arquivo (ordem da primeira ocorrência)
+        for dimensao, coluna in _DIMENSOES:
+            if coluna in campos:
+                inicio, fim, _ = campos[coluna]
+                chaves, codigos = _codificar_chaves(arr, inicio[linhas], fim[linhas])
+            else:
+                chaves, codigos = [''], np.zeros(len(linhas), dtype=np.int64)
+            dicionario = dicionarios[dimensao]
+            mapa = np.array([dicionario.setdefault(chave, len(dicionario)) for chave in chaves], dtype=np.int32)
+            partes[dimensao].append(mapa[codigos] if len(codigos) else np.zeros(0, dtype=np.int32))
+
+    # Grava num diretório temporário e troca no final, para nunca deixar uma entrada pela metade
+    destino = diretorio_entrada(caminho, diretorio_armazenamento)
+    temporario = f'{destino}.{os.getpid()}.tmp'
+    shutil.rmtree(temporario, ignore_errors=True)
+    os.makedirs(temporario)
+    for nome, tipo in _COLUNAS.items():
+        valores = np.concatenate(partes[nome]) if partes[nome] else np.zeros(0)
+        np.save(os.path.join(temporario, f'{nome}.npy'), valores.astype(tipo, copy=False))
+    for dimensao, dicionario in dicionarios.items():
+        with open(os.path.join(temporario, f'{dimensao}_dicionario.json'), 'w', encoding='utf-8') as f:
+            json.dump(list(dicionario), f, ensure_ascii=False)
+    meta = {
+        'versao': VERSAO_FORMATO,
+        'origem': fatia.nome,
+        'tamanho': info.st_size,
+        'mtime_ns': info.st_mtime_ns,
+        'linhas': linhas_totais,
+        'admissoes': int(sum(len(parte) for parte in partes['salario'])),
+    }
+    with open(os.path.join(temporario, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=1)
+    shutil.rmtree(destino, ignore_errors=True)
+    os.replace(temporario, destino)
+    return destino
+
+
+# Função para acumular as linhas aceitas de um bloco do armazenamento num cubo: os códigos do dicionário
+# do arquivo são traduzidos para os do cubo
+def _acumular_cubo(cubo, bloco, chaves, aceitas, salario, idade, faixa, nomes_faixas, mes):
+    codigos = np.empty((len(aceitas), 5), dtype=np.int64)
+    codigos[:, 0] = cubo.codificar('mes', [mes])[0]
+    for d, dimensao in ((1, 'subclasse'), (2, 'cbo'), (4, 'uf')):
+        # Só os valores presentes nas linhas aceitas entram nos dicionários do cubo
+        usados, inversos = np.unique(bloco[dimensao][aceitas], return_inverse=True)
+        codigos[:, d] = cubo.codificar(dimensao, [chaves[dimensao][u] for u in usados.tolist()])[inversos.ravel()]
+    codigos[:, 3] = cubo.codificar('faixa', nomes_faixas)[faixa]
+    cubo.adicionar_linhas(codigos, salario, idade)
+
+
+# Função para processar uma entrada do armazenamento com as mesmas regras do motor vetorizado
+# (com cubo=True, devolve o cubo da entrada em vez do agregado)
+def processar_entrada_colunar(entrada, regras, erros, linhas_por_bloco=LINHAS_POR_BLOCO, perfil=None,
+                              quantis=False, cubo=False):
+    nome_arquivo = os.path.basename(entrada.caminho)
+    regras = como_regras(regras)
+    nomes_faixas = regras.nomes_faixas
+    agregado = Cubo() if cubo else AgregadoParcial(quantis)
+    if perfil is None:
+        perfil = Perfil()
+    try:
+        with perfil.etapa('leitura'):
+            colunas = {nome: np.load(os.path.join(entrada.diretorio, f'{nome}.npy'), mmap_mode='r') for nome in _COLUNAS}
+            chaves = {}
+            for dimensao, _ in _DIMENSOES:
+                with open(os.path.join(entrada.diretorio, f'{dimensao}_dicionario.json'), encoding='utf-8') as f:
+                    chaves[dimensao] = json.load(f)
+            with open(os.path.join(entrada.diretorio, 'meta.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+        # Os desligamentos não foram gravados; entram no perfil pela contagem da conversão
+        perfil.registrar_linhas(meta['linhas'] - meta['admissoes'], rejeicoes={'desligamento': meta['linhas'] - meta['admissoes']})
+
+        total = len(colunas['salario'])
+        for inicio in range(0, total, linhas_por_bloco):
+            with perfil.etapa('leitura'):
+                bloco = {nome: np.asarray(valores[inicio:inicio + linhas_por_bloco]) for nome, valores in colunas.items()}
+            rejeicoes = dict.fromkeys(MOTIVOS_REJEICAO, 0)
+            with perfil.etapa('filtro'), np.errstate(invalid='ignore', over='ignore'):
+                aceitas, salario, idade, faixa, com_erro = aplicar_regras(bloco, regras, rejeicoes)
+            perfil.registrar_linhas(len(bloco['salario']), len(aceitas), rejeicoes)
+            if cubo:
+                with perfil.etapa('agregacao'), np.errstate(invalid='ignore', over='ignore'):
+                    _acumular_cubo(agregado, bloco, chaves, aceitas, salario, idade, faixa, nomes_faixas,
+                                   format_string(entrada.nome))
+            else:
+                with perfil.etapa('agregacao'), np.errstate(invalid='ignore', over='ignore'):
+                    for dimensao, destino in (('subclasse', agregado.subclasses), ('cbo', agregado.ocupacoes)):
+                        codigos = bloco[dimensao][aceitas].astype(np.int64)
+                        acumular_dimensao(destino, chaves[dimensao], codigos, salario, idade, faixa, nomes_faixas,
+                                          quantis)
+            if len(com_erro):
+                # O texto das linhas não é guardado no armazenamento; a amostra é a posição da admissão
+                amostras = [f"admissão {inicio + indice + 1} (armazenamento colunar)"
+                            for indice in com_erro[:erros.faltam_amostras(nome_arquivo, 'linha')].tolist()]
+                erros.registrar(nome_arquivo, 'linha', len(com_erro), amostras)
+        return agregado
+
+    except Exception as e:
+        erros.registrar(nome_arquivo, 'abertura', amostras=[str(e)])
+        return None
+
+
+# Função para separar os arquivos que já têm conversão atual no armazenamento dos que devem ser lidos como texto
+def separar_armazenados(caminhos, diretorio_armazenamento):
+    entradas = []
+    restantes = []
+    for caminho in caminhos:
+        entrada = entrada_atualizada(caminho, diretorio_armazenamento)
+        if entrada is None:
+            restantes.append(caminho)
+        else:
+            entradas.append(entrada)
+    return entradas, restantes
+
+
+def _converter(argumentos):
+    caminho, diretorio_armazenamento = argumentos
+    try:
+        converter_arquivo(caminho, diretorio_armazenamento)
+        return caminho, None
+    except Exception as e:
+        return caminho, str(e)
+
+
+# Etapa de ingestão: python -m caged.colunar CAGEDMOV_downloads armazenamento_caged
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Converte os arquivos CAGEDMOV para o armazenamento colunar (.npy)')
+    parser.add_argument('origem', nargs='?', default='./CAGEDMOV_downloads')
+    parser.add_argument('destino', nargs='?', default=DIRETORIO_ARMAZENAMENTO)
+    parser.add_argument('--processos', type=int, default=1, help='número de arquivos convertidos em paralelo')
+    parser.add_argument('--forcar', action='store_true', help='converte de novo mesmo os arquivos já atualizados')
+    args = parser.parse_args()
+
+    os.makedirs(args.destino, exist_ok=True)
+    caminhos = sorted(entrada.path for entrada in os.scandir(args.origem) if entrada.is_file())
+    if not args.forcar:
+        caminhos = [caminho for caminho in caminhos if entrada_atualizada(caminho, args.destino) is None]
+
+    tarefas = [(caminho, args.destino) for caminho in caminhos]
+    if args.processos > 1:
+        from multiprocessing import Pool
+        with Pool(args.processos) as pool:
+            resultados = pool.imap_unordered(_converter, tarefas)
+            resultados = list(resultados)
+    else:
+        resultados = map(_converter, tarefas)
+
+    for caminho, erro in resultados:
+        if erro:
+            print(f"Erro ao converter {os.path.basename(caminho)}: {erro}")
+        else:
+            print(f"Convertido: {os.path.basename(caminho)}")
@@ -0,0 +1,181 @@
+import bz2
+import contextlib
+import csv
+import gzip
+import lzma
+import os
+import shutil
+import subprocess
+import tempfile
+import zipfile
+
+# Leitura direta dos arquivos CAGEDMOV compactados (zip, gzip, xz, bz2 e 7z), sem extraí-los para o disco.
+# Cada arquivo de texto dentro do compactado vira uma fatia única (um fluxo compactado não permite
+# começar a leitura no meio), descompactada em fluxo e entregue em blocos terminados em quebra de linha.
+# A data continua vindo do nome do arquivo de texto interno (Fatia.nome), não do nome do compactado.
+# O 7z é lido pelo programa 7z/7za/7zz (p7zip ou 7-Zip), que precisa estar instalado
+
+EXTENSOES = {'.zip': 'zip', '.gz': 'gz', '.xz': 'xz', '.bz2': 'bz2', '.7z': '7z'}
+
+_PROGRAMAS_7Z = ('7z', '7za', '7zz')
+
+_ABRIR_FLUXO = {'gz': gzip.open, 'xz': lzma.open, 'bz2': bz2.open}
+
+
+def formato_compactado(caminho):
+    return EXTENSOES.get(os.path.splitext(caminho)[1].lower())
+
+
+def eh_compactado(caminho):
+    return formato_compactado(caminho) is not None
+
+
+# Um arquivo de texto dentro de um compactado, tratado como uma fatia do arquivo inteiro.
+# inicio e fim identificam o membro no cache (posição dentro do compactado); tamanho estima o trabalho
+class FatiaCompactada:
+    __slots__ = ('caminho', 'membro', 'formato', 'inicio', 'fim', 'colunas')
+
+    compactada = True
+    antecipada = False
+    armazenada = False
+
+    def __init__(self, caminho, membro, formato, inicio, fim, colunas):
+        self.caminho = caminho
+        self.membro = membro
+        self.formato = formato
+        self.inicio = inicio
+        self.fim = fim
+        self.colunas = colunas
+
+    @property
+    def tamanho(self):
+        return self.fim - self.inicio
+
+    # Nome do arquivo de texto, usado para obter a data
+    @property
+    def nome(self):
+        return os.path.basename(self.membro)
+
+    def __repr__(self):
+        return f'FatiaCompactada({os.path.basename(self.caminho)!r}, {self.membro!r})'
+
+
+def _programa_7z():
+    for nome in _PROGRAMAS_7Z:
+        programa = shutil.which(nome)
+        if programa:
+            return programa
+    raise RuntimeError(f"Para ler arquivos .7z é preciso ter um destes programas instalados: {', '.join(_PROGRAMAS_7Z)}")
+
+
+# Membros de um .7z (nome e tamanho descompactado), a partir da listagem técnica do programa 7z
+def _membros_7z(caminho):
+    saida = subprocess.run([_programa_7z(), 'l', '-slt', caminho], capture_output=True, check=True,
+                           env=dict(os.environ, LC_ALL='C')).stdout.decode('utf-8', errors='replace')
+    membros = []
+    # Os registros dos membros vêm depois da linha de traços, separados por linhas em branco
+    for registro in saida.split('\n----------\n', 1)[-1].split('\n\n'):
+        campos = dict(linha.split(' = ', 1) for linha in registro.splitlines() if ' = ' in linha)
+        if 'Path' not in campos or campos.get('Folder') == '+' or campos.get('Attributes', '').startswith('D'):
+            continue
+        membros.append((campos['Path'], int(campos.get('Size') or 0)))
+    return membros
+
+
+# Nome original guardado no cabeçalho do gzip (campo FNAME), se houver
+def _nome_gzip(caminho):
+    with open(caminho, mode='rb') as arquivo:
+        cabecalho = arquivo.read(10)
+        if len(cabecalho) < 10 or cabecalho[:2] != b'\x1f\x8b' or not cabecalho[3] & 0x08:
+            return None
+        if cabecalho[3] & 0x04:
+            tamanho_extra = int.from_bytes(arquivo.read(2), 'little')
+            arquivo.seek(tamanho_extra, os.SEEK_CUR)
+        nome = bytearray()
+        while (byte := arquivo.read(1)) not in (b'', b'\x00'):
+            nome += byte
+    return nome.decode('latin-1') or None
+
+
+# Abre um membro como fluxo binário de bytes descompactados
+@contextlib.contextmanager
+def abrir_membro(caminho, membro, formato):
+    if formato == 'zip':
+        with zipfile.ZipFile(caminho) as compactado, compactado.open(membro) as fluxo:
+            yield fluxo
+    elif formato == '7z':
+        # A saída de erros vai para um arquivo temporário (um pipe não lido poderia travar o 7z)
+        with tempfile.TemporaryFile() as saida_erros:
+            processo = subprocess.Popen([_programa_7z(), 'x', '-so', caminho, membro],
+                                        stdout=subprocess.PIPE, stderr=saida_erros)
+            try:
+                yield processo.stdout
+                # Fluxo lido até o fim: um 7z truncado, corrompido ou sem o membro termina com erro, e o
+                # fluxo curto não pode ser agregado como se estivesse completo
+                if not processo.stdout.read(1) and processo.wait() != 0:
+                    saida_erros.seek(0)
+                    linhas = saida_erros.read().decode('utf-8', errors='replace').strip().splitlines()
+                    mensagem = '; '.join(linha for linha in linhas if 'ERROR' in linha.upper()) or \
+                        (linhas[-1] if linhas else 'sem mensagem')
+                    raise RuntimeError(f"7z terminou com código {processo.returncode} ao extrair {membro!r} de "
+                                       f"{os.path.basename(caminho)}: {mensagem}")
+            finally:
+                processo.stdout.close()
+                if processo.poll() is None:
+                    processo.kill()
+                processo.wait()
+    else:
+        with _ABRIR_FLUXO[formato](caminho, mode='rb') as fluxo:
+            yield fluxo
+
+
+# Função para ler as colunas do cabeçalho de um membro (só a primeira linha é descompactada)
+def ler_cabecalho_membro(caminho, membro, formato):
+    with abrir_membro(caminho, membro, formato) as fluxo:
+        linha = fluxo.readline()
+    texto = linha.decode('utf-8').rstrip('\r\n')
+    return next(csv.reader([texto], delimiter=';'), [])
+
+
+# Função para montar as fatias de um arquivo compactado: uma por arquivo de texto interno
+def fatias_compactadas(caminho):
+    formato = formato_compactado(caminho)
+    if formato == 'zip':
+        with zipfile.ZipFile(caminho) as compactado:
+            membros = [(info.filename, info.header_offset, info.header_offset + info.compress_size)
+                       for info in compactado.infolist() if not info.is_dir()]
+    elif formato == '7z':
+        membros = []
+        posicao = 0
+        for membro, tamanho in _membros_7z(caminho):
+            membros.append((membro, posicao, posicao + tamanho))
+            posicao += tamanho
+    else:
+        # gzip, xz e bz2 têm um único fluxo; o nome interno vem do cabeçalho (gzip) ou do nome sem a extensão
+        membro = (_nome_gzip(caminho) if formato == 'gz' else None) or os.path.splitext(os.path.basename(caminho))[0]
+        membros = [(membro, 0, os.path.getsize(caminho))]
+
+    return [FatiaCompactada(caminho, membro, formato, inicio, fim, ler_cabecalho_membro(caminho, membro, formato))
+            for membro, inicio, fim in membros]
+
+
+# Função para ler as linhas de dados de um membro em blocos de bytes terminados em quebra de linha
+# (o mesmo contrato de fatias.ler_blocos). O cabeçalho é descartado
+def ler_blocos_compactados(fatia, tamanho_bloco):
+    with abrir_membro(fatia.caminho, fatia.membro, fatia.formato) as fluxo:
+        fluxo.readline()
+        resto = b''
+        while True:
+            dados = fluxo.read(tamanho_bloco)
+            if not dados:
+                break
+            if resto:
+                dados = resto + dados
+            corte = dados.rfind(b'\n')
+            if corte < 0:
+                resto = dados
+                continue
+            yield dados[:corte + 1]
+            resto = dados[corte + 1:]
+        if resto:
+            yield resto + b'\n'
@@ -0,0 +1,186 @@
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from caged.buffers import (alocar_buffers, combinar_buffers, de_buffers, para_buffers, quantis_de_buffer,
+                           quantis_para_buffer, tamanho_buffers)
+from caged.cubo import Cubo, arrays_celulas, tamanho_celulas
+from caged.estatisticas import AgregadoParcial
+
+# Parciais em memória compartilhada para o backend de pool de processos (cnaePorPool.py).
+# Cada processo do pool escreve o agregado de uma fatia nos buffers densos de caged.buffers, criados
+# sobre um segmento multiprocessing.shared_memory, e devolve só o nome do segmento e as listas de chaves.
+# O processo principal lê os números direto da memória compartilhada e os combina com NumPy no agregado
+# denso do mês, sem serializar os valores
+
+# Capacidade inicial (em chaves) de cada dimensão do agregado denso; dobra quando enche
+CAPACIDADE_INICIAL = 1024
+
+
+# Inicia o rastreador de recursos antes de criar o pool, para que os processos filhos registrem os
+# segmentos no mesmo rastreador em que o processo principal os remove
+def preparar_memoria_compartilhada():
+    resource_tracker.ensure_running()
+
+
+# Referência a um parcial em memória compartilhada (é o que volta do processo do pool)
+class ParcialCompartilhado:
+    __slots__ = ('nome_memoria', 'chaves', 'quantis')
+
+    def __init__(self, nome_memoria, chaves, quantis=False):
+        self.nome_memoria = nome_memoria
+        self.chaves = chaves
+        self.quantis = quantis
+
+    @property
+    def n_chaves(self):
+        return len(self.chaves[0]) + len(self.chaves[1])
+
+    def __repr__(self):
+        return f'ParcialCompartilhado({self.nome_memoria!r}, {self.n_chaves} chaves)'
+
+
+# Função para escrever um agregado num novo segmento de memória compartilhada (no processo do pool).
+# O segmento continua existindo depois que o processo fecha a sua referência; quem o combina o remove
+def exportar_agregado(agregado, nomes_faixas, quantis=False):
+    chaves = (list(agregado.subclasses), list(agregado.ocupacoes))
+    n_chaves = len(chaves[0]) + len(chaves[1])
+    if n_chaves == 0:
+        return ParcialCompartilhado(None, chaves, quantis)
+    memoria = shared_memory.SharedMemory(create=True, size=tamanho_buffers(n_chaves, nomes_faixas, quantis))
+    try:
+        buffers = alocar_buffers(n_chaves, nomes_faixas, quantis, memoria.buf)
+        para_buffers(agregado, chaves, nomes_faixas, buffers)
+        if quantis:
+            quantis_para_buffer(agregado, chaves, nomes_faixas, buffers[3])
+        del buffers
+    finally:
+        memoria.close()
+    return ParcialCompartilhado(memoria.name, chaves, quantis)
+
+
+# Referência a um cubo parcial em memória compartilhada: as células ficam no segmento e os dicionários
+# das dimensões voltam com a referência
+class ParcialCubo:
+    __slots__ = ('nome_memoria', 'dicionarios', 'n_celulas')
+
+    def __init__(self, nome_memoria, dicionarios, n_celulas):
+        self.nome_memoria = nome_memoria
+        self.dicionarios = dicionarios
+        self.n_celulas = n_celulas
+
+    def __repr__(self):
+        return f'ParcialCubo({self.nome_memoria!r}, {self.n_celulas} células)'
+
+
+# Função para escrever as células de um cubo num novo segmento de memória compartilhada (no processo do pool)
+def exportar_cubo(cubo):
+    if cubo.n_celulas == 0:
+        return ParcialCubo(None, cubo.dicionarios, 0)
+    memoria = shared_memory.SharedMemory(create=True, size=tamanho_celulas(cubo.n_celulas))
+    try:
+        arrays = arrays_celulas(cubo.n_celulas, memoria.buf)
+        for destino, origem in zip(arrays, (cubo.codigos, cubo.somas, cubo.minimos, cubo.maximos)):
+            destino[:] = origem
+        del arrays, destino
+    finally:
+        memoria.close()
+    return ParcialCubo(memoria.name, cubo.dicionarios, cubo.n_celulas)
+
+
+# Função para combinar um cubo parcial em memória compartilhada num cubo e remover o segmento
+def combinar_cubo_compartilhado(cubo, parcial):
+    if parcial.nome_memoria is None:
+        return cubo
+    memoria = shared_memory.SharedMemory(name=parcial.nome_memoria)
+    try:
+        recebido = Cubo()
+        arrays = arrays_celulas(parcial.n_celulas, memoria.buf)
+        # As células são copiadas do segmento: o cubo guarda as partes combinadas até agrupá-las
+        recebido.__setstate__((parcial.dicionarios, *(array.copy() for array in arrays)))
+        cubo.combinar(recebido)
+        del recebido, arrays
+    finally:
+        memoria.close()
+        memoria.unlink()
+    return cubo
+
+
+# Função para descartar um parcial sem combiná-lo (ex.: depois de uma falha)
+def descartar_parcial(parcial):
+    if parcial.nome_memoria is None:
+        return
+    memoria = shared_memory.SharedMemory(name=parcial.nome_memoria)
+    memoria.close()
+    memoria.unlink()
+
+
+# Uma dimensão (subclasses ou ocupações) do agregado denso: chave -> código e buffers por código
+class _Dimensao:
+    def __init__(self, nomes_faixas, quantis):
+        self.nomes_faixas = nomes_faixas
+        self.quantis = quantis
+        self.indice = {}
+        self.chaves = []
+        self.buffers = alocar_buffers(CAPACIDADE_INICIAL, nomes_faixas, quantis)
+
+    # Códigos das chaves, criando os das novas (e aumentando os buffers se preciso)
+    def codigos(self, chaves):
+        codigos = np.array([self.indice.setdefault(chave, len(self.indice)) for chave in chaves], dtype=np.int64)
+        if len(self.indice) > len(self.chaves):
+            self.chaves.extend(chaves[i] for i in np.flatnonzero(codigos >= len(self.chaves)))
+        capacidade = len(self.buffers[0])
+        if len(self.chaves) > capacidade:
+            while capacidade < len(self.chaves):
+                capacidade *= 2
+            novos = alocar_buffers(capacidade, self.nomes_faixas, self.quantis)
+            for novo, antigo in zip(novos, self.buffers):
+                novo[:len(antigo)] = antigo
+            self.buffers = novos
+        return codigos
+
+    # Buffers com as chaves em ordem alfabética (a mesma ordem da saída do MPI)
+    def ordenados(self):
+        ordem = sorted(range(len(self.chaves)), key=self.chaves.__getitem__)
+        return [self.chaves[i] for i in ordem], [buffer[ordem] for buffer in self.buffers]
+
+
+# Agregado de um mês no processo principal, guardado como buffers densos
+class AgregadoDenso:
+    def __init__(self, nomes_faixas, quantis=False):
+        self.nomes_faixas = list(nomes_faixas)
+        self.quantis = quantis
+        self.subclasses = _Dimensao(self.nomes_faixas, quantis)
+        self.ocupacoes = _Dimensao(self.nomes_faixas, quantis)
+
+    # Função para combinar um parcial em memória compartilhada e remover o segmento
+    def combinar_compartilhado(self, parcial):
+        if parcial.nome_memoria is None:
+            return self
+        memoria = shared_memory.SharedMemory(name=parcial.nome_memoria)
+        try:
+            buffers = alocar_buffers(parcial.n_chaves, self.nomes_faixas, self.quantis, memoria.buf, inicializar=False)
+            inicio = 0
+            for dimensao, chaves in zip((self.subclasses, self.ocupacoes), parcial.chaves):
+                fim = inicio + len(chaves)
+                if chaves:
+                    codigos = dimensao.codigos(chaves)
+                    combinar_buffers(dimensao.buffers, [buffer[inicio:fim] for buffer in buffers], codigos)
+                inicio = fim
+            del buffers
+        finally:
+            memoria.close()
+            memoria.unlink()
+        return self
+
+    # Função para converter no AgregadoParcial usado na escrita das saídas
+    def como_agregado(self):
+        agregado = AgregadoParcial(self.quantis)
+        for nome, dimensao in (('subclasses', self.subclasses), ('ocupacoes', self.ocupacoes)):
+            chaves, buffers = dimensao.ordenados()
+            lista = (chaves, []) if nome == 'subclasses' else ([], chaves)
+            parcial = de_buffers(buffers, lista, self.nomes_faixas)
+            if self.quantis:
+                quantis_de_buffer(buffers[3], parcial, lista, self.nomes_faixas)
+            getattr(agregado, nome).update(getattr(parcial, nome))
+        return agregado
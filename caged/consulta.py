@@ -0,0 +1,368 @@
+import argparse
+import csv
+import json
+import math
+import os
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from caged.cubo import DIMENSOES, Cubo
+from caged.particoes import ARQUIVO_MANIFESTO, carregar_cubo_particionado, diretorio_particoes, ler_manifesto
+from caged.saida import DIRETORIO_SAIDA
+
+# Serviço de consulta residente sobre os resultados agregados: as saídas subclasse_output.csv e
+# ocupacoes_output.csv (e o cubo de caged.cubo, se houver) são lidas uma única vez e indexadas em memória
+# por (chave, mês), então uma consulta pontual é uma busca em dicionário, sem reler os arquivos.
+# Os agrupamentos do cubo (rollup) passam por um cache LRU. Quando uma nova execução publica as saídas
+# (os arquivos são trocados de uma vez pelo escritor), o serviço recarrega os dados em segundo plano e
+# troca a versão em uso sem interromper as consultas. Saídas particionadas (caged.particoes) são lidas
+# a partir do manifesto, quando ele é mais novo que as saídas únicas. API em Python (ServicoConsulta) e
+# HTTP local:
+#
+#   python -m caged.consulta --cubo output_caged/cubo.npz --porta 8765
+#   curl 'localhost:8765/subclasse/4711302?mes=2021-01&faixa=30-39'
+#   curl 'localhost:8765/rollup?por=mes,uf&cbo=521110'
+
+PORTA = 8765
+TAMANHO_CACHE = 1024
+INTERVALO_RECARGA = 1.0
+
+_COLUNAS_CHAVE = {'subclasses': 'cnae', 'ocupacoes': 'ocupacao'}
+_ARQUIVOS = {'subclasses': 'subclasse_output.csv', 'ocupacoes': 'ocupacoes_output.csv'}
+
+
+# Aceita '2021-01-01', '2021-01' e '202101' (a forma das datas nas saídas é a primeira)
+def normalizar_mes(mes):
+    if mes is None:
+        return None
+    mes = str(mes).strip()
+    if len(mes) == 6 and mes.isdigit():
+        return f'{mes[:4]}-{mes[4:]}-01'
+    if len(mes) == 7:
+        return f'{mes}-01'
+    return mes
+
+
+# Valores numéricos das saídas; NaN vira None (também no JSON)
+def _numero(valor):
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        return valor
+    return None if math.isnan(numero) else numero
+
+
+# Função para ler uma saída CSV num índice (chave, mês) -> valores numéricos da linha (ou acrescentá-la
+# aos índices recebidos, no caso das partições)
+def ler_saida(caminho, coluna, linhas=None, meses_por_chave=None):
+    linhas = {} if linhas is None else linhas
+    meses_por_chave = {} if meses_por_chave is None else meses_por_chave
+    with open(caminho, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f, delimiter=';'):
+            row.pop('id', None)
+            chave = row.pop(coluna)
+            mes = row.pop('date')
+            linhas[(chave, mes)] = {nome: _numero(valor) for nome, valor in row.items()}
+            meses_por_chave.setdefault(chave, []).append(mes)
+    for meses in meses_por_chave.values():
+        meses.sort()
+    return linhas, meses_por_chave
+
+
+# Uma versão carregada dos resultados; é substituída inteira na recarga (as consultas em andamento
+# continuam usando a versão que pegaram)
+class _Resultados:
+    __slots__ = ('geracao', 'assinatura', 'linhas', 'meses_por_chave', 'meses', 'cubo', 'carregado_em')
+
+    def __init__(self, geracao, assinatura, linhas, meses_por_chave, cubo):
+        self.geracao = geracao
+        self.assinatura = assinatura
+        self.linhas = linhas
+        self.meses_por_chave = meses_por_chave
+        self.meses = sorted({mes for indice in linhas.values() for _, mes in indice})
+        if cubo is not None:
+            self.meses = sorted(set(self.meses) | set(cubo.dicionarios['mes']))
+        self.cubo = cubo
+        self.carregado_em = time.time()
+
+
+# Cache LRU de resultados por chave de consulta (seguro entre threads)
+class CacheLRU:
+    __slots__ = ('tamanho', 'itens', 'trava', 'acertos', 'faltas')
+
+    def __init__(self, tamanho=TAMANHO_CACHE):
+        self.tamanho = tamanho
+        self.itens = OrderedDict()
+        self.trava = threading.Lock()
+        self.acertos = 0
+        self.faltas = 0
+
+    def obter(self, chave, calcular):
+        with self.trava:
+            if chave in self.itens:
+                self.itens.move_to_end(chave)
+                self.acertos += 1
+                return self.itens[chave]
+            self.faltas += 1
+        valor = calcular()
+        with self.trava:
+            self.itens[chave] = valor
+            self.itens.move_to_end(chave)
+            while len(self.itens) > self.tamanho:
+                self.itens.popitem(last=False)
+        return valor
+
+    def limpar(self):
+        with self.trava:
+            self.itens.clear()
+
+
+class ServicoConsulta:
+    def __init__(self, diretorio=DIRETORIO_SAIDA, caminho_cubo=None, tamanho_cache=TAMANHO_CACHE,
+                 intervalo_recarga=None):
+        self.caminhos = {dimensao: os.path.join(diretorio, arquivo) for dimensao, arquivo in _ARQUIVOS.items()}
+        self.raiz_particoes = diretorio_particoes(diretorio)
+        self.caminho_cubo = caminho_cubo
+        self.cache = CacheLRU(tamanho_cache)
+        self.recargas = 0
+        self._parar = threading.Event()
+        self._vigia = None
+        self.resultados = self._carregar()
+        if intervalo_recarga:
+            self.vigiar(intervalo_recarga)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    # Identificação dos arquivos em uso (tamanho e data de modificação); muda quando as saídas são publicadas
+    def _assinatura(self):
+        assinatura = []
+        for caminho in (*self.caminhos.values(), os.path.join(self.raiz_particoes, ARQUIVO_MANIFESTO), self.caminho_cubo):
+            if caminho is None:
+                continue
+            try:
+                info = os.stat(caminho)
+            except FileNotFoundError:
+                assinatura.append((caminho, None))
+                continue
+            assinatura.append((caminho, info.st_size, info.st_mtime_ns))
+        return tuple(assinatura)
+
+    # Partições quando o manifesto é mais novo que as saídas únicas (ou quando só há partições)
+    def _usar_particoes(self, assinatura):
+        datas = {caminho: info[-1] for caminho, *info in assinatura if info[0] is not None}
+        manifesto = datas.get(os.path.join(self.raiz_particoes, ARQUIVO_MANIFESTO))
+        return manifesto is not None and all(datas.get(caminho, -1) < manifesto for caminho in self.caminhos.values())
+
+    def _carregar(self):
+        assinatura = self._assinatura()
+        linhas = {dimensao: {} for dimensao in _ARQUIVOS}
+        meses_por_chave = {dimensao: {} for dimensao in _ARQUIVOS}
+        cubo = None
+        manifesto = ler_manifesto(self.raiz_particoes) if self._usar_particoes(assinatura) else None
+        if manifesto is not None:
+            for particao in manifesto['particoes']:
+                for dimensao in _ARQUIVOS:
+                    caminho = os.path.join(self.raiz_particoes, particao['diretorio'], particao['arquivos'][dimensao]['csv'])
+                    ler_saida(caminho, _COLUNAS_CHAVE[dimensao], linhas[dimensao], meses_por_chave[dimensao])
+            for meses in (meses for indice in meses_por_chave.values() for meses in indice.values()):
+                meses.sort()
+            if any('cubo' in particao['arquivos'] for particao in manifesto['particoes']):
+                cubo = carregar_cubo_particionado(self.raiz_particoes, manifesto)
+        else:
+            for dimensao, caminho in self.caminhos.items():
+                if os.path.exists(caminho):
+                    ler_saida(caminho, _COLUNAS_CHAVE[dimensao], linhas[dimensao], meses_por_chave[dimensao])
+        if self.caminho_cubo and os.path.exists(self.caminho_cubo):
+            cubo = Cubo.carregar(self.caminho_cubo)
+        return _Resultados(self.recargas, assinatura, linhas, meses_por_chave, cubo)
+
+    # Função para recarregar os resultados se os arquivos mudaram; devolve True se houve recarga
+    def atualizar(self):
+        if self._assinatura() == self.resultados.assinatura:
+            return False
+        self.recargas += 1
+        self.resultados = self._carregar()
+        self.cache.limpar()
+        return True
+
+    # Recarga em segundo plano: verifica os arquivos a cada `intervalo` segundos
+    def vigiar(self, intervalo=INTERVALO_RECARGA):
+        if self._vigia is not None:
+            return
+
+        def laco():
+            while not self._parar.wait(intervalo):
+                try:
+                    self.atualizar()
+                except Exception:
+                    # Arquivo trocado durante a leitura; a próxima verificação tenta de novo
+                    continue
+
+        self._vigia = threading.Thread(target=laco, name='recarga-consulta', daemon=True)
+        self._vigia.start()
+
+    def fechar(self):
+        self._parar.set()
+        if self._vigia is not None:
+            self._vigia.join()
+            self._vigia = None
+
+    def meses(self):
+        return list(self.resultados.meses)
+
+    def _consultar(self, dimensao, chave, mes=None, faixa=None):
+        resultados = self.resultados
+        chave = str(chave).strip()
+        mes = normalizar_mes(mes)
+        meses = [mes] if mes else resultados.meses_por_chave[dimensao].get(chave, [])
+        registros = []
+        for data in meses:
+            valores = resultados.linhas[dimensao].get((chave, data))
+            if valores is None:
+                continue
+            registro = {_COLUNAS_CHAVE[dimensao]: chave, 'date': data}
+            if faixa is None:
+                registro.update(valores)
+            else:
+                if faixa not in valores:
+                    raise ValueError(f'Faixa etária desconhecida: {faixa!r}')
+                # Só as colunas gerais e as da faixa pedida (média e, se houver, quantis)
+                registro['faixa'] = faixa
+                registro.update((nome, valor) for nome, valor in valores.items()
+                                if nome.endswith('_geral') or nome == faixa or nome.endswith(f'_{faixa}'))
+            registros.append(registro)
+        return registros
+
+    # Estatísticas de uma subclasse (CNAE) por mês; com `mes`, só as daquele mês; com `faixa`, só as
+    # colunas gerais e as da faixa etária
+    def subclasse(self, cnae, mes=None, faixa=None):
+        return self._consultar('subclasses', cnae, mes, faixa)
+
+    # Estatísticas de uma ocupação (CBO 2002) por mês
+    def ocupacao(self, cbo, mes=None, faixa=None):
+        return self._consultar('ocupacoes', cbo, mes, faixa)
+
+    # Agrupamento do cubo (ex.: rollup(['mes', 'uf'], cbo='521110')), com cache LRU por consulta.
+    # Os filtros aceitam um valor ou uma lista; os meses aceitam as formas de normalizar_mes
+    def rollup(self, por=(), **filtros):
+        resultados = self.resultados
+        if resultados.cubo is None:
+            raise ValueError('Nenhum cubo carregado: gere-o com --cubo e inicie a consulta com --cubo')
+        por = (por,) if isinstance(por, str) else tuple(por)
+        for dimensao in (*por, *filtros):
+            if dimensao not in DIMENSOES:
+                raise ValueError(f"Dimensão desconhecida: {dimensao!r} (use {', '.join(DIMENSOES)})")
+        normalizados = {}
+        for dimensao, valores in filtros.items():
+            if valores is None:
+                continue
+            valores = [valores] if isinstance(valores, str) else list(valores)
+            if dimensao == 'mes':
+                valores = [normalizar_mes(valor) for valor in valores]
+            normalizados[dimensao] = tuple(sorted(valores))
+        # A versão dos resultados faz parte da chave: uma recarga nunca devolve um agrupamento antigo
+        chave = (resultados.geracao, por, tuple(sorted(normalizados.items())))
+
+        def calcular():
+            agrupado = resultados.cubo.rollup(*por, **{dimensao: list(valores) for dimensao, valores in normalizados.items()})
+            linhas = [{nome: _numero(valor) if isinstance(valor, float) else valor for nome, valor in linha.items()}
+                      for linha in agrupado.linhas()]
+            return sorted(linhas, key=lambda linha: tuple(linha[dimensao] for dimensao in por))
+
+        return self.cache.obter(chave, calcular)
+
+    def estado(self):
+        resultados = self.resultados
+        return {
+            'meses': len(resultados.meses),
+            'subclasses': len(resultados.meses_por_chave['subclasses']),
+            'ocupacoes': len(resultados.meses_por_chave['ocupacoes']),
+            'cubo': resultados.cubo.n_celulas if resultados.cubo is not None else None,
+            'carregado_em': resultados.carregado_em,
+            'recargas': self.recargas,
+            'cache': {'itens': len(self.cache.itens), 'acertos': self.cache.acertos, 'faltas': self.cache.faltas},
+        }
+
+
+# Servidor HTTP local (uma thread por conexão) com respostas JSON:
+#   /meses, /estado, /subclasse/<cnae>, /ocupacao/<cbo> (parâmetros mes e faixa),
+#   /rollup?por=mes,uf&subclasse=...&cbo=...&mes=...&faixa=...&uf=...
+# Toda requisição recebe uma resposta: 400 para uma consulta inválida (dimensão, filtro ou faixa
+# desconhecidos), 404 para chave ou caminho inexistente e 500, com o erro, para qualquer outra falha
+def criar_servidor(servico, host='127.0.0.1', porta=PORTA):
+    class Manipulador(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            partes = [unquote(parte) for parte in url.path.strip('/').split('/') if parte]
+            parametros = {nome: valores[-1] for nome, valores in parse_qs(url.query).items()}
+            try:
+                if partes == ['meses']:
+                    self._responder(200, {'meses': servico.meses()})
+                elif partes == ['estado']:
+                    self._responder(200, servico.estado())
+                elif len(partes) == 2 and partes[0] in ('subclasse', 'ocupacao'):
+                    consultar = servico.subclasse if partes[0] == 'subclasse' else servico.ocupacao
+                    registros = consultar(partes[1], parametros.get('mes'), parametros.get('faixa'))
+                    self._responder(200 if registros else 404, registros)
+                elif partes == ['rollup']:
+                    por = [nome for nome in parametros.pop('por', '').split(',') if nome]
+                    # Todos os demais parâmetros são filtros (um nome desconhecido é uma consulta inválida)
+                    filtros = {nome: valor.split(',') for nome, valor in parametros.items()}
+                    self._responder(200, servico.rollup(por, **filtros))
+                else:
+                    self._responder(404, {'erro': f'Caminho desconhecido: {url.path}'})
+            except ValueError as e:
+                self._responder(400, {'erro': f'Consulta inválida: {e}'})
+            except Exception as e:
+                traceback.print_exc()
+                self._responder(500, {'erro': f'Erro interno: {e}'})
+
+        def _responder(self, status, corpo):
+            dados = json.dumps(corpo, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        # Sem uma linha de log por requisição
+        def log_message(self, formato, *args):
+            pass
+
+    servidor = ThreadingHTTPServer((host, porta), Manipulador)
+    servidor.daemon_threads = True
+    return servidor
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serviço local de consulta aos resultados agregados do CAGEDMOV')
+    parser.add_argument('--diretorio', default=DIRETORIO_SAIDA, help='diretório com as saídas CSV')
+    parser.add_argument('--cubo', metavar='ARQUIVO', default=None, help='cubo .npz gravado com --cubo (para /rollup)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=PORTA)
+    parser.add_argument('--tamanho-cache', type=int, default=TAMANHO_CACHE, help='agrupamentos guardados no cache LRU')
+    parser.add_argument('--intervalo-recarga', type=float, default=INTERVALO_RECARGA,
+                        help='segundos entre as verificações de novas saídas (0 desliga a recarga)')
+    args = parser.parse_args()
+
+    with ServicoConsulta(args.diretorio, args.cubo, args.tamanho_cache, args.intervalo_recarga) as servico:
+        servidor = criar_servidor(servico, args.host, args.porta)
+        estado = servico.estado()
+        print(f"Consulta em http://{args.host}:{args.porta}: {estado['meses']} meses, {estado['subclasses']} subclasses, "
+              f"{estado['ocupacoes']} ocupações" + (f", cubo com {estado['cubo']} células" if estado['cubo'] else ''))
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            servidor.server_close()
@@ -0,0 +1,374 @@
+import argparse
+import os
+
+import numpy as np
+
+from caged.estatisticas import AgregadoParcial, Estatistica, EstatisticasChave
+
+# Cubo pré-agregado: cada célula é uma combinação de mês, subclasse, ocupação (CBO), faixa etária e UF,
+# com estatísticas somáveis do salário e da idade (contagem, soma, soma dos quadrados, mínimo e máximo).
+# As dimensões são codificadas por dicionário (código inteiro -> valor) e só as células com admissões
+# são guardadas. Combinar cubos é concatenar as células e somar as repetidas, então o cubo é reduzido
+# entre fatias, processos e workers como os agregados. As células acrescentadas (por bloco ou por cubo
+# combinado) ficam em partes pendentes e só são agrupadas com as demais quando passam do tamanho do cubo
+# ou quando os arrays são lidos, para que o custo não cresça com o quadrado do número de blocos. Qualquer agrupamento (CNAE x CBO, por mês,
+# por UF...) sai do cubo com rollup, sem reler os arquivos; as saídas por subclasse e por ocupação são
+# duas dessas projeções (agregado_parcial). Os quantis salariais não fazem parte do cubo
+#
+#   python -m caged.cubo output_caged/cubo.npz --por mes uf --filtro subclasse=4711302
+
+DIMENSOES = ('mes', 'subclasse', 'cbo', 'faixa', 'uf')
+
+# Colunas das somas de cada célula
+N, SOMA_SALARIO, SOMA_QUADRADOS_SALARIO, SOMA_IDADE, SOMA_QUADRADOS_IDADE = range(5)
+# Colunas dos mínimos e máximos de cada célula
+SALARIO, IDADE = range(2)
+
+# Células pendentes acumuladas antes de agrupá-las com o cubo, mesmo que o cubo seja menor
+CELULAS_PENDENTES = 64 * 1024
+
+# Formato e tipo dos arrays de n células (todos com 8 bytes por valor, para caberem em sequência na
+# mesma memória, como em caged.buffers)
+def formatos_celulas(n_celulas):
+    return [
+        ((n_celulas, len(DIMENSOES)), np.int64),
+        ((n_celulas, 5), np.float64),
+        ((n_celulas, 2), np.float64),
+        ((n_celulas, 2), np.float64),
+    ]
+
+
+def tamanho_celulas(n_celulas):
+    return sum(int(np.prod(formato)) * np.dtype(tipo).itemsize for formato, tipo in formatos_celulas(n_celulas))
+
+
+# Função para criar os arrays das células sobre uma memória existente (ex.: SharedMemory.buf), sem copiar
+def arrays_celulas(n_celulas, memoria):
+    arrays = []
+    deslocamento = 0
+    for formato, tipo in formatos_celulas(n_celulas):
+        array = np.ndarray(formato, dtype=tipo, buffer=memoria, offset=deslocamento)
+        deslocamento += array.nbytes
+        arrays.append(array)
+    return arrays
+
+
+# Função para agrupar linhas com os mesmos códigos: soma as somas e combina os extremos.
+# Devolve os códigos únicos (em ordem crescente) e as medidas de cada um
+def agrupar(codigos, somas, minimos, maximos, tamanhos):
+    if len(codigos) == 0:
+        return codigos, somas, minimos, maximos
+    if codigos.shape[1] == 0:
+        return (codigos[:1], somas.sum(axis=0, keepdims=True), minimos.min(axis=0, keepdims=True),
+                maximos.max(axis=0, keepdims=True))
+    try:
+        # Com poucas combinações possíveis, os códigos viram uma chave inteira única (ordenação mais rápida)
+        chave = np.ravel_multi_index(tuple(codigos.T), tuple(max(tamanho, 1) for tamanho in tamanhos))
+        ordem = np.argsort(chave, kind='stable')
+        chave = chave[ordem]
+        novo = np.empty(len(chave), dtype=bool)
+        novo[0] = True
+        novo[1:] = chave[1:] != chave[:-1]
+    except ValueError:
+        ordem = np.lexsort(codigos.T[::-1])
+        ordenados = codigos[ordem]
+        novo = np.empty(len(ordenados), dtype=bool)
+        novo[0] = True
+        novo[1:] = (ordenados[1:] != ordenados[:-1]).any(axis=1)
+    inicios = np.flatnonzero(novo)
+    return (codigos[ordem[inicios]], np.add.reduceat(somas[ordem], inicios, axis=0),
+            np.minimum.reduceat(minimos[ordem], inicios, axis=0), np.maximum.reduceat(maximos[ordem], inicios, axis=0))
+
+
+def _estatistica(somas, minimos, maximos, i, coluna_soma, coluna_extremo):
+    return Estatistica(int(somas[i, N]), float(somas[i, coluna_soma]), float(somas[i, coluna_soma + 1]),
+                       float(minimos[i, coluna_extremo]), float(maximos[i, coluna_extremo]))
+
+
+# Resultado de um rollup: uma linha por combinação dos valores das dimensões pedidas
+class Rollup:
+    __slots__ = ('dimensoes', 'dicionarios', 'codigos', 'somas', 'minimos', 'maximos')
+
+    def __init__(self, dimensoes, dicionarios, codigos, somas, minimos, maximos):
+        self.dimensoes = dimensoes
+        self.dicionarios = dicionarios
+        self.codigos = codigos
+        self.somas = somas
+        self.minimos = minimos
+        self.maximos = maximos
+
+    def __len__(self):
+        return len(self.codigos)
+
+    def chave(self, i):
+        return tuple(dicionario[codigo] for dicionario, codigo in zip(self.dicionarios, self.codigos[i].tolist()))
+
+    def chaves(self):
+        return [self.chave(i) for i in range(len(self))]
+
+    def n(self):
+        return self.somas[:, N].astype(np.int64)
+
+    def media_salarial(self):
+        return self.somas[:, SOMA_SALARIO] / np.maximum(self.somas[:, N], 1)
+
+    def media_idade(self):
+        return self.somas[:, SOMA_IDADE] / np.maximum(self.somas[:, N], 1)
+
+    def salario(self, i):
+        return _estatistica(self.somas, self.minimos, self.maximos, i, SOMA_SALARIO, SALARIO)
+
+    def idade(self, i):
+        return _estatistica(self.somas, self.minimos, self.maximos, i, SOMA_IDADE, IDADE)
+
+    # Linhas como dicionários: valores das dimensões, contagem e médias
+    def linhas(self):
+        medias_salario = self.media_salarial()
+        medias_idade = self.media_idade()
+        contagens = self.n()
+        for i in range(len(self)):
+            linha = dict(zip(self.dimensoes, self.chave(i)))
+            linha['n'] = int(contagens[i])
+            linha['media_salarial'] = float(medias_salario[i])
+            linha['media_idade'] = float(medias_idade[i])
+            yield linha
+
+    def __repr__(self):
+        return f'Rollup({self.dimensoes!r}, {len(self)} linhas)'
+
+
+class Cubo:
+    __slots__ = ('dicionarios', 'indices', '_celulas', 'pendentes', 'n_pendentes')
+
+    def __init__(self):
+        self.dicionarios = {dimensao: [] for dimensao in DIMENSOES}
+        self.indices = {dimensao: {} for dimensao in DIMENSOES}
+        self._celulas = (np.empty((0, len(DIMENSOES)), dtype=np.int64), np.empty((0, 5)), np.empty((0, 2)),
+                         np.empty((0, 2)))
+        # Partes (códigos, somas, mínimos, máximos) já agrupadas cada uma, ainda não agrupadas com _celulas
+        self.pendentes = []
+        self.n_pendentes = 0
+
+    def __getstate__(self):
+        return (self.dicionarios, *self.celulas)
+
+    def __setstate__(self, estado):
+        self.dicionarios, *celulas = estado
+        self._celulas = tuple(celulas)
+        self.pendentes = []
+        self.n_pendentes = 0
+        self.indices = {dimensao: {valor: codigo for codigo, valor in enumerate(valores)}
+                        for dimensao, valores in self.dicionarios.items()}
+
+    # Células agrupadas (códigos únicos em ordem crescente): códigos, somas, mínimos e máximos
+    @property
+    def celulas(self):
+        if self.pendentes:
+            self._agrupar_pendentes()
+        return self._celulas
+
+    @property
+    def codigos(self):
+        return self.celulas[0]
+
+    @property
+    def somas(self):
+        return self.celulas[1]
+
+    @property
+    def minimos(self):
+        return self.celulas[2]
+
+    @property
+    def maximos(self):
+        return self.celulas[3]
+
+    def _agrupar_pendentes(self):
+        partes = [self._celulas, *self.pendentes] if len(self._celulas[0]) else self.pendentes
+        self.pendentes = []
+        self.n_pendentes = 0
+        if len(partes) == 1:
+            self._celulas = partes[0]
+            return
+        self._celulas = agrupar(*(np.concatenate(arrays) for arrays in zip(*partes)), self.tamanhos())
+
+    @property
+    def n_celulas(self):
+        return len(self.codigos)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.celulas)
+
+    def tamanhos(self):
+        return [len(self.dicionarios[dimensao]) for dimensao in DIMENSOES]
+
+    # Códigos dos valores de uma dimensão, criando os dos valores novos
+    def codificar(self, dimensao, valores):
+        indice = self.indices[dimensao]
+        dicionario = self.dicionarios[dimensao]
+        codigos = np.empty(len(valores), dtype=np.int64)
+        for i, valor in enumerate(valores):
+            codigo = indice.get(valor)
+            if codigo is None:
+                codigo = indice[valor] = len(dicionario)
+                dicionario.append(valor)
+            codigos[i] = codigo
+        return codigos
+
+    # Função para acrescentar células (códigos deste cubo); células repetidas são combinadas. As células
+    # entram como uma parte pendente (agrupada só entre si, a menos que `agrupadas` diga que já estão),
+    # e as partes são agrupadas com o cubo quando passam do tamanho dele
+    def adicionar_celulas(self, codigos, somas, minimos, maximos, agrupadas=False):
+        if not len(codigos):
+            return self
+        if not agrupadas:
+            codigos, somas, minimos, maximos = agrupar(codigos, somas, minimos, maximos, self.tamanhos())
+        self.pendentes.append((codigos, somas, minimos, maximos))
+        self.n_pendentes += len(codigos)
+        if self.n_pendentes > max(len(self._celulas[0]), CELULAS_PENDENTES):
+            self._agrupar_pendentes()
+        return self
+
+    # Função para acrescentar linhas aceitas: códigos (linhas x dimensões), salário e idade de cada linha
+    def adicionar_linhas(self, codigos, salario, idade):
+        somas = np.empty((len(codigos), 5))
+        somas[:, N] = 1
+        somas[:, SOMA_SALARIO] = salario
+        somas[:, SOMA_QUADRADOS_SALARIO] = salario * salario
+        somas[:, SOMA_IDADE] = idade
+        somas[:, SOMA_QUADRADOS_IDADE] = idade * idade
+        extremos = np.column_stack([salario, idade]).astype(np.float64)
+        return self.adicionar_celulas(codigos, somas, extremos, extremos)
+
+    def combinar(self, outro):
+        if not outro.n_celulas:
+            return self
+        codigos = np.empty_like(outro.codigos)
+        for d, dimensao in enumerate(DIMENSOES):
+            mapa = self.codificar(dimensao, outro.dicionarios[dimensao])
+            codigos[:, d] = mapa[outro.codigos[:, d]] if len(mapa) else 0
+        return self.adicionar_celulas(codigos, outro.somas, outro.minimos, outro.maximos, agrupadas=True)
+
+    # Função para agrupar o cubo pelas dimensões pedidas. Os filtros restringem valores de dimensões
+    # (um valor ou uma lista de valores), ex.: cubo.rollup('mes', 'uf', subclasse='4711302')
+    def rollup(self, *dimensoes, **filtros):
+        for dimensao in (*dimensoes, *filtros):
+            if dimensao not in DIMENSOES:
+                raise ValueError(f"Dimensão desconhecida: {dimensao!r} (use {', '.join(DIMENSOES)})")
+        colunas = [DIMENSOES.index(dimensao) for dimensao in dimensoes]
+        codigos, somas, minimos, maximos = self.codigos, self.somas, self.minimos, self.maximos
+        if filtros:
+            manter = np.ones(self.n_celulas, dtype=bool)
+            for dimensao, valores in filtros.items():
+                if isinstance(valores, str) or not hasattr(valores, '__iter__'):
+                    valores = [valores]
+                indice = self.indices[dimensao]
+                escolhidos = [indice[valor] for valor in valores if valor in indice]
+                manter &= np.isin(codigos[:, DIMENSOES.index(dimensao)], escolhidos)
+            codigos, somas, minimos, maximos = codigos[manter], somas[manter], minimos[manter], maximos[manter]
+        tamanhos = self.tamanhos()
+        agrupados = agrupar(codigos[:, colunas], somas, minimos, maximos, [tamanhos[c] for c in colunas])
+        return Rollup(tuple(dimensoes), [self.dicionarios[dimensao] for dimensao in dimensoes], *agrupados)
+
+    # Função para projetar o cubo nas estatísticas por subclasse e por ocupação (as saídas CSV),
+    # somando os meses e as UFs presentes no cubo
+    def agregado_parcial(self):
+        agregado = AgregadoParcial()
+        for dimensao, destino in (('subclasse', agregado.subclasses), ('cbo', agregado.ocupacoes)):
+            total = self.rollup(dimensao)
+            for i in range(len(total)):
+                estatisticas = destino[total.chave(i)[0]] = EstatisticasChave()
+                estatisticas.salario = total.salario(i)
+                estatisticas.idade = total.idade(i)
+            por_faixa = self.rollup(dimensao, 'faixa')
+            for i in range(len(por_faixa)):
+                chave, faixa = por_faixa.chave(i)
+                destino[chave].faixas[faixa] = por_faixa.salario(i)
+        return agregado
+
+    # Gravação em .npz sem compressão (escrita atômica); os dicionários vão como arrays de texto
+    def salvar(self, caminho):
+        diretorio = os.path.dirname(caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        arrays = {'codigos': self.codigos, 'somas': self.somas, 'minimos': self.minimos, 'maximos': self.maximos}
+        for dimensao in DIMENSOES:
+            arrays[f'dicionario_{dimensao}'] = np.array(self.dicionarios[dimensao], dtype=str)
+        temporario = f'{caminho}.{os.getpid()}.tmp'
+        with open(temporario, mode='wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temporario, caminho)
+
+    @classmethod
+    def carregar(cls, caminho):
+        cubo = cls()
+        with np.load(caminho, allow_pickle=False) as arquivo:
+            dicionarios = {dimensao: arquivo[f'dicionario_{dimensao}'].tolist() for dimensao in DIMENSOES}
+            cubo.__setstate__((dicionarios, arquivo['codigos'], arquivo['somas'], arquivo['minimos'], arquivo['maximos']))
+        return cubo
+
+    def __repr__(self):
+        tamanhos = ', '.join(f'{dimensao}={len(self.dicionarios[dimensao])}' for dimensao in DIMENSOES)
+        return f'Cubo({self.n_celulas} células; {tamanhos})'
+
+
+# Acumulador do motor de linhas: células num dicionário (uma atualização por linha), convertidas em cubo
+# no fim da fatia
+class AcumuladorCubo:
+    __slots__ = ('mes', 'celulas')
+
+    def __init__(self, mes):
+        self.mes = mes
+        self.celulas = {}
+
+    def registrar(self, subclasse, cbo, salario, idade, faixa, uf=''):
+        celula = self.celulas.get((subclasse, cbo, faixa, uf))
+        if celula is None:
+            self.celulas[(subclasse, cbo, faixa, uf)] = [1, salario, salario * salario, idade, idade * idade,
+                                                          salario, idade, salario, idade]
+            return
+        celula[0] += 1
+        celula[1] += salario
+        celula[2] += salario * salario
+        celula[3] += idade
+        celula[4] += idade * idade
+        if salario < celula[5]:
+            celula[5] = salario
+        if idade < celula[6]:
+            celula[6] = idade
+        if salario > celula[7]:
+            celula[7] = salario
+        if idade > celula[8]:
+            celula[8] = idade
+
+    def cubo(self):
+        cubo = Cubo()
+        if not self.celulas:
+            return cubo
+        chaves = list(self.celulas)
+        codigos = np.empty((len(chaves), len(DIMENSOES)), dtype=np.int64)
+        codigos[:, DIMENSOES.index('mes')] = cubo.codificar('mes', [self.mes])[0]
+        for posicao, dimensao in enumerate(('subclasse', 'cbo', 'faixa', 'uf')):
+            codigos[:, DIMENSOES.index(dimensao)] = cubo.codificar(dimensao, [chave[posicao] for chave in chaves])
+        valores = np.array(list(self.celulas.values()), dtype=np.float64)
+        return cubo.adicionar_celulas(codigos, valores[:, :5], valores[:, 5:7], valores[:, 7:9])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Agrupamentos (rollup) do cubo de admissões do CAGEDMOV')
+    parser.add_argument('cubo', help='arquivo .npz gravado com --cubo')
+    parser.add_argument('--por', nargs='*', default=[], choices=DIMENSOES, help='dimensões do agrupamento')
+    parser.add_argument('--filtro', action='append', default=[], metavar='DIMENSAO=VALOR',
+                        help='restringe uma dimensão a um valor (pode repetir; valores separados por vírgula)')
+    args = parser.parse_args()
+
+    filtros = {}
+    for filtro in args.filtro:
+        dimensao, _, valores = filtro.partition('=')
+        filtros.setdefault(dimensao, []).extend(valores.split(','))
+    resultado = Cubo.carregar(args.cubo).rollup(*args.por, **filtros)
+    print(';'.join([*args.por, 'n', 'media_salarial', 'media_idade']))
+    for linha in resultado.linhas():
+        print(';'.join([*(str(linha[dimensao]) for dimensao in args.por), str(linha['n']),
+                        f"{linha['media_salarial']:.2f}", f"{linha['media_idade']:.2f}"]))
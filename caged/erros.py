@@ -0,0 +1,85 @@
+import time
+
+# Contabilidade dos erros de uma execução. Em vez de abrir e acrescentar ao log uma vez por linha com
+# erro, cada trabalhador acumula em memória a contagem por arquivo e tipo de erro, com uma amostra
+# limitada das linhas (ou mensagens) de cada par. Os registros voltam junto com os agregados e são
+# combinados pelo mesmo caminho (no pool e no Dask com os parciais das tarefas; no MPI numa redução de
+# todos os processos, não só do processo 0), e o log é escrito uma única vez, no fim da execução
+
+ARQUIVO_LOG = 'log_CAGEDERRORS.txt'
+
+# Amostras guardadas por arquivo e tipo de erro
+LIMITE_AMOSTRAS = 5
+
+DESCRICOES = {
+    'linha': 'linhas com valor inválido',
+    'colunas': 'colunas necessárias não encontradas',
+    'abertura': 'erros ao abrir ou processar o arquivo',
+    'mensagem': 'mensagens',
+}
+
+
+class RegistroErros:
+    __slots__ = ('contagens', 'amostras', 'limite_amostras')
+
+    def __init__(self, limite_amostras=LIMITE_AMOSTRAS):
+        # (arquivo, tipo) -> quantidade e (arquivo, tipo) -> amostras
+        self.contagens = {}
+        self.amostras = {}
+        self.limite_amostras = limite_amostras
+
+    def registrar(self, arquivo, tipo, quantidade=1, amostras=()):
+        chave = (arquivo, tipo)
+        self.contagens[chave] = self.contagens.get(chave, 0) + quantidade
+        guardadas = self.amostras.setdefault(chave, [])
+        guardadas.extend(amostras[:self.limite_amostras - len(guardadas)])
+
+    # Quantas amostras ainda cabem para o arquivo e tipo (para não montar o texto de linhas descartadas)
+    def faltam_amostras(self, arquivo, tipo):
+        return max(self.limite_amostras - len(self.amostras.get((arquivo, tipo), ())), 0)
+
+    # Compatível com as funções de log (registrar_log(mensagem)), para a listagem e a divisão dos arquivos
+    def __call__(self, mensagem):
+        self.registrar('', 'mensagem', amostras=[mensagem])
+
+    def combinar(self, outro):
+        for (arquivo, tipo), quantidade in outro.contagens.items():
+            self.registrar(arquivo, tipo, quantidade, outro.amostras.get((arquivo, tipo), []))
+        return self
+
+    def limpar(self):
+        self.contagens.clear()
+        self.amostras.clear()
+
+    def total(self):
+        return sum(self.contagens.values())
+
+    def como_dict(self):
+        relatorio = {}
+        for (arquivo, tipo), quantidade in sorted(self.contagens.items()):
+            relatorio.setdefault(arquivo, {})[tipo] = {'quantidade': quantidade,
+                                                      'amostras': list(self.amostras.get((arquivo, tipo), []))}
+        return relatorio
+
+    # Linhas do log: um resumo por arquivo e tipo de erro, seguido das amostras
+    def linhas_log(self):
+        for (arquivo, tipo), quantidade in sorted(self.contagens.items()):
+            if tipo == 'mensagem':
+                yield from self.amostras.get((arquivo, tipo), [])
+                if quantidade > len(self.amostras.get((arquivo, tipo), [])):
+                    yield f"... e mais {quantidade - len(self.amostras[(arquivo, tipo)])} mensagens"
+                continue
+            yield f"Erros no arquivo {arquivo}: {quantidade} {DESCRICOES.get(tipo, tipo)}"
+            for amostra in self.amostras.get((arquivo, tipo), []):
+                yield f"    {amostra}"
+
+    # Acrescenta ao log, de uma vez, os erros da execução (nada é escrito se não houve erros)
+    def gravar(self, caminho=ARQUIVO_LOG):
+        if not self.contagens:
+            return
+        linhas = [f"# {time.strftime('%Y-%m-%d %H:%M:%S')}: {self.total()} erros", *self.linhas_log()]
+        with open(caminho, 'a', encoding='utf-8') as f:
+            f.write('\n'.join(linhas) + '\n')
+
+    def __repr__(self):
+        return f'RegistroErros({self.total()} erros)'
@@ -0,0 +1,67 @@
+import time
+
+from mpi4py import MPI
+
+# Escalonamento mestre/trabalhador: o processo 0 entrega as fatias, da maior para a menor,
+# ao primeiro processo que ficar livre, em vez de uma divisão fixa por quantidade
+
+TAG_PEDIDO = 1
+TAG_TAREFA = 2
+TAG_FIM = 3
+
+
+# Tempo ocupado e ocioso de um processo, para o relatório de carga
+class Carga:
+    __slots__ = ('rank', 'tarefas', 'bytes', 'ocupado', 'total')
+
+    def __init__(self, rank):
+        self.rank = rank
+        self.tarefas = 0
+        self.bytes = 0
+        self.ocupado = 0.0
+        self.total = 0.0
+
+    @property
+    def ocioso(self):
+        return max(self.total - self.ocupado, 0.0)
+
+    def registrar(self, fatia, inicio):
+        self.tarefas += 1
+        self.bytes += fatia.tamanho
+        self.ocupado += time.perf_counter() - inicio
+
+
+# Mestre: atende pedidos até esgotar as fatias e depois avisa cada trabalhador que terminou
+def distribuir_tarefas(comm, fatias):
+    fila = sorted(fatias, key=lambda fatia: fatia.tamanho, reverse=True)
+    status = MPI.Status()
+    ativos = comm.Get_size() - 1
+    proxima = 0
+    while ativos:
+        comm.recv(source=MPI.ANY_SOURCE, tag=TAG_PEDIDO, status=status)
+        destino = status.Get_source()
+        if proxima < len(fila):
+            comm.send(fila[proxima], dest=destino, tag=TAG_TAREFA)
+            proxima += 1
+        else:
+            comm.send(None, dest=destino, tag=TAG_FIM)
+            ativos -= 1
+
+
+# Trabalhador: pede uma fatia, processa e pede a próxima, até o mestre responder com TAG_FIM
+def receber_tarefas(comm):
+    status = MPI.Status()
+    while True:
+        comm.send(None, dest=0, tag=TAG_PEDIDO)
+        fatia = comm.recv(source=0, tag=MPI.ANY_TAG, status=status)
+        if status.Get_tag() == TAG_FIM:
+            return
+        yield fatia
+
+
+# Função para imprimir a carga de cada processo (chamada no processo 0 com as cargas recolhidas)
+def imprimir_cargas(cargas):
+    print("\nCarga por processo:")
+    for carga in cargas:
+        print(f"  rank {carga.rank}: {carga.tarefas} fatias, {carga.bytes / (1024 * 1024):.1f} MB, "
+              f"ocupado {carga.ocupado:.2f} s, ocioso {carga.ocioso:.2f} s")
@@ -0,0 +1,188 @@
+import math
+
+from caged.quantis import EsbocoQuantis
+
+
+# Acumulador mesclável: guarda apenas contagem, soma, soma dos quadrados, mínimo e máximo,
+# de modo que a memória cresce com o número de chaves e não com o número de linhas
+class Estatistica:
+    __slots__ = ('n', 'soma', 'soma_quadrados', 'minimo', 'maximo')
+
+    def __init__(self, n=0, soma=0.0, soma_quadrados=0.0, minimo=math.inf, maximo=-math.inf):
+        self.n = n
+        self.soma = soma
+        self.soma_quadrados = soma_quadrados
+        self.minimo = minimo
+        self.maximo = maximo
+
+    def adicionar(self, valor):
+        self.n += 1
+        self.soma += valor
+        self.soma_quadrados += valor * valor
+        if valor < self.minimo:
+            self.minimo = valor
+        if valor > self.maximo:
+            self.maximo = valor
+
+    def combinar(self, outra):
+        self.n += outra.n
+        self.soma += outra.soma
+        self.soma_quadrados += outra.soma_quadrados
+        if outra.minimo < self.minimo:
+            self.minimo = outra.minimo
+        if outra.maximo > self.maximo:
+            self.maximo = outra.maximo
+        return self
+
+    # Mesma convenção do antigo calcular_media: sem valores, a média é 0.0
+    def media(self):
+        if self.n:
+            return self.soma / self.n
+        return 0.0
+
+    # Variância amostral calculada a partir das somas
+    def variancia(self):
+        if self.n < 2:
+            return 0.0
+        desvio = self.soma_quadrados - self.soma * self.soma / self.n
+        return max(desvio, 0.0) / (self.n - 1)
+
+    def desvio_padrao(self):
+        return math.sqrt(self.variancia())
+
+    def __repr__(self):
+        return f'Estatistica(n={self.n}, media={self.media():.2f}, minimo={self.minimo}, maximo={self.maximo})'
+
+
+# Estatísticas de uma chave (subclasse CNAE ou ocupação CBO): salário, idade e salário por faixa etária.
+# No modo de quantis, guarda também esboços dos salários, no geral (quantis) e por faixa (quantis_faixas)
+class EstatisticasChave:
+    __slots__ = ('salario', 'idade', 'faixas', 'quantis', 'quantis_faixas')
+
+    def __init__(self, quantis=False):
+        self.salario = Estatistica()
+        self.idade = Estatistica()
+        self.faixas = {}
+        self.quantis = EsbocoQuantis() if quantis else None
+        self.quantis_faixas = {}
+
+    def registrar(self, salario, idade, faixa):
+        self.salario.adicionar(salario)
+        self.idade.adicionar(idade)
+        if faixa is not None:
+            estatistica = self.faixas.get(faixa)
+            if estatistica is None:
+                estatistica = self.faixas[faixa] = Estatistica()
+            estatistica.adicionar(salario)
+        if self.quantis is not None:
+            self.quantis.adicionar(salario)
+            if faixa is not None:
+                esboco = self.quantis_faixas.get(faixa)
+                if esboco is None:
+                    esboco = self.quantis_faixas[faixa] = EsbocoQuantis()
+                esboco.adicionar(salario)
+
+    def combinar(self, outra):
+        self.salario.combinar(outra.salario)
+        self.idade.combinar(outra.idade)
+        for faixa, estatistica in outra.faixas.items():
+            if faixa in self.faixas:
+                self.faixas[faixa].combinar(estatistica)
+            else:
+                self.faixas[faixa] = Estatistica().combinar(estatistica)
+        if outra.quantis is not None:
+            if self.quantis is None:
+                self.quantis = EsbocoQuantis()
+            self.quantis.combinar(outra.quantis)
+            for faixa, esboco in outra.quantis_faixas.items():
+                if faixa in self.quantis_faixas:
+                    self.quantis_faixas[faixa].combinar(esboco)
+                else:
+                    self.quantis_faixas[faixa] = EsbocoQuantis().combinar(esboco)
+        return self
+
+    def media_faixa(self, faixa):
+        estatistica = self.faixas.get(faixa)
+        if estatistica is None:
+            return 0.0
+        return estatistica.media()
+
+    # Quantis aproximados do salário (0.0 sem esboço, como a média sem valores)
+    def quantil(self, q):
+        if self.quantis is None:
+            return 0.0
+        return self.quantis.quantil(q)
+
+    def quantil_faixa(self, faixa, q):
+        esboco = self.quantis_faixas.get(faixa)
+        if esboco is None:
+            return 0.0
+        return esboco.quantil(q)
+
+
+# Resultado parcial de um arquivo, de um processo ou da redução final.
+# Com quantis=True, as chaves registradas guardam também esboços de quantis dos salários
+class AgregadoParcial:
+    __slots__ = ('subclasses', 'ocupacoes', 'quantis')
+
+    def __init__(self, quantis=False):
+        self.subclasses = {}
+        self.ocupacoes = {}
+        self.quantis = quantis
+
+    def registrar(self, subclasse, cbo, salario, idade, faixa):
+        estatisticas = self.subclasses.get(subclasse)
+        if estatisticas is None:
+            estatisticas = self.subclasses[subclasse] = EstatisticasChave(self.quantis)
+        estatisticas.registrar(salario, idade, faixa)
+
+        estatisticas = self.ocupacoes.get(cbo)
+        if estatisticas is None:
+            estatisticas = self.ocupacoes[cbo] = EstatisticasChave(self.quantis)
+        estatisticas.registrar(salario, idade, faixa)
+
+    def combinar(self, outro):
+        self.quantis = self.quantis or outro.quantis
+        _combinar_chaves(self.subclasses, outro.subclasses)
+        _combinar_chaves(self.ocupacoes, outro.ocupacoes)
+        return self
+
+    def vazio(self):
+        return not self.subclasses and not self.ocupacoes
+
+    # Estimativa dos bytes do agregado (números de 8 bytes e o texto das chaves), sem serializá-lo
+    @property
+    def nbytes(self):
+        return _bytes_chaves(self.subclasses) + _bytes_chaves(self.ocupacoes)
+
+
+# Cada Estatistica tem 5 números; cada bucket não vazio de um esboço, índice e contagem
+_BYTES_ESTATISTICA = 5 * 8
+_BYTES_BUCKET = 2 * 8
+
+
+def _bytes_chaves(estatisticas_por_chave):
+    total = 0
+    for chave, estatisticas in estatisticas_por_chave.items():
+        total += len(chave) + _BYTES_ESTATISTICA * (2 + len(estatisticas.faixas))
+        if estatisticas.quantis is not None:
+            total += _BYTES_BUCKET * (len(estatisticas.quantis.contagens) +
+                                      sum(len(esboco.contagens) for esboco in estatisticas.quantis_faixas.values()))
+    return total
+
+
+def _combinar_chaves(destino, origem):
+    for chave, estatisticas in origem.items():
+        if chave in destino:
+            destino[chave].combinar(estatisticas)
+        else:
+            destino[chave] = EstatisticasChave().combinar(estatisticas)
+
+
+# Função para combinar uma sequência de resultados parciais (ignora falhas representadas por None)
+def combinar_agregados(agregados):
+    total = AgregadoParcial()
+    for agregado in agregados:
+        if agregado is not None:
+            total.combinar(agregado)
+    return total
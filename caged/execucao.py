@@ -0,0 +1,893 @@
+import argparse
+import contextlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from caged.amostragem import BLOCO_AMOSTRA
+from caged.antecipacao import PROFUNDIDADE
+from caged.cache import TAMANHO_FATIA_CACHE, VERSAO_REGRAS, CacheParciais
+from caged.cubo import Cubo
+from caged.erros import ARQUIVO_LOG, RegistroErros
+from caged.estatisticas import AgregadoParcial, combinar_agregados
+from caged.fatias import TAMANHO_BLOCO, TAMANHO_FATIA, antecipar_fatia, dividir_arquivos, fatias_antecipadas
+from caged.nucleo import MOTORES, format_string, processar_tarefa, registrar_log
+from caged.fragmentos import EscritorFragmentos, criar_escritor_fragmento, descrever_fragmento
+from caged.particoes import EscritorParticoes, diretorio_particoes, escrever_particao, novo_identificador
+from caged.perfil import Perfil, combinar_perfis, gravar_perfil
+from caged.quantis import verificar_faixa_quantis
+from caged.regras import REGRAS_PADRAO, carregar_regras, como_regras
+from caged.saida import DIRETORIO_SAIDA, EscritorSaidas
+
+# Executor comum dos backends: lista os arquivos, dimensiona o trabalho (número de trabalhadores e tamanho
+# das fatias) a partir do total de bytes e dos núcleos disponíveis, executa o núcleo (caged.nucleo) no
+# backend escolhido e escreve as saídas com o mesmo escritor (caged.saida). Todos os backends produzem os
+# mesmos agregados por mês e as mesmas linhas de saída (médias iguais a menos do arredondamento de ponto
+# flutuante, que depende da ordem das somas); os scripts cnaePorData.py (MPI),
+# cnaePorDatadex.py (Dask) e cnaePorPool.py só fixam o backend. Com --backend auto:
+#
+#   python -m caged.execucao                      # sequencial ou pool, conforme o volume de dados
+#   mpirun -n 4 python -m caged.execucao          # MPI (detectado pelo ambiente do mpirun)
+#
+# Com --cubo ARQUIVO, as tarefas produzem cubos (caged.cubo) em vez de agregados; os cubos são combinados
+# e reduzidos como os agregados, as saídas são projeções deles e o cubo completo é gravado no ARQUIVO.
+# Com --particoes, cada mês é escrito numa partição própria (caged.particoes) pelo processo ou worker
+# que o reduziu, em paralelo, e um manifesto liga as partições no fim. Com --regras ARQUIVO, as regras de
+# unidade salarial, faixa salarial e faixas etárias vêm de uma especificação JSON (caged.regras).
+# No MPI, com --embaralhamento, os parciais são trocados por hash das chaves e cada processo finaliza e
+# escreve o fragmento das suas chaves (caged.fragmentos), sem reduzir tudo no processo 0.
+# Com --amostragem TAXA, só uma fração dos blocos de cada mês é lida e as saídas trazem intervalos de
+# confiança das médias (caged.amostragem); com --erro-alvo, a amostra cresce até o erro pedido
+
+BACKENDS = ('auto', 'sequencial', 'pool', 'mpi', 'dask')
+
+DIRETORIO_ENTRADA = './CAGEDMOV_downloads'
+
+# Abaixo disso por trabalhador, o custo de iniciar processos supera o ganho
+BYTES_POR_TRABALHADOR = 32 * 1024 * 1024
+# Fatias por trabalhador: mais de uma, para equilibrar a carga entre arquivos de tamanhos diferentes
+FATIAS_POR_TRABALHADOR = 4
+TAMANHO_FATIA_MINIMO = 8 * 1024 * 1024
+
+# Quantos parciais cada tarefa da redução em árvore do Dask combina
+ARIDADE_REDUCAO = 8
+
+_MB = 1024 * 1024
+
+# Variáveis de ambiente com o número de processos definidas pelo mpirun (Open MPI, MPICH/Hydra, MVAPICH)
+_AMBIENTE_MPI = ('OMPI_COMM_WORLD_SIZE', 'PMI_SIZE', 'MV2_COMM_WORLD_SIZE')
+
+
+# Opções de uma execução, independentes do backend (tamanhos em bytes)
+class Configuracao:
+    __slots__ = ('backend', 'motor', 'trabalhadores', 'tamanho_fatia', 'tamanho_bloco', 'profundidade', 'diretorio_cache',
+                 'diretorio_armazenamento', 'prefiltro', 'quantis', 'caminho_perfil', 'perfil_detalhado', 'escalonamento', 'aridade',
+                 'threads_por_worker', 'diretorio_entrada', 'diretorio_saida', 'cubo', 'particoes', 'binario', 'regras', 'embaralhamento',
+                 'amostragem', 'erro_alvo', 'bloco_amostra', 'semente')
+
+    def __init__(self, backend='auto', motor='vetorizado', trabalhadores=None, tamanho_fatia=None,
+                 tamanho_bloco=TAMANHO_BLOCO, profundidade=PROFUNDIDADE, diretorio_cache=None,
+                 diretorio_armazenamento=None, prefiltro=True, quantis=False, caminho_perfil=None,
+                 escalonamento='estatico', aridade=ARIDADE_REDUCAO, threads_por_worker=1,
+                 diretorio_entrada=DIRETORIO_ENTRADA, diretorio_saida=DIRETORIO_SAIDA, cubo=None, particoes=False,
+                 binario=False, regras=REGRAS_PADRAO, embaralhamento=False, amostragem=None, erro_alvo=None,
+                 bloco_amostra=BLOCO_AMOSTRA, semente=0, perfil_detalhado=False):
+        if cubo and quantis:
+            raise ValueError('O cubo guarda apenas estatísticas somáveis; --quantis não pode ser usado com --cubo')
+        if binario and not particoes:
+            raise ValueError('O formato binário só existe nas saídas particionadas: use --binario com --particoes')
+        if embaralhamento and (cubo or particoes):
+            raise ValueError('Os fragmentos por hash das chaves substituem as saídas por mês: --embaralhamento não '
+                             'pode ser usado com --cubo nem com --particoes')
+        if amostragem is not None and not 0 < amostragem <= 1:
+            raise ValueError('A taxa de --amostragem deve estar entre 0 (exclusive) e 1')
+        if erro_alvo is not None and amostragem is None:
+            raise ValueError('--erro-alvo refina uma amostra: use com --amostragem')
+        if amostragem and (cubo or particoes or embaralhamento or diretorio_cache):
+            raise ValueError('O modo aproximado escreve só as saídas únicas: --amostragem não pode ser usado com '
+                             '--cubo, --particoes, --embaralhamento nem --cache')
+        if diretorio_cache and tamanho_fatia is None:
+            # Faixas das fatias independentes da execução, para que os parciais do cache continuem valendo
+            tamanho_fatia = TAMANHO_FATIA_CACHE
+        self.backend = backend
+        self.motor = motor
+        self.trabalhadores = trabalhadores
+        self.tamanho_fatia = tamanho_fatia
+        self.tamanho_bloco = tamanho_bloco
+        self.profundidade = profundidade
+        self.diretorio_cache = diretorio_cache
+        self.diretorio_armazenamento = diretorio_armazenamento
+        self.prefiltro = prefiltro
+        self.quantis = quantis
+        self.caminho_perfil = caminho_perfil
+        self.perfil_detalhado = perfil_detalhado
+        self.escalonamento = escalonamento
+        self.aridade = aridade
+        self.threads_por_worker = threads_por_worker
+        self.diretorio_entrada = diretorio_entrada
+        self.diretorio_saida = diretorio_saida
+        self.cubo = cubo
+        self.particoes = particoes
+        self.binario = binario
+        self.regras = como_regras(regras)
+        if quantis:
+            verificar_faixa_quantis(self.regras)
+        self.embaralhamento = embaralhamento
+        self.amostragem = amostragem
+        self.erro_alvo = erro_alvo
+        self.bloco_amostra = bloco_amostra
+        self.semente = semente
+
+    # Configuração a partir das opções de linha de comando de criar_parser (tamanhos em MB)
+    @classmethod
+    def de_argumentos(cls, args, backend=None):
+        return cls(backend or args.backend, args.motor, args.trabalhadores,
+                   args.tamanho_fatia * _MB if args.tamanho_fatia else None, args.tamanho_bloco * _MB,
+                   args.leitura_antecipada, args.cache, args.armazenamento, not args.sem_prefiltro, args.quantis,
+                   args.perfil, args.escalonamento, args.aridade, args.threads_por_worker, cubo=args.cubo,
+                   particoes=args.particoes, binario=args.binario,
+                   regras=carregar_regras(args.regras) if args.regras else REGRAS_PADRAO,
+                   embaralhamento=args.embaralhamento, amostragem=args.amostragem, erro_alvo=args.erro_alvo,
+                   bloco_amostra=args.bloco_amostra * 1024, semente=args.semente,
+                   perfil_detalhado=args.perfil_detalhado)
+
+    @property
+    def versao_cache(self):
+        # Parciais com esboços de quantis (ou cubos) ficam numa versão própria do cache, assim como os
+        # parciais de regras diferentes das padrão
+        if self.cubo:
+            versao = f'{VERSAO_REGRAS}-cubo'
+        else:
+            versao = f'{VERSAO_REGRAS}-quantis' if self.quantis else VERSAO_REGRAS
+        return versao if self.regras.padrao else f'{versao}-{self.regras.identificador}'
+
+    @property
+    def nomes_faixas(self):
+        return list(self.regras.nomes_faixas)
+
+    # Agregado vazio de um mês (ou de uma tarefa que falhou)
+    def novo_agregado(self):
+        return Cubo() if self.cubo else AgregadoParcial(self.quantis)
+
+    # Escritor das saídas únicas ou, com particoes, das partições por mês (execucao identifica os arquivos
+    # das partições; no MPI é a mesma em todos os processos)
+    def criar_escritor(self, datas, execucao=None):
+        if self.particoes:
+            return EscritorParticoes(datas, self.nomes_faixas, self.quantis, self.diretorio_saida, self.binario,
+                                     self.cubo, execucao)
+        return EscritorSaidas(datas, self.nomes_faixas, self.quantis, self.diretorio_saida, self.cubo,
+                              intervalos=bool(self.amostragem))
+
+
+# Número de processos do mpirun que iniciou este processo (1 fora do mpirun), sem inicializar o MPI
+def tamanho_mundo_mpi():
+    for variavel in _AMBIENTE_MPI:
+        valor = os.environ.get(variavel)
+        if valor and valor.isdigit():
+            return int(valor)
+    return 1
+
+
+# Função para dimensionar a execução: trabalhadores suficientes para que cada um tenha ao menos
+# BYTES_POR_TRABALHADOR (limitados aos núcleos) e fatias para umas FATIAS_POR_TRABALHADOR tarefas por
+# trabalhador, entre TAMANHO_FATIA_MINIMO e TAMANHO_FATIA. Valores já definidos são mantidos
+def dimensionar(bytes_total, nucleos, trabalhadores=None, tamanho_fatia=None):
+    if trabalhadores is None:
+        trabalhadores = max(1, min(nucleos, bytes_total // BYTES_POR_TRABALHADOR))
+    if tamanho_fatia is None:
+        alvo = bytes_total // (trabalhadores * FATIAS_POR_TRABALHADOR)
+        tamanho_fatia = min(max(alvo, TAMANHO_FATIA_MINIMO), TAMANHO_FATIA)
+        # Em MB inteiros, como a opção --tamanho-fatia
+        tamanho_fatia = max(tamanho_fatia // _MB, 1) * _MB
+    return trabalhadores, tamanho_fatia
+
+
+# Função para escolher o backend: MPI dentro do mpirun; fora dele, sequencial quando um trabalhador
+# basta (poucos dados ou um núcleo) e pool de processos nos demais casos. O Dask só é usado se pedido
+def escolher_backend(trabalhadores):
+    if tamanho_mundo_mpi() > 1:
+        return 'mpi'
+    if trabalhadores <= 1:
+        return 'sequencial'
+    return 'pool'
+
+
+# Função para listar os arquivos de entrada: entradas do armazenamento colunar (se houver) e caminhos
+# a ler como texto, com o total de bytes
+def listar_entradas(configuracao, registrar_log=registrar_log):
+    try:
+        caminhos = [entry.path for entry in os.scandir(configuracao.diretorio_entrada) if entry.is_file()]
+    except Exception as e:
+        registrar_log(f"Erro ao listar arquivos no diretório {configuracao.diretorio_entrada}: {e}")
+        caminhos = []
+    entradas = []
+    if configuracao.diretorio_armazenamento:
+        # Arquivos com conversão atual no armazenamento colunar não são lidos como texto
+        from caged.colunar import separar_armazenados
+
+        entradas, caminhos = separar_armazenados(caminhos, configuracao.diretorio_armazenamento)
+        print(f"Armazenamento colunar: {len(entradas)} arquivos convertidos, {len(caminhos)} lidos como texto")
+    bytes_total = sum(entrada.tamanho for entrada in entradas) + sum(os.path.getsize(caminho) for caminho in caminhos)
+    return entradas, caminhos, bytes_total
+
+
+# Função para identificar no cache o conteúdo de cada arquivo das fatias (hash por caminho) e salvar o manifesto
+def preparar_cache(configuracao, fatias):
+    cache = CacheParciais(configuracao.diretorio_cache, configuracao.versao_cache)
+    hashes = {caminho: cache.identificar(caminho) for caminho in dict.fromkeys(fatia.caminho for fatia in fatias)}
+    reaproveitadas = sum(cache.disponivel(hashes[fatia.caminho], fatia) for fatia in fatias)
+    cache.remover_orfaos()
+    cache.salvar_manifesto()
+    print(f"Cache: {reaproveitadas} fatias reaproveitadas, {len(fatias) - reaproveitadas} fatias a processar")
+    return cache, hashes
+
+
+# Teste das fatias cujo parcial já está no cache (não precisam de leitura antecipada); None sem cache
+def no_cache(cache, hashes):
+    if cache is None:
+        return None
+    return lambda fatia: fatia.caminho in hashes and cache.disponivel(hashes[fatia.caminho], fatia)
+
+
+# Função para executar uma tarefa no trabalhador: o parcial vem do cache quando existe; senão a tarefa é
+# processada pelo núcleo e o resultado guardado no cache. Os erros vão para o RegistroErros `erros` do
+# trabalhador. Devolve o agregado ou None se a tarefa falhou
+def executar_tarefa(tarefa, configuracao, perfil, cache=None, hash_tarefa=None, erros=None):
+    if cache is not None and hash_tarefa is not None:
+        with perfil.etapa('cache'):
+            agregado = cache.obter(hash_tarefa, tarefa)
+        if agregado is not None:
+            return agregado
+    perfil.registrar_arquivo(tarefa.caminho, tarefa.tamanho)
+    # Fatias que ainda não têm leitura antecipada (pool e Dask) ganham uma aqui
+    with antecipar_fatia(tarefa, configuracao.tamanho_bloco, configuracao.profundidade) as fatia:
+        agregado = processar_tarefa(fatia, configuracao.regras, erros, configuracao.motor, configuracao.tamanho_bloco,
+                                    perfil=perfil, quantis=configuracao.quantis, prefiltro=configuracao.prefiltro,
+                                    cubo=bool(configuracao.cubo))
+    if agregado is not None and cache is not None and hash_tarefa is not None:
+        with perfil.etapa('cache'):
+            cache.guardar(hash_tarefa, tarefa, agregado)
+    return agregado
+
+
+# Quantas tarefas cada mês tem (um mês é escrito quando a sua contagem chega a zero)
+def contar_por_data(tarefas):
+    pendentes = {}
+    for tarefa in tarefas:
+        formatted_date = format_string(tarefa.nome)
+        pendentes[formatted_date] = pendentes.get(formatted_date, 0) + 1
+    return pendentes
+
+
+def _gravar_perfil(configuracao, perfis, backend, trabalhadores, inicio, **extras):
+    caminho_perfil = configuracao.caminho_perfil or f'{configuracao.diretorio_saida}/perfil_execucao.json'
+    gravar_perfil(caminho_perfil, perfis, backend=backend, trabalhadores=trabalhadores, motor=configuracao.motor,
+                  quantis=configuracao.quantis, tamanho_fatia=configuracao.tamanho_fatia,
+                  tamanho_bloco=configuracao.tamanho_bloco, leitura_antecipada=configuracao.profundidade,
+                  tempo_total_s=round(time.perf_counter() - inicio, 6), **extras)
+    print(f"Perfil da execução gravado em: {caminho_perfil}")
+
+
+# Backend sequencial: um único processo, com leitura antecipada da próxima fatia
+def executar_sequencial(configuracao, entradas, caminhos, perfil, inicio, erros=None):
+    if erros is None:
+        erros = RegistroErros()
+    with perfil.etapa('listagem'):
+        fatias = dividir_arquivos(caminhos, configuracao.tamanho_fatia, erros)
+    cache, hashes = None, {}
+    if configuracao.diretorio_cache:
+        with perfil.etapa('cache'):
+            cache, hashes = preparar_cache(configuracao, fatias)
+
+    # Tarefas em ordem de data, para que cada mês seja escrito assim que termina
+    tarefas = sorted(entradas + fatias, key=lambda tarefa: format_string(tarefa.nome))
+    pendentes = contar_por_data(tarefas)
+    agregados = {}
+    with configuracao.criar_escritor(pendentes) as escritor:
+        for tarefa in fatias_antecipadas(tarefas, configuracao.tamanho_bloco, configuracao.profundidade,
+                                         no_cache(cache, hashes)):
+            formatted_date = format_string(tarefa.nome)
+            resultado = executar_tarefa(tarefa, configuracao, perfil, cache, hashes.get(tarefa.caminho), erros)
+            agregado = agregados.get(formatted_date)
+            if agregado is None:
+                agregado = agregados[formatted_date] = configuracao.novo_agregado()
+            if resultado:
+                with perfil.etapa('combinacao'):
+                    agregado.combinar(resultado)
+            pendentes[formatted_date] -= 1
+            if pendentes[formatted_date] == 0:
+                with perfil.etapa('escrita'):
+                    escritor.concluir(formatted_date, agregados.pop(formatted_date))
+
+    _gravar_perfil(configuracao, [perfil], 'sequencial', 1, inicio, erros=erros.como_dict())
+    return escritor
+
+
+# Tarefa do pool de processos: processa a fatia e devolve o parcial em memória compartilhada (e os erros da tarefa)
+def _tarefa_pool(tarefa, formatted_date, configuracao, cache=None, hash_tarefa=None):
+    from caged.compartilhado import exportar_agregado, exportar_cubo
+
+    perfil = Perfil(os.getpid())
+    erros = RegistroErros()
+    agregado = executar_tarefa(tarefa, configuracao, perfil, cache, hash_tarefa, erros)
+    if agregado is None:
+        agregado = configuracao.novo_agregado()
+    with perfil.etapa('memoria_compartilhada'):
+        if configuracao.cubo:
+            parcial = exportar_cubo(agregado)
+        else:
+            parcial = exportar_agregado(agregado, configuracao.nomes_faixas, configuracao.quantis)
+    return parcial, formatted_date, perfil, erros
+
+
+# Backend de pool de processos: cada processo escreve o parcial da sua fatia em memória compartilhada
+# (caged.compartilhado) e o processo principal combina os parciais de cada mês direto dos segmentos
+def executar_pool(configuracao, entradas, caminhos, perfil, inicio, erros=None):
+    from caged.compartilhado import (AgregadoDenso, combinar_cubo_compartilhado, descartar_parcial,
+                                     preparar_memoria_compartilhada)
+
+    if erros is None:
+        erros = RegistroErros()
+    with perfil.etapa('listagem'):
+        fatias = dividir_arquivos(caminhos, configuracao.tamanho_fatia, erros)
+    cache, hashes = None, {}
+    if configuracao.diretorio_cache:
+        # O principal calcula os hashes; os processos do pool leem e guardam os parciais
+        with perfil.etapa('cache'):
+            cache, hashes = preparar_cache(configuracao, fatias)
+
+    # Fatias maiores primeiro, para a cauda do pool ter só tarefas curtas
+    tarefas = sorted(entradas + fatias, key=lambda tarefa: tarefa.tamanho, reverse=True)
+    pendentes = contar_por_data(tarefas)
+    perfis_processos = {}
+    agregados = {}
+    escritas = []
+    # O rastreador de memória compartilhada precisa existir antes dos processos do pool
+    preparar_memoria_compartilhada()
+    with configuracao.criar_escritor(pendentes) as escritor, \
+         ProcessPoolExecutor(max_workers=configuracao.trabalhadores) as executor:
+        futures = [executor.submit(_tarefa_pool, tarefa, format_string(tarefa.nome), configuracao, cache,
+                                   hashes.get(tarefa.caminho))
+                   for tarefa in tarefas]
+
+        perfil.iniciar_etapa('espera')
+        try:
+            for future in as_completed(futures):
+                parcial, formatted_date, perfil_processo, erros_tarefa = future.result()
+                combinar_perfis(perfis_processos, {perfil_processo.processo: perfil_processo})
+                erros.combinar(erros_tarefa)
+                with perfil.etapa('combinacao'):
+                    agregado = agregados.get(formatted_date)
+                    if configuracao.cubo:
+                        if agregado is None:
+                            agregado = agregados[formatted_date] = Cubo()
+                        combinar_cubo_compartilhado(agregado, parcial)
+                    else:
+                        if agregado is None:
+                            agregado = agregados[formatted_date] = AgregadoDenso(configuracao.nomes_faixas,
+                                                                                 configuracao.quantis)
+                        agregado.combinar_compartilhado(parcial)
+                pendentes[formatted_date] -= 1
+                if pendentes[formatted_date] == 0:
+                    agregado = agregados.pop(formatted_date)
+                    if not configuracao.cubo:
+                        agregado = agregado.como_agregado()
+                    if configuracao.particoes:
+                        # A partição do mês é escrita por um processo do pool, enquanto as outras fatias seguem
+                        escritas.append(executor.submit(escrever_particao, escritor.raiz, escritor.execucao,
+                                                        formatted_date, agregado, configuracao.nomes_faixas,
+                                                        configuracao.quantis, configuracao.binario))
+                    else:
+                        with perfil.etapa('escrita'):
+                            escritor.concluir(formatted_date, agregado)
+            with perfil.etapa('escrita'):
+                for escrita in escritas:
+                    escritor.registrar(escrita.result())
+        except BaseException:
+            # Depois de uma falha, os segmentos das tarefas já concluídas são removidos
+            for future in futures:
+                if not future.cancel() and future.done() and future.exception() is None:
+                    try:
+                        descartar_parcial(future.result()[0])
+                    except FileNotFoundError:
+                        pass
+            raise
+        perfil.encerrar_etapa()
+
+    _gravar_perfil(configuracao, [perfil] + sorted(perfis_processos.values(), key=lambda p: str(p.processo)), 'pool',
+                   configuracao.trabalhadores, inicio, erros=erros.como_dict())
+    return escritor
+
+
+# Perfil de uma tarefa do Dask, identificado pelo worker que a executa (para a carga por worker)
+def _perfil_dask():
+    from dask.distributed import get_worker
+
+    try:
+        processo = get_worker().address
+    except ValueError:
+        processo = 'local'
+    return Perfil(processo)
+
+
+def _tarefa_dask(tarefa, formatted_date, configuracao, cache=None, hash_tarefa=None):
+    perfil = _perfil_dask()
+    erros = RegistroErros()
+    agregado = executar_tarefa(tarefa, configuracao, perfil, cache, hash_tarefa, erros)
+    if agregado is None:
+        agregado = configuracao.novo_agregado()
+    return agregado, formatted_date, {perfil.processo: perfil}, erros
+
+
+# Função para combinar os resultados parciais das fatias de um mesmo mês (e os perfis por worker e os erros)
+def _combinar_dask(formatted_date, *resultados):
+    perfil = _perfil_dask()
+    with perfil.etapa('combinacao'):
+        agregados = [agregado for agregado, _, _, _ in resultados]
+        if isinstance(agregados[0], Cubo):
+            # Os resultados de entrada não são alterados (o Dask pode reaproveitá-los)
+            agregado = Cubo()
+            for parcial in agregados:
+                agregado.combinar(parcial)
+        else:
+            agregado = combinar_agregados(agregados)
+    perfis = {perfil.processo: perfil}
+    erros = RegistroErros()
+    for _, _, perfis_parcial, erros_parcial in resultados:
+        combinar_perfis(perfis, perfis_parcial)
+        erros.combinar(erros_parcial)
+    return agregado, formatted_date, perfis, erros
+
+
+# Função para escrever a partição de um mês no worker que terminou a redução dele
+def _escrever_dask(resultado, raiz, execucao, configuracao):
+    agregado, formatted_date, perfis, erros = resultado
+    perfil = _perfil_dask()
+    with perfil.etapa('escrita'):
+        particao = escrever_particao(raiz, execucao, formatted_date, agregado, configuracao.nomes_faixas,
+                                     configuracao.quantis, configuracao.binario, perfil.processo)
+    perfis = dict(perfis)
+    combinar_perfis(perfis, {perfil.processo: perfil})
+    return particao, formatted_date, perfis, erros
+
+
+# Backend Dask: uma tarefa por fatia e, por mês, uma redução em árvore nos próprios workers.
+# Sem `client`, cria um cluster local de processos com configuracao.trabalhadores workers
+# (encerrado, com seus workers, ao final da execução)
+def executar_dask(configuracao, entradas, caminhos, perfil, inicio, client=None, erros=None):
+    from dask.distributed import Client, LocalCluster
+
+    if client is not None:
+        return _executar_dask(configuracao, entradas, caminhos, perfil, inicio, client, erros)
+    with LocalCluster(n_workers=configuracao.trabalhadores, threads_per_worker=configuracao.threads_por_worker,
+                      processes=True) as cluster, Client(cluster) as client:
+        return _executar_dask(configuracao, entradas, caminhos, perfil, inicio, client, erros)
+
+
+def _executar_dask(configuracao, entradas, caminhos, perfil, inicio, client, erros):
+    from dask import delayed
+    from dask.distributed import as_completed as dask_as_completed
+
+    tarefa_dask = delayed(_tarefa_dask)
+    combinar_dask = delayed(_combinar_dask)
+
+    if erros is None:
+        erros = RegistroErros()
+    with perfil.etapa('listagem'):
+        fatias = dividir_arquivos(caminhos, configuracao.tamanho_fatia, erros)
+    cache, hashes = None, {}
+    if configuracao.diretorio_cache:
+        with perfil.etapa('cache'):
+            cache, hashes = preparar_cache(configuracao, fatias)
+
+    perfil.iniciar_etapa('montagem_grafo')
+    tarefas_por_data = {}
+    for tarefa in entradas + fatias:
+        # A data vem do nome do arquivo de texto (nos compactados, o do arquivo interno)
+        formatted_date = format_string(tarefa.nome)
+        tarefas_por_data.setdefault(formatted_date, []).append(
+            tarefa_dask(tarefa, formatted_date, configuracao, cache, hashes.get(tarefa.caminho)))
+
+    escritor = configuracao.criar_escritor(tarefas_por_data)
+    # Os parciais das fatias são combinados por mês, em árvore, nos próprios workers
+    reducoes = []
+    for formatted_date, tarefas in tarefas_por_data.items():
+        while len(tarefas) > 1:
+            tarefas = [combinar_dask(formatted_date, *tarefas[i:i + configuracao.aridade])
+                       for i in range(0, len(tarefas), configuracao.aridade)]
+        if configuracao.particoes:
+            # Com partições, o worker que reduziu o mês também o escreve; só a descrição volta
+            tarefas = [delayed(_escrever_dask)(tarefas[0], escritor.raiz, escritor.execucao, configuracao)]
+        reducoes.append(tarefas[0])
+    futures = client.compute(reducoes)
+    perfil.encerrar_etapa()
+
+    # Cada mês é escrito assim que sua redução termina: nas saídas, se os anteriores já foram escritos, ou nos
+    # arquivos temporários do mês (caged.saida), e o driver não guarda nenhum agregado de mês
+    perfis_workers = {}
+    with escritor:
+        perfil.iniciar_etapa('espera')
+        for future in dask_as_completed(futures):
+            agregado, formatted_date, perfis, erros_mes = future.result()
+            future.release()
+            perfil.registrar_objeto('resultado_mes', agregado)
+            combinar_perfis(perfis_workers, perfis)
+            erros.combinar(erros_mes)
+            with perfil.etapa('escrita'):
+                if configuracao.particoes:
+                    escritor.registrar(agregado)
+                else:
+                    escritor.concluir(formatted_date, agregado)
+            del agregado
+        perfil.encerrar_etapa()
+
+    _gravar_perfil(configuracao, [perfil] + sorted(perfis_workers.values(), key=lambda p: str(p.processo)), 'dask',
+                   len(client.scheduler_info()['workers']), inicio, aridade=configuracao.aridade,
+                   erros=erros.como_dict())
+    return escritor
+
+
+# Função para o embaralhamento do MPI: os agregados de todos os meses vão para os donos das chaves
+# (caged.reducao.embaralhar_agregados), cada processo escreve o fragmento das suas chaves e o processo 0
+# grava o manifesto dos fragmentos, que devolve (os demais devolvem None)
+def _escrever_fragmentos(comm, configuracao, agregados_locais, datas, execucao, perfil):
+    from caged.reducao import embaralhar_agregados
+
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+    agregados_finais = embaralhar_agregados(comm, agregados_locais, configuracao.nomes_faixas, perfil=perfil,
+                                            quantis=configuracao.quantis)
+    agregados_locais.clear()
+    with perfil.etapa('escrita'):
+        with criar_escritor_fragmento(datas, configuracao.nomes_faixas, execucao, rank, size, configuracao.quantis,
+                                      configuracao.diretorio_saida) as escritor_fragmento:
+            for formatted_date in datas:
+                if formatted_date in agregados_finais:
+                    escritor_fragmento.concluir(formatted_date, agregados_finais.pop(formatted_date))
+    fragmento = descrever_fragmento(escritor_fragmento, rank)
+    perfil.registrar_objeto('gather_fragmentos', fragmento)
+    with perfil.etapa('gather'):
+        fragmentos = comm.gather(fragmento, root=0)
+    if rank != 0:
+        return None
+    escritor = EscritorFragmentos(size, configuracao.nomes_faixas, configuracao.quantis, configuracao.diretorio_saida,
+                                  execucao)
+    for fragmento in fragmentos:
+        escritor.registrar(fragmento)
+    escritor.fechar()
+    return escritor
+
+
+# Backend MPI: o processo 0 lista e divide os arquivos; as fatias são distribuídas em blocos contíguos
+# (estático) ou sob demanda (dinâmico), cada processo acumula parciais por mês e os agregados de cada
+# mês são reduzidos no processo 0 (caged.reducao), que escreve as saídas. Os erros de todos os processos
+# são reduzidos no processo 0, que fica com eles em `erros`
+def executar_mpi(configuracao, inicio, erros=None):
+    from mpi4py import MPI
+
+    from caged.escalonador import Carga, distribuir_tarefas, imprimir_cargas, receber_tarefas
+    from caged.reducao import reduzir_agregados, reduzir_cubos, reduzir_erros
+
+    comm = MPI.COMM_WORLD
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+    # Perfil deste processo: tempo por etapa, linhas por motivo de rejeição, bytes por arquivo e mensagens
+    perfil = Perfil(rank, configuracao.perfil_detalhado)
+    # Erros deste processo, acumulados em memória até a redução do fim
+    if erros is None:
+        erros = RegistroErros()
+
+    # Processo mestre lista e divide os arquivos, para que um mês grande use vários processos
+    cache, hashes = None, {}
+    if rank == 0:
+        os.makedirs(configuracao.diretorio_saida, exist_ok=True)
+        with perfil.etapa('listagem'):
+            entradas, caminhos, bytes_total = listar_entradas(configuracao, erros)
+            _, configuracao.tamanho_fatia = dimensionar(bytes_total, size, size, configuracao.tamanho_fatia)
+            fatias = dividir_arquivos(caminhos, configuracao.tamanho_fatia, erros)
+        print(f"Backend mpi: {size} processos, fatias de {configuracao.tamanho_fatia // _MB} MB")
+        if configuracao.diretorio_cache:
+            with perfil.etapa('cache'):
+                cache, hashes = preparar_cache(configuracao, fatias)
+        # As entradas do armazenamento são tarefas como as fatias (o cache vale só para as fatias de texto)
+        all_fatias = fatias + entradas
+        datas = sorted(contar_por_data(all_fatias))
+        execucao = novo_identificador()
+    else:
+        all_fatias = datas = execucao = None
+
+    # Os demais processos só leem o manifesto depois que o processo 0 o atualizou
+    configuracao, hashes, datas, execucao = comm.bcast((configuracao, hashes, datas, execucao), root=0)
+    if configuracao.diretorio_cache and rank != 0:
+        cache = CacheParciais(configuracao.diretorio_cache, configuracao.versao_cache)
+
+    carga = Carga(rank)
+    inicio_distribuicao = time.perf_counter()
+
+    if configuracao.escalonamento == 'dinamico' and size > 1:
+        # O processo 0 só distribui; os demais recebem uma fatia por vez
+        if rank == 0:
+            with perfil.etapa('distribuicao'):
+                distribuir_tarefas(comm, all_fatias)
+            local_fatias = []
+        else:
+            local_fatias = receber_tarefas(comm)
+    else:
+        # Distribuir a lista de fatias para todos os processos e dividi-las em blocos contíguos
+        all_fatias = comm.bcast(all_fatias, root=0)
+        files_per_process = len(all_fatias) // size
+        remainder = len(all_fatias) % size
+
+        if rank < remainder:
+            start = rank * (files_per_process + 1)
+            end = start + files_per_process + 1
+        else:
+            start = rank * files_per_process + remainder
+            end = start + files_per_process
+
+        local_fatias = all_fatias[start:end]
+
+    # Cada processo combina os resultados das suas fatias no agregado do mês.
+    # Com leitura antecipada, uma thread lê os blocos da fatia atual e já começa a próxima (fila limitada).
+    # No escalonamento dinâmico, a próxima fatia só é pedida ao mestre depois que a atual foi processada,
+    # para que as maiores continuem indo para o primeiro processo livre
+    agregados_locais = {}
+    for fatia in fatias_antecipadas(local_fatias, configuracao.tamanho_bloco, configuracao.profundidade,
+                                    no_cache(cache, hashes),
+                                    antecipar_proxima=configuracao.escalonamento != 'dinamico'):
+        inicio_fatia = time.perf_counter()
+        # A data vem do nome do arquivo de texto (nos compactados, o do arquivo interno)
+        formatted_date = format_string(fatia.nome)
+        resultado = executar_tarefa(fatia, configuracao, perfil, cache, hashes.get(fatia.caminho), erros)
+        if resultado:
+            with perfil.etapa('combinacao'):
+                agregado = agregados_locais.get(formatted_date)
+                if agregado is None:
+                    agregados_locais[formatted_date] = resultado
+                else:
+                    agregado.combinar(resultado)
+        carga.registrar(fatia, inicio_fatia)
+
+    # O tempo ocioso inclui a espera pelos processos mais lentos
+    with perfil.etapa('espera'):
+        comm.Barrier()
+    carga.total = time.perf_counter() - inicio_distribuicao
+    perfil.registrar_objeto('gather_cargas', carga)
+    with perfil.etapa('gather'):
+        cargas = comm.gather(carga, root=0)
+
+    if configuracao.embaralhamento:
+        escritor = _escrever_fragmentos(comm, configuracao, agregados_locais, datas, execucao, perfil)
+    else:
+        # Os agregados de cada mês são combinados num processo: as chaves são acordadas entre os processos e
+        # as estatísticas reduzidas como buffers numéricos (comm.Reduce). Sem partições, tudo vai para o
+        # processo 0, que escreve as saídas; com partições, o mês i vai para o processo i % size, que guarda o
+        # agregado final e só escreve as partições dos seus meses depois de todas as reduções, em paralelo com
+        # os demais (uma escrita no meio do laço seguraria a redução seguinte em todos os processos)
+        escritor = configuracao.criar_escritor(datas, execucao) if rank == 0 else None
+        particoes_locais = []
+        meses_locais = []
+        with escritor if escritor is not None else contextlib.nullcontext():
+            for i, formatted_date in enumerate(datas):
+                destino = i % size if configuracao.particoes else 0
+                agregado = agregados_locais.pop(formatted_date, None) or configuracao.novo_agregado()
+                if configuracao.cubo:
+                    agregado_final = reduzir_cubos(comm, agregado, root=destino, perfil=perfil)
+                else:
+                    agregado_final = reduzir_agregados(comm, agregado, configuracao.nomes_faixas, root=destino,
+                                                       perfil=perfil, quantis=configuracao.quantis)
+                if rank != destino:
+                    continue
+                if configuracao.particoes:
+                    meses_locais.append((formatted_date, agregado_final))
+                else:
+                    with perfil.etapa('escrita'):
+                        escritor.concluir(formatted_date, agregado_final)
+            with perfil.etapa('escrita'):
+                for formatted_date, agregado_final in meses_locais:
+                    particoes_locais.append(escrever_particao(diretorio_particoes(configuracao.diretorio_saida),
+                                                              execucao, formatted_date, agregado_final,
+                                                              configuracao.nomes_faixas, configuracao.quantis,
+                                                              configuracao.binario, f'rank {rank}'))
+            meses_locais.clear()
+            if configuracao.particoes:
+                # Só as descrições das partições vão para o processo 0, que grava o manifesto
+                perfil.registrar_objeto('gather_particoes', particoes_locais)
+                with perfil.etapa('gather'):
+                    todas = comm.gather(particoes_locais, root=0)
+                if rank == 0:
+                    for particoes in todas:
+                        for particao in particoes:
+                            escritor.registrar(particao)
+
+    if rank == 0:
+        imprimir_cargas(cargas)
+
+    # Os erros de cada processo são combinados no processo 0; os demais ficam sem nada a gravar
+    erros_total = reduzir_erros(comm, erros, root=0, perfil=perfil)
+    erros.limpar()
+    if rank == 0:
+        erros.combinar(erros_total)
+
+    # Perfil da execução: os perfis de todos os processos são recolhidos e gravados pelo processo 0
+    perfil.registrar_objeto('gather_perfis', perfil)
+    perfis = comm.gather(perfil, root=0)
+    if rank == 0:
+        _gravar_perfil(configuracao, perfis, 'mpi', size, inicio, escalonamento=configuracao.escalonamento,
+                       cargas=[{'rank': c.rank, 'fatias': c.tarefas, 'bytes': c.bytes, 'ocupado_s': round(c.ocupado, 6),
+                                'ocioso_s': round(c.ocioso, 6)} for c in cargas],
+                       erros=erros.como_dict())
+    return escritor
+
+
+# Função para escolher e dimensionar o backend e executá-lo, com os erros acumulados em `erros`
+def _executar_backend(configuracao, inicio, erros, client=None):
+    if configuracao.amostragem and configuracao.backend in ('mpi', 'dask'):
+        raise ValueError('O modo aproximado (--amostragem) roda no processo principal ou num pool de processos')
+    if configuracao.backend == 'mpi':
+        return executar_mpi(configuracao, inicio, erros)
+    if configuracao.embaralhamento:
+        raise ValueError('O embaralhamento por hash das chaves só existe no backend MPI (--embaralhamento)')
+    perfil = Perfil('principal', configuracao.perfil_detalhado)
+    with perfil.etapa('listagem'):
+        entradas, caminhos, bytes_total = listar_entradas(configuracao, erros)
+    nucleos = os.cpu_count() or 1
+    if configuracao.amostragem:
+        from caged.amostragem import executar_amostragem
+
+        # Os trabalhadores são dimensionados pelos bytes da primeira rodada da amostra
+        configuracao.trabalhadores, _ = dimensionar(int(bytes_total * configuracao.amostragem),
+                                                    1 if configuracao.backend == 'sequencial' else nucleos,
+                                                    configuracao.trabalhadores, configuracao.bloco_amostra)
+        print(f"Modo aproximado: {configuracao.trabalhadores} trabalhadores, amostra de {configuracao.amostragem:.0%} "
+              f"dos blocos de {configuracao.bloco_amostra // 1024} KB de cada mês ({bytes_total / _MB:.1f} MB de entrada)")
+        return executar_amostragem(configuracao, entradas, caminhos, perfil, inicio, erros)
+    configuracao.trabalhadores, configuracao.tamanho_fatia = dimensionar(bytes_total, nucleos,
+                                                                         configuracao.trabalhadores,
+                                                                         configuracao.tamanho_fatia)
+    if configuracao.backend == 'auto':
+        configuracao.backend = escolher_backend(configuracao.trabalhadores)
+    print(f"Backend {configuracao.backend}: {configuracao.trabalhadores} trabalhadores, "
+          f"fatias de {configuracao.tamanho_fatia // _MB} MB ({bytes_total / _MB:.1f} MB de entrada, {nucleos} núcleos)")
+    if configuracao.backend == 'sequencial':
+        return executar_sequencial(configuracao, entradas, caminhos, perfil, inicio, erros)
+    if configuracao.backend == 'pool':
+        return executar_pool(configuracao, entradas, caminhos, perfil, inicio, erros)
+    if configuracao.backend == 'dask':
+        return executar_dask(configuracao, entradas, caminhos, perfil, inicio, client, erros)
+    raise ValueError(f'Backend desconhecido: {configuracao.backend}')
+
+
+# Função para informar as saídas geradas, os erros registrados e o tempo de execução
+def imprimir_resumo(escritor, erros, inicio):
+    if erros.total():
+        print(f"Erros registrados: {erros.total()} (resumo em {ARQUIVO_LOG})")
+
+    if isinstance(escritor, EscritorParticoes):
+        print(f'Saídas particionadas geradas com sucesso: {len(escritor.particoes)} meses, manifesto em '
+              f'{escritor.caminho_manifesto}')
+    elif isinstance(escritor, EscritorFragmentos):
+        print(f'Saídas em {escritor.n_fragmentos} fragmentos por hash das chaves geradas com sucesso, manifesto em '
+              f'{escritor.caminho_manifesto}')
+    elif escritor is not None:
+        print(f'Arquivo CSV de subclasse gerado com sucesso: {escritor.caminho_subclasses}')
+        print(f'Arquivo CSV de ocupações gerado com sucesso: {escritor.caminho_ocupacoes}')
+    if escritor is not None:
+        if isinstance(escritor, EscritorFragmentos):
+            n_chaves = escritor.n_chaves
+        else:
+            n_chaves = {dimensao: len(chaves) for dimensao, chaves in escritor.chaves.items()}
+        print(f"\nTotal de Subclasses: {n_chaves['subclasses']}")
+        print(f"Total de Ocupações (CBO2002): {n_chaves['ocupacoes']}")
+        if escritor.caminho_cubo:
+            print(f"Cubo gravado em: {escritor.caminho_cubo} ({escritor.cubo.n_celulas} células)")
+        print(f"Tempo de execução: {time.perf_counter() - inicio:.2f} segundos")
+
+
+# Função principal: escolhe e dimensiona o backend, executa e informa as saídas e o tempo de execução
+def executar(configuracao, client=None):
+    inicio = time.perf_counter()
+    if configuracao.backend == 'auto' and tamanho_mundo_mpi() > 1:
+        configuracao.backend = 'mpi'
+
+    # Os erros da execução são gravados no log uma única vez, no fim (mesmo depois de uma falha)
+    erros = RegistroErros()
+    try:
+        escritor = _executar_backend(configuracao, inicio, erros, client)
+    finally:
+        erros.gravar()
+    imprimir_resumo(escritor, erros, inicio)
+    return escritor
+
+
+# Opções de linha de comando comuns aos scripts. Com `backend` fixo (scripts), a opção --backend não
+# aparece; as opções específicas de outros backends também não
+def criar_parser(descricao, backend=None, motor='vetorizado'):
+    parser = argparse.ArgumentParser(description=descricao)
+    if backend is None:
+        parser.add_argument('--backend', choices=BACKENDS, default='auto',
+                            help="'auto' usa MPI dentro do mpirun e, fora dele, sequencial ou pool de processos "
+                                 "conforme o volume de dados e os núcleos disponíveis")
+    else:
+        parser.set_defaults(backend=backend)
+    parser.add_argument('--motor', choices=MOTORES, default=motor,
+                        help="'linhas' usa o csv.DictReader; 'vetorizado' lê só as colunas necessárias em blocos com "
+                             "NumPy (os dois aplicam as mesmas regras)")
+    if backend != 'mpi':
+        parser.add_argument('--trabalhadores', '--workers', '--processos', dest='trabalhadores', type=int, default=None,
+                            help='número de processos (padrão: pelo volume de dados, até o número de núcleos)')
+    parser.add_argument('--tamanho-fatia', type=int, default=None,
+                        help='tamanho aproximado (MB) das faixas de bytes em que cada arquivo é dividido entre as tarefas '
+                             f'(padrão: umas {FATIAS_POR_TRABALHADOR} fatias por trabalhador, até '
+                             f'{TAMANHO_FATIA // _MB} MB)')
+    parser.add_argument('--tamanho-bloco', type=int, default=TAMANHO_BLOCO // _MB,
+                        help='tamanho (MB) dos blocos lidos de cada fatia')
+    parser.add_argument('--leitura-antecipada', type=int, default=PROFUNDIDADE, metavar='BLOCOS',
+                        help='quantos blocos uma thread de leitura pode ler à frente do processamento; a leitura da '
+                             'próxima fatia começa enquanto a atual é processada (0 desliga)')
+    if backend in (None, 'mpi'):
+        parser.add_argument('--escalonamento', choices=['estatico', 'dinamico'], default='estatico',
+                            help="MPI: 'estatico' divide as fatias em blocos contíguos; 'dinamico' usa o processo 0 "
+                                 "como mestre, entregando as maiores fatias primeiro a quem estiver livre")
+        parser.add_argument('--embaralhamento', action='store_true',
+                            help='MPI: troca os parciais por hash das chaves (Alltoallv); cada processo finaliza e '
+                                 'escreve o fragmento das suas chaves em output_caged/fragmentos/, sem reduzir tudo '
+                                 'no processo 0')
+    if backend in (None, 'dask'):
+        parser.add_argument('--threads-por-worker', type=int, default=1,
+                            help='Dask: threads por worker (o processamento é limitado pelo GIL, então o padrão é 1)')
+        parser.add_argument('--aridade', type=int, default=ARIDADE_REDUCAO,
+                            help='Dask: quantos parciais cada tarefa da redução em árvore combina')
+    parser.add_argument('--cache', metavar='DIRETORIO', default=None,
+                        help='diretório do cache de agregados parciais; fatias de arquivos sem alteração não são '
+                             'reprocessadas (sem --tamanho-fatia, as fatias ficam com 64 MB fixos)')
+    parser.add_argument('--armazenamento', metavar='DIRETORIO', default=None,
+                        help='diretório do armazenamento colunar (python -m caged.colunar); arquivos já convertidos '
+                             'são lidos dele em vez do texto')
+    parser.add_argument('--sem-prefiltro', action='store_true',
+                        help="no motor 'linhas', não descarta em bytes as linhas que não são admissão (ou de unidade "
+                             "99/6/7) antes da decodificação")
+    parser.add_argument('--perfil', metavar='ARQUIVO', default=None,
+                        help='onde gravar o perfil da execução em JSON (padrão: output_caged/perfil_execucao.json)')
+    parser.add_argument('--perfil-detalhado', action='store_true',
+                        help='mede também, serializando-as de novo, as mensagens de controle (cargas, descrições, '
+                             'erros e perfis); agregados, cubos e buffers são sempre medidos pelos seus bytes')
+    parser.add_argument('--quantis', action='store_true',
+                        help='acrescenta às saídas mediana, p10 e p90 dos salários (no geral e por faixa etária), '
+                             'estimados com esboços mescláveis de erro relativo de até 1%%')
+    parser.add_argument('--cubo', metavar='ARQUIVO', default=None,
+                        help='grava também o cubo pré-agregado (mês x subclasse x ocupação x faixa etária x UF) em '
+                             'ARQUIVO .npz, consultável com python -m caged.cubo; as saídas CSV são projeções dele '
+                             '(incompatível com --quantis)')
+    parser.add_argument('--particoes', action='store_true',
+                        help='escreve as saídas particionadas por mês (output_caged/particoes/date=.../), cada mês pelo '
+                             'processo que o reduziu, ligadas por um manifesto gravado no fim')
+    parser.add_argument('--binario', action='store_true',
+                        help='com --particoes, grava também um .npz colunar por dimensão e mês (médias sem '
+                             'arredondamento, contagens e quantis)')
+    parser.add_argument('--regras', metavar='ARQUIVO', default=None,
+                        help='especificação JSON das regras de unidade salarial, faixa salarial e faixas etárias '
+                             '(chaves ausentes ficam com o padrão; ver caged/regras.py)')
+    if backend not in ('mpi', 'dask', 'residente'):
+        parser.add_argument('--amostragem', type=float, default=None, metavar='TAXA',
+                            help='modo aproximado: lê só a fração TAXA (ex.: 0.05) dos blocos de cada mês, sorteados, '
+                                 'e acrescenta às saídas o intervalo de confiança de 95%% e o tamanho efetivo da '
+                                 'amostra de cada média')
+        parser.add_argument('--erro-alvo', type=float, default=None, metavar='ERRO',
+                            help='com --amostragem, lê mais TAXA dos blocos por rodada até que a meia largura do '
+                                 'intervalo da média salarial de cada chave seja no máximo ERRO (ex.: 0.02) da média, '
+                                 'ou até ler todos os blocos')
+        parser.add_argument('--bloco-amostra', type=int, default=BLOCO_AMOSTRA // 1024, metavar='KB',
+                            help='tamanho (KB) dos blocos sorteados no modo aproximado')
+        parser.add_argument('--semente', type=int, default=0,
+                            help='semente do sorteio dos blocos no modo aproximado')
+    parser.set_defaults(trabalhadores=None, escalonamento='estatico', threads_por_worker=1, aridade=ARIDADE_REDUCAO,
+                        embaralhamento=False, amostragem=None, erro_alvo=None, bloco_amostra=BLOCO_AMOSTRA // 1024,
+                        semente=0)
+    return parser
+
+
+if __name__ == '__main__':
+    args = criar_parser('Médias salariais e de idade do CAGEDMOV por subclasse, ocupação e data '
+                        '(backend escolhido automaticamente)').parse_args()
+    executar(Configuracao.de_argumentos(args))
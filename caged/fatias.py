@@ -0,0 +1,254 @@
+import contextlib
+import csv
+import io
+import os
+
+from caged.antecipacao import PROFUNDIDADE, antecipar
+from caged.compactados import FatiaCompactada, eh_compactado, fatias_compactadas, ler_blocos_compactados
+from caged.perfil import Perfil
+
+# Divisão de um arquivo CAGEDMOV em faixas de bytes alinhadas em quebras de linha.
+# Cada fatia carrega as colunas do cabeçalho, então pode ser processada de forma independente
+# e o resultado parcial combinado com as demais fatias do mesmo mês.
+# Arquivos compactados não são divididos: cada arquivo interno é uma fatia (caged.compactados).
+# Com leitura antecipada, uma thread lê os blocos da fatia (e começa a próxima) enquanto a atual é processada
+
+TAMANHO_FATIA = 256 * 1024 * 1024
+TAMANHO_BLOCO = 32 * 1024 * 1024
+
+
+class Fatia:
+    __slots__ = ('caminho', 'inicio', 'fim', 'colunas')
+
+    compactada = False
+    antecipada = False
+    armazenada = False
+
+    def __init__(self, caminho, inicio, fim, colunas):
+        self.caminho = caminho
+        self.inicio = inicio
+        self.fim = fim
+        self.colunas = colunas
+
+    @property
+    def tamanho(self):
+        return self.fim - self.inicio
+
+    # Nome do arquivo de texto, usado para obter a data
+    @property
+    def nome(self):
+        return os.path.basename(self.caminho)
+
+    def __repr__(self):
+        return f'Fatia({os.path.basename(self.caminho)!r}, {self.inicio}, {self.fim})'
+
+
+# Função para ler o cabeçalho do arquivo: devolve as colunas e o deslocamento do início dos dados
+def ler_cabecalho(caminho):
+    with open(caminho, mode='rb') as arquivo:
+        linha = arquivo.readline()
+        inicio_dados = arquivo.tell()
+    texto = linha.decode('utf-8').rstrip('\r\n')
+    colunas = next(csv.reader([texto], delimiter=';'), [])
+    return colunas, inicio_dados
+
+
+# Função para dividir um arquivo em fatias de aproximadamente tamanho_fatia bytes
+def dividir_arquivo(caminho, tamanho_fatia=TAMANHO_FATIA):
+    colunas, inicio_dados = ler_cabecalho(caminho)
+    tamanho = os.path.getsize(caminho)
+
+    limites = [inicio_dados]
+    with open(caminho, mode='rb') as arquivo:
+        posicao = inicio_dados + tamanho_fatia
+        while posicao < tamanho:
+            # Avança até o fim da linha em que a posição caiu
+            arquivo.seek(posicao - 1)
+            arquivo.readline()
+            limite = arquivo.tell()
+            if limite >= tamanho:
+                break
+            if limite > limites[-1]:
+                limites.append(limite)
+            posicao = limite + tamanho_fatia
+    limites.append(tamanho)
+
+    return [Fatia(caminho, inicio, fim, colunas) for inicio, fim in zip(limites, limites[1:]) if fim > inicio]
+
+
+# Fatia com o arquivo inteiro (sem divisão)
+def fatia_inteira(caminho):
+    colunas, inicio_dados = ler_cabecalho(caminho)
+    return Fatia(caminho, inicio_dados, os.path.getsize(caminho), colunas)
+
+
+# Função para ler a fatia em blocos de bytes terminados em quebra de linha.
+# Fatias compactadas são descompactadas numa thread, em paralelo com o processamento do bloco anterior;
+# fatias antecipadas entregam os blocos que a sua thread já leu
+def ler_blocos(fatia, tamanho_bloco=TAMANHO_BLOCO):
+    if fatia.antecipada:
+        return fatia.consumir_blocos()
+    if fatia.compactada:
+        return antecipar(ler_blocos_compactados(fatia, tamanho_bloco))
+    return _ler_blocos_arquivo(fatia, tamanho_bloco)
+
+
+def _ler_blocos_arquivo(fatia, tamanho_bloco):
+    with open(fatia.caminho, mode='rb') as arquivo:
+        arquivo.seek(fatia.inicio)
+        restante = fatia.tamanho
+        resto = b''
+        while restante > 0:
+            dados = arquivo.read(min(tamanho_bloco, restante))
+            if not dados:
+                break
+            restante -= len(dados)
+            if resto:
+                dados = resto + dados
+            corte = dados.rfind(b'\n')
+            if corte < 0:
+                resto = dados
+                continue
+            yield dados[:corte + 1]
+            resto = dados[corte + 1:]
+        if resto:
+            yield resto + b'\n'
+
+
+# Fatia cuja leitura já começou numa thread (no máximo `profundidade` blocos de `tamanho_bloco` à frente).
+# Tem os mesmos atributos da fatia original e deve ser encerrada se os blocos não forem consumidos até o fim
+class FatiaAntecipada:
+    antecipada = True
+
+    def __init__(self, fatia, tamanho_bloco=TAMANHO_BLOCO, profundidade=PROFUNDIDADE):
+        self.fatia = fatia
+        if fatia.compactada:
+            blocos = ler_blocos_compactados(fatia, tamanho_bloco)
+        else:
+            blocos = _ler_blocos_arquivo(fatia, tamanho_bloco)
+        self._leitura = antecipar(blocos, profundidade)
+        self._consumida = False
+
+    def __getattr__(self, nome):
+        if nome in ('fatia', '_leitura', '_consumida'):
+            raise AttributeError(nome)
+        return getattr(self.fatia, nome)
+
+    def consumir_blocos(self):
+        if self._consumida:
+            raise RuntimeError(f'Os blocos de {self.fatia} já foram consumidos')
+        self._consumida = True
+        return self._leitura
+
+    # Para a thread de leitura mesmo que os blocos não tenham sido consumidos (parcial do cache, colunas
+    # ausentes, erro no processamento) ou tenham sido consumidos só em parte
+    def encerrar(self):
+        self._leitura.close()
+
+    def __repr__(self):
+        return f'FatiaAntecipada({self.fatia!r})'
+
+
+def _antecipar_fatia(fatia, tamanho_bloco, profundidade):
+    if profundidade > 0 and isinstance(fatia, (Fatia, FatiaCompactada)):
+        return FatiaAntecipada(fatia, tamanho_bloco, profundidade)
+    return fatia
+
+
+def _encerrar(fatia):
+    if isinstance(fatia, FatiaAntecipada):
+        fatia.encerrar()
+
+
+# Função para percorrer as fatias com leitura antecipada: enquanto uma fatia é processada, a thread da
+# seguinte já lê os seus primeiros blocos. A memória fica limitada a duas filas de `profundidade` blocos.
+# Outras tarefas (como as entradas do armazenamento colunar) passam sem mudança; profundidade 0 desliga.
+# As fatias para as quais `sem_leitura(fatia)` é verdadeiro (ex.: já no cache de parciais) não são lidas.
+# Com antecipar_proxima=False, a próxima fatia só é pedida a `fatias` depois que a atual foi processada
+# (escalonamento dinâmico: pedir antes seria reservar ao processo uma fatia a mais); a leitura da fatia
+# atual continua antecipada
+def fatias_antecipadas(fatias, tamanho_bloco=TAMANHO_BLOCO, profundidade=PROFUNDIDADE, sem_leitura=None,
+                       antecipar_proxima=True):
+    def preparar(fatia):
+        if sem_leitura is not None and sem_leitura(fatia):
+            return fatia
+        return _antecipar_fatia(fatia, tamanho_bloco, profundidade)
+
+    if not antecipar_proxima:
+        for fatia in fatias:
+            atual = preparar(fatia)
+            try:
+                yield atual
+            finally:
+                _encerrar(atual)
+        return
+
+    fatias = iter(fatias)
+    atual = proxima = None
+    try:
+        atual = next(fatias, None)
+        if atual is not None:
+            atual = preparar(atual)
+        while atual is not None:
+            proxima = next(fatias, None)
+            if proxima is not None:
+                proxima = preparar(proxima)
+            yield atual
+            _encerrar(atual)
+            atual, proxima = proxima, None
+    finally:
+        _encerrar(atual)
+        _encerrar(proxima)
+
+
+# Uma única fatia com leitura antecipada (encerrada na saída do bloco with)
+@contextlib.contextmanager
+def antecipar_fatia(fatia, tamanho_bloco=TAMANHO_BLOCO, profundidade=PROFUNDIDADE):
+    fatia = _antecipar_fatia(fatia, tamanho_bloco, profundidade)
+    try:
+        yield fatia
+    finally:
+        _encerrar(fatia)
+
+
+# Função para iterar sobre as linhas de texto da fatia (mesma separação de linhas de open(newline=''))
+def ler_linhas(fatia, tamanho_bloco=TAMANHO_BLOCO, perfil=None):
+    if perfil is None:
+        perfil = Perfil()
+    blocos = ler_blocos(fatia, tamanho_bloco)
+    with contextlib.closing(blocos):
+        while True:
+            with perfil.etapa('leitura'):
+                dados = next(blocos, None)
+            if dados is None:
+                return
+            with perfil.etapa('decodificacao'):
+                texto = io.StringIO(dados.decode('utf-8'), newline='')
+            del dados
+            yield from texto
+
+
+# Abre a fatia como um iterador de linhas de texto, no lugar de open(..., newline='', encoding='utf-8')
+@contextlib.contextmanager
+def abrir_fatia(fatia, tamanho_bloco=TAMANHO_BLOCO, perfil=None):
+    linhas = ler_linhas(fatia, tamanho_bloco, perfil)
+    try:
+        yield linhas
+    finally:
+        linhas.close()
+
+
+# Função para dividir todos os arquivos de uma lista, registrando os que não puderem ser lidos
+def dividir_arquivos(caminhos, tamanho_fatia, registrar_log):
+    fatias = []
+    for caminho in caminhos:
+        try:
+            if os.path.getsize(caminho) == 0:
+                continue
+            if eh_compactado(caminho):
+                fatias.extend(fatias_compactadas(caminho))
+            else:
+                fatias.extend(dividir_arquivo(caminho, tamanho_fatia))
+        except Exception as e:
+            registrar_log(f"Erro ao abrir arquivo {os.path.basename(caminho)}: {e}")
+    return fatias
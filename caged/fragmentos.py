@@ -0,0 +1,94 @@
+import json
+import os
+import time
+import zlib
+
+from caged.particoes import ARQUIVO_MANIFESTO, _gravar_atomico
+from caged.saida import DIRETORIO_SAIDA, EscritorSaidas
+
+# Saídas em fragmentos por hash das chaves (backend MPI com --embaralhamento): cada subclasse e cada
+# ocupação pertence ao processo zlib.crc32(chave) % size, em todos os meses. Os parciais de todos os
+# processos são trocados com Alltoallv (caged.reducao.embaralhar_agregados), cada processo combina e
+# finaliza só as chaves que são dele e escreve o seu fragmento
+# (fragmentos/subclasse_output.EXECUCAO.RRR-de-NNN.csv e ocupacoes_output.EXECUCAO.RRR-de-NNN.csv, mesmas
+# colunas e ordem das saídas únicas), em paralelo com os demais. Nenhum processo recebe todas as chaves; o
+# processo 0 só grava o manifesto (fragmentos/manifesto.json) com os fragmentos da execução. Como nas
+# partições, o identificador da execução entra no nome dos arquivos: uma nova execução nunca reescreve os
+# fragmentos descritos pelo manifesto em vigor, e os antigos só são removidos depois da troca do manifesto.
+# A união dos fragmentos tem as mesmas linhas das saídas únicas
+
+DIRETORIO_FRAGMENTOS = 'fragmentos'
+
+# Incrementar quando mudar o formato do manifesto ou a regra de particionamento
+VERSAO_MANIFESTO = 1
+
+
+def diretorio_fragmentos(diretorio_saida=DIRETORIO_SAIDA):
+    return os.path.join(diretorio_saida, DIRETORIO_FRAGMENTOS)
+
+
+# Processo dono de uma chave (o mesmo em qualquer processo e execução com o mesmo número de processos)
+def dono_chave(chave, n_fragmentos):
+    return zlib.crc32(chave.encode('utf-8')) % n_fragmentos
+
+
+def nome_fragmento(execucao, rank, n_fragmentos):
+    return f'{execucao}.{rank:03d}-de-{n_fragmentos:03d}'
+
+
+# Escritor do fragmento de um processo: as saídas únicas restritas às chaves do processo
+def criar_escritor_fragmento(datas, nomes_faixas, execucao, rank, n_fragmentos, quantis=False,
+                             diretorio=DIRETORIO_SAIDA):
+    return EscritorSaidas(datas, nomes_faixas, quantis, diretorio_fragmentos(diretorio),
+                          fragmento=nome_fragmento(execucao, rank, n_fragmentos))
+
+
+# Descrição do fragmento escrito por um processo, para o manifesto
+def descrever_fragmento(escritor, rank):
+    return {
+        'rank': rank,
+        'arquivos': {'subclasses': os.path.basename(escritor.caminho_subclasses),
+                     'ocupacoes': os.path.basename(escritor.caminho_ocupacoes)},
+        'linhas': dict(escritor.linhas),
+        'chaves': {dimensao: len(chaves) for dimensao, chaves in escritor.chaves.items()},
+    }
+
+
+# Manifesto dos fragmentos no processo 0: recebe as descrições de todos os processos e, ao fechar, grava o
+# manifesto de uma vez e só então remove os fragmentos de execuções anteriores
+class EscritorFragmentos:
+    def __init__(self, n_fragmentos, nomes_faixas, quantis=False, diretorio=DIRETORIO_SAIDA, execucao=None):
+        self.n_fragmentos = n_fragmentos
+        self.nomes_faixas = list(nomes_faixas)
+        self.quantis = quantis
+        self.execucao = execucao
+        self.raiz = diretorio_fragmentos(diretorio)
+        self.caminho_manifesto = os.path.join(self.raiz, ARQUIVO_MANIFESTO)
+        self.fragmentos = []
+        # As chaves de processos diferentes são disjuntas: os totais são as somas
+        self.n_chaves = {'subclasses': 0, 'ocupacoes': 0}
+        self.caminho_cubo = None
+        os.makedirs(self.raiz, exist_ok=True)
+
+    def registrar(self, fragmento):
+        self.fragmentos.append(fragmento)
+        for dimensao, quantidade in fragmento['chaves'].items():
+            self.n_chaves[dimensao] += quantidade
+
+    def fechar(self):
+        manifesto = {
+            'versao': VERSAO_MANIFESTO,
+            'execucao': self.execucao,
+            'criado_em': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'particionamento': 'crc32',
+            'n_fragmentos': self.n_fragmentos,
+            'faixas': self.nomes_faixas,
+            'quantis': self.quantis,
+            'fragmentos': sorted(self.fragmentos, key=lambda fragmento: fragmento['rank']),
+        }
+        _gravar_atomico(self.caminho_manifesto, lambda f: json.dump(manifesto, f, ensure_ascii=False, indent=1),
+                        encoding='utf-8')
+        referenciados = {nome for fragmento in self.fragmentos for nome in fragmento['arquivos'].values()}
+        for entrada in os.scandir(self.raiz):
+            if entrada.is_file() and entrada.name.endswith('.csv') and entrada.name not in referenciados:
+                os.remove(entrada.path)
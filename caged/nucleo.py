@@ -0,0 +1,185 @@
+import csv
+import os
+from functools import partial
+
+from caged.cubo import AcumuladorCubo
+from caged.erros import ARQUIVO_LOG, RegistroErros
+from caged.estatisticas import AgregadoParcial
+from caged.fatias import TAMANHO_BLOCO, abrir_fatia
+from caged.perfil import MOTIVOS_REJEICAO, Perfil
+from caged.prefiltro import abrir_fatia_admissoes
+from caged.quantis import verificar_faixa_quantis
+from caged.regras import REGRAS_PADRAO, como_regras
+
+# Núcleo de agregação comum a todos os backends (sequencial, pool de processos, MPI e Dask).
+# Aqui ficam a data de cada arquivo e o motor de linhas; as regras de salário, idade e unidade vêm das
+# regras compiladas (caged.regras), as mesmas do motor vetorizado e do colunar, então todos produzem o
+# mesmo agregado para a mesma fatia. processar_tarefa escolhe o motor de cada tarefa
+
+# Faixas etárias das regras padrão
+FAIXAS_ETARIAS = REGRAS_PADRAO.faixas_etarias
+
+MOTORES = ('linhas', 'vetorizado')
+
+COLUNAS_NECESSARIAS = ['subclasse', 'cbo2002ocupação', 'salário', 'idade', 'saldomovimentação', 'unidadesaláriocódigo',
+                       'horascontratuais']
+
+
+# Função para registrar uma mensagem avulsa no log (os erros das tarefas vão para um RegistroErros)
+def registrar_log(mensagem):
+    with open(ARQUIVO_LOG, 'a') as f:
+        f.write(mensagem + '\n')
+
+
+# Função para formatar a string do nome do arquivo e obter a data formatada
+def format_string(input_str):
+    if len(input_str) < 6:
+        return "A string deve ter pelo menos 6 caracteres."
+
+    last_six = input_str[-10:]
+    year = last_six[:4]
+    month = last_six[4:-4]
+    formatted_date = f"{year}-{month}-01"
+
+    return formatted_date
+
+
+# Função para determinar a faixa etária (consulta à tabela idade -> faixa das regras)
+def determinar_faixa_etaria(idade, faixas_etarias=FAIXAS_ETARIAS):
+    return como_regras(faixas_etarias).faixa(idade)
+
+
+# Função para processar uma fatia (faixa de bytes alinhada em linhas) de um arquivo com o csv.DictReader.
+# Com o pré-filtro, as linhas que não são admissão (ou de unidade 99/6/7) são descartadas em bytes
+# antes da decodificação (mesmo resultado). `regras` são as regras compiladas (ou só as faixas etárias);
+# os erros vão para o RegistroErros `erros`. Devolve None se a fatia não pôde ser processada
+def processar_fatia_linhas(fatia, regras, erros, tamanho_bloco=TAMANHO_BLOCO, perfil=None, quantis=False,
+                           prefiltro=True, cubo=False):
+    nome_arquivo = os.path.basename(fatia.caminho)
+    regras = como_regras(regras)
+    multiplicadores = regras.multiplicadores
+    por_hora = regras.por_hora
+    horas_minimas = regras.horas_minimas
+    salario_minimo = regras.salario_minimo
+    salario_maximo = regras.salario_maximo
+    if perfil is None:
+        perfil = Perfil()
+    abrir_linhas = partial(abrir_fatia_admissoes, regras=regras) if prefiltro else abrir_fatia
+    # Acumuladores por subclasse e ocupação (contagem, soma, soma dos quadrados, mínimo e máximo), ou por
+    # célula do cubo (mês, subclasse, ocupação, faixa etária e UF)
+    acumulador = AcumuladorCubo(format_string(nome_arquivo)) if cubo else AgregadoParcial(quantis)
+    # Contadores do perfil (somados ao perfil uma vez por fatia)
+    lidas = 0
+    rejeicoes = dict.fromkeys(MOTIVOS_REJEICAO, 0)
+    amostras_erro = []
+    limite_amostras = erros.faltam_amostras(nome_arquivo, 'linha')
+
+    try:
+        # O cabeçalho foi lido na divisão do arquivo; a fatia contém apenas linhas de dados
+        with perfil.etapa('laco_linhas'), abrir_linhas(fatia, tamanho_bloco, perfil=perfil) as csvfile:
+            reader = csv.DictReader(csvfile, fieldnames=fatia.colunas, delimiter=';')
+
+            if not all(field in reader.fieldnames for field in COLUNAS_NECESSARIAS):
+                erros.registrar(nome_arquivo, 'colunas')
+                return None  # Retorna None para indicar falha no processamento
+
+            for row in reader:
+                lidas += 1
+                try:
+                    if row['saldomovimentação'] != '1':
+                        rejeicoes['desligamento'] += 1
+                        continue
+
+                    subclass = row['subclasse'].strip()
+                    cbo = row['cbo2002ocupação'].strip()
+
+                    if row['salário'] == '':
+                        rejeicoes['salario_ausente'] += 1
+                        continue
+
+                    salario_float = float(row['salário'].replace(',', '.'))
+
+                    # Normalização para o salário mensal pelo 'unidadesaláriocódigo'; códigos sem
+                    # multiplicador nas regras (ex.: 99, 6 e 7) ou desconhecidos são ignorados
+                    unidade_codigo = row['unidadesaláriocódigo']
+                    multiplicador = multiplicadores.get(unidade_codigo)
+                    if multiplicador is None:
+                        rejeicoes['unidade'] += 1
+                        continue
+                    if unidade_codigo in por_hora:
+                        horas_str = row.get('horascontratuais', '').replace(',', '.')
+                        if horas_str == '':
+                            rejeicoes['horas'] += 1
+                            continue
+                        horas = int(float(horas_str))
+                        if horas < horas_minimas:
+                            rejeicoes['horas'] += 1
+                            continue
+                        salario = salario_float * (horas * multiplicador)
+                    else:
+                        salario = salario_float * multiplicador
+                    if salario < salario_minimo or salario > salario_maximo:
+                        rejeicoes['faixa_salarial'] += 1
+                        continue
+
+                    idade_str = row['idade'].strip()
+                    if idade_str == "":
+                        rejeicoes['idade'] += 1
+                        continue
+                    idade = int(idade_str)
+                    faixa_etaria = regras.faixa(idade)
+                    if faixa_etaria is None:
+                        rejeicoes['idade'] += 1
+                        continue  # Idade fora das faixas definidas
+
+                    # Acumular salário e idade, no geral e por faixa etária
+                    if cubo:
+                        acumulador.registrar(subclass, cbo, salario, idade, faixa_etaria, (row.get('uf') or '').strip())
+                    else:
+                        acumulador.registrar(subclass, cbo, salario, idade, faixa_etaria)
+
+                except Exception as e:
+                    rejeicoes['erro'] += 1
+                    if len(amostras_erro) < limite_amostras:
+                        linha = ';'.join(valor for valor in row.values() if isinstance(valor, str))
+                        amostras_erro.append(f"{e}: {linha}")
+                    continue  # Continua com a próxima linha
+
+        perfil.registrar_linhas(lidas, lidas - sum(rejeicoes.values()), rejeicoes)
+        if rejeicoes['erro']:
+            erros.registrar(nome_arquivo, 'linha', rejeicoes['erro'], amostras_erro)
+        # Retornar os dados processados
+        return acumulador.cubo() if cubo else acumulador
+
+    except Exception as e:
+        erros.registrar(nome_arquivo, 'abertura', amostras=[str(e)])
+        return None
+
+
+# Função para processar uma tarefa com o motor indicado: fatias de texto (ou de compactados) pelo motor de
+# linhas ou vetorizado, entradas do armazenamento colunar sempre pelo motor colunar.
+# Devolve o agregado da tarefa (ou o cubo da tarefa, com cubo=True) ou None se ela não pôde ser processada.
+# Os erros são acumulados em `erros`; sem ele, os erros da tarefa são gravados no log ao terminar
+def processar_tarefa(tarefa, regras=REGRAS_PADRAO, erros=None, motor='vetorizado',
+                     tamanho_bloco=TAMANHO_BLOCO, perfil=None, quantis=False, prefiltro=True, cubo=False):
+    regras = como_regras(regras)
+    if quantis:
+        verificar_faixa_quantis(regras)
+    if erros is None:
+        erros = RegistroErros()
+        try:
+            return processar_tarefa(tarefa, regras, erros, motor, tamanho_bloco, perfil, quantis, prefiltro, cubo)
+        finally:
+            erros.gravar()
+    if tarefa.armazenada:
+        from caged.colunar import processar_entrada_colunar
+
+        return processar_entrada_colunar(tarefa, regras, erros, perfil=perfil, quantis=quantis,
+                                         cubo=cubo)
+    if motor == 'vetorizado':
+        from caged.vetorizado import processar_fatia_vetorizado
+
+        return processar_fatia_vetorizado(tarefa, regras, erros, tamanho_bloco, perfil=perfil,
+                                          quantis=quantis, cubo=cubo)
+    return processar_fatia_linhas(tarefa, regras, erros, tamanho_bloco, perfil=perfil, quantis=quantis,
+                                  prefiltro=prefiltro, cubo=cubo)
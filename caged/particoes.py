@@ -0,0 +1,208 @@
+import csv
+import json
+import os
+import time
+
+import numpy as np
+
+from caged.cubo import Cubo
+from caged.quantis import QUANTIS
+from caged.saida import DIMENSOES_SAIDA, DIRETORIO_SAIDA, campos_saida, linhas_saida
+
+# Saídas particionadas por mês: cada mês é escrito, por quem terminou de reduzi-lo (o processo MPI que
+# recebeu a redução do mês, um processo do pool ou um worker do Dask), numa partição própria
+# particoes/date=AAAA-MM-DD/ com os CSVs do mês (mesmas colunas das saídas únicas, com a data) e,
+# opcionalmente, um formato binário colunar (.npz com as médias sem arredondamento, contagens e quantis).
+# Os arquivos de uma execução levam o identificador dela no nome e nunca são reescritos; o manifesto
+# (particoes/manifesto.json), trocado de uma vez no fim, é o que liga as partições de uma execução.
+# Quem lê as partições deve partir do manifesto: arquivos fora dele são de execuções anteriores ou
+# incompletas (e são removidos depois da troca)
+
+DIRETORIO_PARTICOES = 'particoes'
+ARQUIVO_MANIFESTO = 'manifesto.json'
+
+# Incrementar quando mudar o formato do manifesto ou dos arquivos das partições
+VERSAO_MANIFESTO = 1
+
+_ARQUIVOS = {'subclasses': 'subclasse', 'ocupacoes': 'ocupacoes'}
+
+
+def diretorio_particoes(diretorio_saida=DIRETORIO_SAIDA):
+    return os.path.join(diretorio_saida, DIRETORIO_PARTICOES)
+
+
+def novo_identificador():
+    return f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+
+
+def _gravar_atomico(caminho, gravar, modo='w', **opcoes):
+    temporario = f'{caminho}.{os.getpid()}.tmp'
+    with open(temporario, mode=modo, **opcoes) as f:
+        gravar(f)
+    os.replace(temporario, caminho)
+
+
+# Arrays do formato binário de uma dimensão num mês (mesma ordem de chaves do CSV)
+def _arrays_binarios(estatisticas_por_chave, nomes_faixas, quantis):
+    chaves = sorted(estatisticas_por_chave)
+    lista = [estatisticas_por_chave[chave] for chave in chaves]
+    arrays = {
+        'chave': np.array(chaves, dtype=str),
+        'faixas': np.array(nomes_faixas, dtype=str),
+        'n': np.array([estatisticas.salario.n for estatisticas in lista], dtype=np.int64),
+        'media_salarial_geral': np.array([estatisticas.salario.media() for estatisticas in lista]),
+        'media_idade_geral': np.array([estatisticas.idade.media() for estatisticas in lista]),
+        'n_faixas': np.array([[estatisticas.faixas[faixa].n if faixa in estatisticas.faixas else 0
+                               for faixa in nomes_faixas] for estatisticas in lista], dtype=np.int64).reshape(len(lista), len(nomes_faixas)),
+        'media_salarial_faixas': np.array([[estatisticas.media_faixa(faixa) for faixa in nomes_faixas]
+                                           for estatisticas in lista]).reshape(len(lista), len(nomes_faixas)),
+    }
+    if quantis:
+        arrays['quantis'] = np.array(list(QUANTIS), dtype=str)
+        arrays['quantis_geral'] = np.array([[estatisticas.quantil(q) for q in QUANTIS.values()]
+                                            for estatisticas in lista]).reshape(len(lista), len(QUANTIS))
+        arrays['quantis_faixas'] = np.array([[[estatisticas.quantil_faixa(faixa, q) for q in QUANTIS.values()]
+                                              for faixa in nomes_faixas] for estatisticas in lista]
+                                            ).reshape(len(lista), len(nomes_faixas), len(QUANTIS))
+    return arrays
+
+
+# Função para escrever a partição de um mês (no processo que tem o agregado ou o cubo do mês).
+# Devolve a descrição da partição para o manifesto e, em 'chaves', as chaves de cada dimensão
+def escrever_particao(raiz, execucao, formatted_date, agregado, nomes_faixas, quantis=False, binario=False,
+                      escritor=None):
+    nomes_faixas = list(nomes_faixas)
+    nome_particao = f'date={formatted_date}'
+    destino = os.path.join(raiz, nome_particao)
+    os.makedirs(destino, exist_ok=True)
+    arquivos = {}
+    if isinstance(agregado, Cubo):
+        nome_cubo = f'cubo-{execucao}.npz'
+        agregado.salvar(os.path.join(destino, nome_cubo))
+        arquivos['cubo'] = nome_cubo
+        agregado = agregado.agregado_parcial()
+
+    chaves = {}
+    for dimensao, coluna in DIMENSOES_SAIDA:
+        estatisticas_por_chave = getattr(agregado, dimensao)
+        chaves[dimensao] = sorted(estatisticas_por_chave)
+        nome_csv = f'{_ARQUIVOS[dimensao]}-{execucao}.csv'
+
+        def gravar_csv(arquivo):
+            writer = csv.DictWriter(arquivo, fieldnames=campos_saida(coluna, nomes_faixas, quantis), delimiter=';')
+            writer.writeheader()
+            for i, row in enumerate(linhas_saida(estatisticas_por_chave, coluna, nomes_faixas, formatted_date, quantis), 1):
+                row['id'] = i
+                writer.writerow(row)
+
+        _gravar_atomico(os.path.join(destino, nome_csv), gravar_csv, newline='', encoding='utf-8')
+        descricao = {'csv': nome_csv, 'linhas': len(estatisticas_por_chave)}
+        if binario:
+            nome_npz = f'{_ARQUIVOS[dimensao]}-{execucao}.npz'
+            arrays = _arrays_binarios(estatisticas_por_chave, nomes_faixas, quantis)
+            _gravar_atomico(os.path.join(destino, nome_npz), lambda arquivo: np.savez(arquivo, **arrays), modo='wb')
+            descricao['npz'] = nome_npz
+        arquivos[dimensao] = descricao
+
+    return {
+        'date': formatted_date,
+        'diretorio': nome_particao,
+        'escritor': str(escritor if escritor is not None else os.getpid()),
+        'arquivos': arquivos,
+        'chaves': chaves,
+    }
+
+
+# Função para ler o manifesto das partições (None se não houver)
+def ler_manifesto(raiz):
+    try:
+        with open(os.path.join(raiz, ARQUIVO_MANIFESTO), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+# Função para combinar os cubos das partições de um manifesto num cubo único
+def carregar_cubo_particionado(raiz, manifesto=None):
+    manifesto = manifesto or ler_manifesto(raiz)
+    cubo = Cubo()
+    for particao in manifesto['particoes']:
+        nome = particao['arquivos'].get('cubo')
+        if nome:
+            cubo.combinar(Cubo.carregar(os.path.join(raiz, particao['diretorio'], nome)))
+    return cubo
+
+
+# Escritor particionado no processo que coordena a execução. Com concluir(), escreve a partição no
+# próprio processo (backend sequencial); com registrar(), só recebe a descrição de uma partição escrita
+# por outro processo. O manifesto é gravado ao fechar
+class EscritorParticoes:
+    def __init__(self, datas, nomes_faixas, quantis=False, diretorio=DIRETORIO_SAIDA, binario=False, caminho_cubo=None,
+                 execucao=None):
+        self.nomes_faixas = list(nomes_faixas)
+        self.quantis = quantis
+        self.binario = binario
+        self.caminho_cubo = caminho_cubo
+        self.datas = sorted(set(datas))
+        self.execucao = execucao or novo_identificador()
+        self.raiz = diretorio_particoes(diretorio)
+        self.caminho_manifesto = os.path.join(self.raiz, ARQUIVO_MANIFESTO)
+        self.particoes = {}
+        self.chaves = {'subclasses': set(), 'ocupacoes': set()}
+        self.cubo = None
+        self.aberto = True
+        os.makedirs(self.raiz, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, *exc):
+        # Depois de uma falha, o manifesto anterior continua valendo
+        self.fechar(publicar=tipo is None)
+
+    def concluir(self, formatted_date, agregado):
+        self.registrar(escrever_particao(self.raiz, self.execucao, formatted_date, agregado, self.nomes_faixas,
+                                         self.quantis, self.binario))
+
+    def registrar(self, particao):
+        for dimensao, chaves in particao.pop('chaves').items():
+            self.chaves[dimensao].update(chaves)
+        self.particoes[particao['date']] = particao
+
+    def fechar(self, publicar=True):
+        if not self.aberto:
+            return
+        self.aberto = False
+        if not publicar:
+            return
+        manifesto = {
+            'versao': VERSAO_MANIFESTO,
+            'execucao': self.execucao,
+            'criado_em': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'faixas': self.nomes_faixas,
+            'quantis': self.quantis,
+            'formatos': ['csv', 'npz'] if self.binario else ['csv'],
+            # Meses sem nenhum agregado (todas as tarefas falharam) não têm partição
+            'particoes': [self.particoes[data] for data in self.datas if data in self.particoes],
+        }
+        _gravar_atomico(self.caminho_manifesto, lambda f: json.dump(manifesto, f, ensure_ascii=False, indent=1),
+                        encoding='utf-8')
+        self._remover_antigos(manifesto)
+        if self.caminho_cubo:
+            self.cubo = carregar_cubo_particionado(self.raiz, manifesto)
+            self.cubo.salvar(self.caminho_cubo)
+
+    # Remove os arquivos de execuções anteriores que o novo manifesto não referencia
+    def _remover_antigos(self, manifesto):
+        referenciados = {os.path.join(particao['diretorio'], nome) for particao in manifesto['particoes']
+                         for descricao in particao['arquivos'].values()
+                         for nome in ([descricao] if isinstance(descricao, str) else
+                                      [valor for chave, valor in descricao.items() if chave in ('csv', 'npz')])}
+        for entrada in os.scandir(self.raiz):
+            if not entrada.is_dir() or not entrada.name.startswith('date='):
+                continue
+            for arquivo in os.scandir(entrada.path):
+                if os.path.join(entrada.name, arquivo.name) not in referenciados:
+                    os.remove(arquivo.path)
+            if not any(os.scandir(entrada.path)):
+                os.rmdir(entrada.path)
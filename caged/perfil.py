@@ -0,0 +1,150 @@
+import contextlib
+import json
+import os
+import pickle
+import time
+
+# Instrumentação das execuções: tempo de parede e de CPU por etapa, linhas lidas, aceitas e rejeitadas
+# por motivo, bytes por arquivo e tamanho das mensagens trocadas entre processos.
+# As medições são feitas por bloco, fatia ou mensagem (nunca por linha), então ficam sempre ligadas.
+# O tamanho das mensagens não as serializa de novo: buffers, agregados e cubos informam os bytes dos seus
+# números (nbytes); as mensagens de controle (cargas, descrições, erros e perfis) só são medidas, pelo
+# pickle, no perfil detalhado (--perfil-detalhado)
+# Etapas podem ser aninhadas: o tempo de uma etapa interna é descontado da externa, e a soma das
+# etapas não conta nada duas vezes
+
+MOTIVOS_REJEICAO = ('desligamento', 'salario_ausente', 'unidade', 'faixa_salarial', 'horas', 'idade', 'erro')
+
+
+class Perfil:
+    def __init__(self, processo=None, detalhado=False):
+        self.processo = processo
+        self.detalhado = detalhado
+        # nome -> [parede, cpu, chamadas]
+        self.etapas = {}
+        self.lidas = 0
+        self.aceitas = 0
+        self.rejeicoes = dict.fromkeys(MOTIVOS_REJEICAO, 0)
+        self.arquivos = {}
+        # nome -> [mensagens, bytes]
+        self.mensagens = {}
+        self._pilha = []
+
+    def __getstate__(self):
+        estado = self.__dict__.copy()
+        estado['_pilha'] = []
+        return estado
+
+    # Mede um trecho como uma etapa (tempo de CPU da thread, para valer também nos workers do Dask)
+    @contextlib.contextmanager
+    def etapa(self, nome):
+        self.iniciar_etapa(nome)
+        try:
+            yield
+        finally:
+            self.encerrar_etapa()
+
+    # Início e fim de uma etapa sem bloco with, para trechos longos dos scripts
+    def iniciar_etapa(self, nome):
+        self._pilha.append([nome, time.perf_counter(), time.thread_time(), 0.0, 0.0])
+
+    def encerrar_etapa(self):
+        nome, inicio_parede, inicio_cpu, internas_parede, internas_cpu = self._pilha.pop()
+        parede = time.perf_counter() - inicio_parede
+        cpu = time.thread_time() - inicio_cpu
+        self.adicionar_etapa(nome, parede - internas_parede, cpu - internas_cpu)
+        if self._pilha:
+            self._pilha[-1][3] += parede
+            self._pilha[-1][4] += cpu
+
+    def adicionar_etapa(self, nome, parede, cpu, chamadas=1):
+        etapa = self.etapas.setdefault(nome, [0.0, 0.0, 0])
+        etapa[0] += parede
+        etapa[1] += cpu
+        etapa[2] += chamadas
+
+    # Linhas de um bloco ou fatia: lidas, aceitas e rejeitadas por motivo (dicionário motivo -> quantidade)
+    def registrar_linhas(self, lidas=0, aceitas=0, rejeicoes=None):
+        self.lidas += lidas
+        self.aceitas += aceitas
+        if rejeicoes:
+            for motivo, quantidade in rejeicoes.items():
+                self.rejeicoes[motivo] = self.rejeicoes.get(motivo, 0) + quantidade
+
+    def registrar_arquivo(self, caminho, n_bytes):
+        nome = os.path.basename(caminho)
+        self.arquivos[nome] = self.arquivos.get(nome, 0) + n_bytes
+
+    def registrar_mensagem(self, nome, n_bytes):
+        mensagem = self.mensagens.setdefault(nome, [0, 0])
+        mensagem[0] += 1
+        mensagem[1] += n_bytes
+
+    # Mensagem com um objeto: pelos bytes dos números (nbytes) quando o objeto os informa; os demais só no
+    # perfil detalhado, pelo tamanho do pickle (que o mpi4py e o Dask refazem ao enviar)
+    def registrar_objeto(self, nome, objeto):
+        n_bytes = getattr(objeto, 'nbytes', None)
+        if n_bytes is None:
+            if not self.detalhado:
+                return
+            n_bytes = tamanho_pickle(objeto)
+        self.registrar_mensagem(nome, n_bytes)
+
+    def combinar(self, outro):
+        for nome, (parede, cpu, chamadas) in outro.etapas.items():
+            self.adicionar_etapa(nome, parede, cpu, chamadas)
+        self.registrar_linhas(outro.lidas, outro.aceitas, outro.rejeicoes)
+        for nome, n_bytes in outro.arquivos.items():
+            self.arquivos[nome] = self.arquivos.get(nome, 0) + n_bytes
+        for nome, (quantidade, n_bytes) in outro.mensagens.items():
+            mensagem = self.mensagens.setdefault(nome, [0, 0])
+            mensagem[0] += quantidade
+            mensagem[1] += n_bytes
+        return self
+
+    def como_dict(self):
+        return {
+            'processo': self.processo,
+            'etapas': {nome: {'parede_s': round(parede, 6), 'cpu_s': round(cpu, 6), 'chamadas': chamadas}
+                       for nome, (parede, cpu, chamadas) in self.etapas.items()},
+            'linhas': {'lidas': self.lidas, 'aceitas': self.aceitas, 'rejeitadas': dict(self.rejeicoes)},
+            'bytes_por_arquivo': dict(sorted(self.arquivos.items())),
+            'mensagens': {nome: {'quantidade': quantidade, 'bytes': n_bytes}
+                          for nome, (quantidade, n_bytes) in self.mensagens.items()},
+        }
+
+    def __repr__(self):
+        return f'Perfil({self.processo!r}, {self.lidas} lidas, {self.aceitas} aceitas)'
+
+
+# Tamanho em bytes de um objeto serializado com pickle (o que o mpi4py envia nos métodos minúsculos)
+def tamanho_pickle(objeto):
+    return len(pickle.dumps(objeto, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+# Função para combinar perfis por processo (dicionários processo -> Perfil), como no agregado
+def combinar_perfis(destino, origem):
+    for processo, perfil in origem.items():
+        if processo in destino:
+            destino[processo].combinar(perfil)
+        else:
+            destino[processo] = perfil
+    return destino
+
+
+# Função para gravar o perfil da execução em JSON: o total, cada processo e informações extras
+def gravar_perfil(caminho, perfis, **extras):
+    total = Perfil('total')
+    for perfil in perfis:
+        total.combinar(perfil)
+    relatorio = dict(extras)
+    relatorio['total'] = total.como_dict()
+    relatorio['processos'] = [perfil.como_dict() for perfil in perfis]
+
+    diretorio = os.path.dirname(caminho)
+    if diretorio:
+        os.makedirs(diretorio, exist_ok=True)
+    temporario = f'{caminho}.{os.getpid()}.tmp'
+    with open(temporario, mode='w', encoding='utf-8') as f:
+        json.dump(relatorio, f, indent=1, ensure_ascii=False)
+    os.replace(temporario, caminho)
@@ -0,0 +1,117 @@
+import contextlib
+import io
+import mmap
+import re
+
+from caged.fatias import TAMANHO_BLOCO, ler_blocos, ler_linhas
+from caged.perfil import Perfil
+from caged.regras import como_regras
+
+# Pré-filtro em bytes para o motor de linhas: o arquivo é mapeado em memória e as linhas que o laço
+# de processar_arquivo descartaria logo de início (movimentações que não são admissão e unidades
+# salariais sem multiplicador nas regras, como 99/6/7) são removidas antes de qualquer decodificação
+# UTF-8, csv.DictReader ou float().
+# Só são descartadas linhas cujo destino é certo: linhas com aspas ou com '\r' no meio, que o módulo
+# csv trataria de outro jeito, passam adiante e são decididas pelo próprio laço
+
+# Valores de salário que float() certamente aceita (assim o descarte não esconde um erro de conversão)
+_SALARIO_NUMERICO = re.compile(rb'\s*[+-]?\d+(?:[.,]\d*)?\s*')
+
+
+# Função que monta o teste de cada linha a partir das posições das colunas no cabeçalho. O teste devolve
+# None para manter a linha ou o motivo do descarte ('vazia' para linhas em branco).
+# Devolve None se faltar alguma coluna: nesse caso a fatia é lida sem pré-filtro
+def _criar_teste(colunas, regras=None):
+    unidades_aceitas = frozenset(codigo.encode('utf-8') for codigo in como_regras(regras).multiplicadores)
+    try:
+        i_saldo = colunas.index('saldomovimentação')
+        i_unidade = colunas.index('unidadesaláriocódigo')
+        i_salario = colunas.index('salário')
+        # Campos lidos pelo laço antes do teste da unidade salarial (strip e float)
+        n_anteriores = max(colunas.index('subclasse'), colunas.index('cbo2002ocupação'), i_salario) + 1
+    except ValueError:
+        return None
+
+    def motivo_descarte(linha):
+        if b'"' in linha or b'\r' in linha[:-1]:
+            return None
+        campos = linha.split(b';', i_saldo + 1)
+        if len(campos) <= i_saldo or campos[i_saldo].rstrip(b'\r') != b'1':
+            return 'desligamento' if linha.rstrip(b'\r') else 'vazia'
+        campos = linha.rstrip(b'\r').split(b';')
+        if (len(campos) > i_unidade and len(campos) >= n_anteriores and campos[i_unidade] not in unidades_aceitas
+                and _SALARIO_NUMERICO.fullmatch(campos[i_salario])):
+            return 'unidade'
+        return None
+
+    return motivo_descarte
+
+
+# Blocos da fatia como recortes do arquivo mapeado em memória, terminados em quebra de linha
+def _blocos_mapeados(fatia, tamanho_bloco):
+    with open(fatia.caminho, mode='rb') as arquivo, \
+         mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+        posicao = fatia.inicio
+        while posicao < fatia.fim:
+            limite = min(posicao + tamanho_bloco, fatia.fim)
+            if limite < fatia.fim:
+                corte = mapa.rfind(b'\n', posicao, limite)
+                if corte < 0:
+                    corte = mapa.find(b'\n', limite, fatia.fim)
+                limite = corte + 1 if corte >= 0 else fatia.fim
+            yield mapa[posicao:limite]
+            posicao = limite
+
+
+# Função para iterar sobre as linhas de texto da fatia que sobrevivem ao pré-filtro.
+# Os blocos são recortes do arquivo mapeado em memória (ou, nas fatias compactadas e nas antecipadas,
+# os blocos lidos pela thread de leitura), terminados em quebra de linha.
+# As linhas descartadas entram no perfil como lidas e rejeitadas (as mantidas são contadas pelo laço)
+def ler_linhas_admissao(fatia, tamanho_bloco=TAMANHO_BLOCO, perfil=None, regras=None):
+    motivo_descarte = _criar_teste(fatia.colunas, regras)
+    if motivo_descarte is None:
+        yield from ler_linhas(fatia, tamanho_bloco, perfil)
+        return
+    if fatia.tamanho <= 0:
+        return
+    if perfil is None:
+        perfil = Perfil()
+
+    if fatia.compactada or fatia.antecipada:
+        blocos = ler_blocos(fatia, tamanho_bloco)
+    else:
+        blocos = _blocos_mapeados(fatia, tamanho_bloco)
+    with contextlib.closing(blocos):
+        while True:
+            with perfil.etapa('leitura'):
+                bloco = next(blocos, None)
+            if bloco is None:
+                return
+            with perfil.etapa('prefiltro'):
+                linhas = []
+                descartes = {'desligamento': 0, 'unidade': 0, 'vazia': 0}
+                for linha in bloco.split(b'\n'):
+                    motivo = motivo_descarte(linha)
+                    if motivo is None:
+                        linhas.append(linha)
+                    else:
+                        descartes[motivo] += 1
+                del bloco
+                descartes.pop('vazia')
+                perfil.registrar_linhas(lidas=sum(descartes.values()), rejeicoes=descartes)
+            if linhas:
+                # Mesma separação de linhas de ler_linhas (open(newline=''))
+                with perfil.etapa('decodificacao'):
+                    texto = io.StringIO(b'\n'.join(linhas).decode('utf-8') + '\n', newline='')
+                del linhas
+                yield from texto
+
+
+# Abre a fatia como um iterador das linhas de admissão, no lugar de abrir_fatia
+@contextlib.contextmanager
+def abrir_fatia_admissoes(fatia, tamanho_bloco=TAMANHO_BLOCO, perfil=None, regras=None):
+    linhas = ler_linhas_admissao(fatia, tamanho_bloco, perfil, regras)
+    try:
+        yield linhas
+    finally:
+        linhas.close()
@@ -0,0 +1,103 @@
+import math
+
+# Esboço de quantis mesclável para os salários (no estilo do DDSketch): cada valor cai num bucket
+# logarítmico de razão GAMMA = (1 + ERRO_RELATIVO) / (1 - ERRO_RELATIVO), e o esboço guarda só a
+# contagem de cada bucket. Os buckets são fixos, então combinar esboços de arquivos, fatias, ranks MPI
+# ou workers Dask é somar contagens (o resultado não depende da ordem nem da divisão dos dados).
+#
+# Memória: no máximo N_BUCKETS contagens por esboço (cerca de 160 com erro de 1% entre 1.000 e 25.000),
+# qualquer que seja o número de linhas.
+# Erro: o quantil q devolvido difere no máximo ERRO_RELATIVO (em termos relativos) do valor de posição
+# floor(q * (n - 1)) entre os n valores ordenados. Na mediana de uma quantidade par de valores esse é o
+# menor dos dois valores centrais, e não a média deles. Valores fora de [VALOR_MINIMO, VALOR_MAXIMO]
+# caem no bucket da ponta (os filtros de faixa salarial já os descartam)
+
+ERRO_RELATIVO = 0.01
+VALOR_MINIMO = 1000.0
+VALOR_MAXIMO = 25000.0
+
+GAMMA = (1 + ERRO_RELATIVO) / (1 - ERRO_RELATIVO)
+LOG_GAMMA = math.log(GAMMA)
+# O bucket k guarda os valores em (GAMMA ** (k - 1), GAMMA ** k]; o índice 0 é o de VALOR_MINIMO
+INDICE_MINIMO = math.ceil(math.log(VALOR_MINIMO) / LOG_GAMMA)
+N_BUCKETS = math.ceil(math.log(VALOR_MAXIMO) / LOG_GAMMA) - INDICE_MINIMO + 1
+
+# Quantis escritos nas saídas: nome da coluna -> q
+QUANTIS = {'p10': 0.1, 'mediana': 0.5, 'p90': 0.9}
+
+
+# Função para obter o bucket de um valor (a mesma conta é feita em lote no motor vetorizado)
+def indice_bucket(valor):
+    indice = math.ceil(math.log(min(max(valor, VALOR_MINIMO), VALOR_MAXIMO)) / LOG_GAMMA) - INDICE_MINIMO
+    return min(max(indice, 0), N_BUCKETS - 1)
+
+
+# Função para verificar se a faixa salarial aceita pelas regras cabe nos buckets do esboço. Os buckets são
+# fixos (são eles que tornam os esboços mescláveis entre fatias, processos e execuções); com uma faixa mais
+# larga, os salários fora de [VALOR_MINIMO, VALOR_MAXIMO] cairiam nos buckets das pontas e os quantis
+# sairiam errados, então essas regras são recusadas no modo de quantis
+def verificar_faixa_quantis(regras):
+    if regras.salario_minimo < VALOR_MINIMO or regras.salario_maximo > VALOR_MAXIMO:
+        raise ValueError(f'Os esboços de quantis cobrem salários de {VALOR_MINIMO:.0f} a {VALOR_MAXIMO:.0f}; as regras '
+                         f'aceitam de {regras.salario_minimo} a {regras.salario_maximo}. Use uma faixa salarial dentro '
+                         f'da dos esboços ou execute sem --quantis')
+
+
+# Valor representativo do bucket: a média harmônica das bordas, a no máximo ERRO_RELATIVO de qualquer valor do bucket
+def valor_bucket(indice):
+    return 2 * GAMMA ** (indice + INDICE_MINIMO) / (GAMMA + 1)
+
+
+class EsbocoQuantis:
+    __slots__ = ('n', 'contagens')
+
+    # contagens: dicionário bucket -> quantidade (só os buckets não vazios)
+    def __init__(self, contagens=None):
+        self.contagens = contagens if contagens is not None else {}
+        self.n = sum(self.contagens.values())
+
+    def adicionar(self, valor):
+        # Um NaN não tem posição na ordem dos valores
+        if valor != valor:
+            return
+        indice = indice_bucket(valor)
+        self.contagens[indice] = self.contagens.get(indice, 0) + 1
+        self.n += 1
+
+    def combinar(self, outro):
+        for indice, quantidade in outro.contagens.items():
+            self.contagens[indice] = self.contagens.get(indice, 0) + quantidade
+        self.n += outro.n
+        return self
+
+    # Mesma convenção da média: sem valores, o quantil é 0.0
+    def quantil(self, q):
+        if not self.n:
+            return 0.0
+        posicao = q * (self.n - 1)
+        acumulado = 0
+        for indice in sorted(self.contagens):
+            acumulado += self.contagens[indice]
+            if acumulado > posicao:
+                return valor_bucket(indice)
+        return valor_bucket(max(self.contagens))
+
+    def __repr__(self):
+        return f'EsbocoQuantis(n={self.n}, mediana={self.quantil(0.5):.2f})'
+
+
+# Colunas extras das saídas no modo de quantis: no geral e por faixa etária
+def colunas_quantis(nomes_faixas):
+    colunas = [f'{nome}_salarial_geral' for nome in QUANTIS]
+    for faixa in nomes_faixas:
+        colunas.extend(f'{nome}_{faixa}' for nome in QUANTIS)
+    return colunas
+
+
+# Valores formatados das colunas extras para as estatísticas de uma chave
+def valores_quantis(estatisticas, nomes_faixas):
+    valores = {f'{nome}_salarial_geral': f'{estatisticas.quantil(q):.2f}' for nome, q in QUANTIS.items()}
+    for faixa in nomes_faixas:
+        for nome, q in QUANTIS.items():
+            valores[f'{nome}_{faixa}'] = f'{estatisticas.quantil_faixa(faixa, q):.2f}'
+    return valores
@@ -0,0 +1,192 @@
+import numpy as np
+from mpi4py import MPI
+
+from caged.buffers import alocar_buffers, de_buffers, para_buffers, quantis_de_buffer, quantis_para_buffer
+from caged.erros import RegistroErros
+from caged.fragmentos import dono_chave
+from caged.perfil import Perfil
+
+# Redução numérica dos agregados entre processos MPI.
+# As chaves (subclasses e ocupações) são acordadas entre todos os processos e mapeadas em códigos
+# inteiros; cada processo monta buffers densos indexados por código e a combinação é feita com
+# comm.Reduce sobre esses buffers (SUM para contagem e somas, MIN e MAX para os extremos).
+# No modo de quantis, os esboços viram um buffer de contagens por bucket, também reduzido com SUM.
+# A conversão entre agregados e buffers fica em caged.buffers.
+# Com o embaralhamento (embaralhar_agregados), nada é reduzido num único processo: as linhas dos buffers
+# de todos os meses vão, com Alltoallv, para o processo dono de cada chave (caged.fragmentos.dono_chave),
+# que as combina e fica com os agregados finais só das suas chaves
+
+
+# Função para acordar a lista ordenada de chaves de cada dimensão entre todos os processos
+def acordar_chaves(comm, agregado, perfil=None):
+    locais = (list(agregado.subclasses), list(agregado.ocupacoes))
+    if perfil is not None:
+        perfil.registrar_mensagem('allgather_chaves', sum(len(chave) for chaves in locais for chave in chaves))
+    todas = comm.allgather(locais)
+    subclasses = sorted({chave for chaves, _ in todas for chave in chaves})
+    ocupacoes = sorted({chave for _, chaves in todas for chave in chaves})
+    return subclasses, ocupacoes
+
+
+# Função para reduzir os agregados de todos os processos no processo root (os demais recebem None).
+# Com quantis=True (em todos os processos), os esboços de quantis também são reduzidos
+def reduzir_agregados(comm, agregado, nomes_faixas, root=0, perfil=None, quantis=False):
+    if perfil is None:
+        perfil = Perfil()
+    with perfil.etapa('acordo_chaves'):
+        chaves = acordar_chaves(comm, agregado, perfil)
+    with perfil.etapa('serializacao'):
+        buffers = list(para_buffers(agregado, chaves, nomes_faixas))
+        operacoes = [MPI.SUM, MPI.MIN, MPI.MAX]
+        if quantis:
+            buffers.append(quantis_para_buffer(agregado, chaves, nomes_faixas))
+            operacoes.append(MPI.SUM)
+    perfil.registrar_mensagem('reduce_buffers', sum(buffer.nbytes for buffer in buffers))
+
+    with perfil.etapa('reducao'):
+        recebidos = []
+        for buffer, operacao in zip(buffers, operacoes):
+            recebido = np.empty_like(buffer) if comm.Get_rank() == root else None
+            comm.Reduce(buffer, recebido, op=operacao, root=root)
+            recebidos.append(recebido)
+
+    if comm.Get_rank() != root:
+        return None
+    with perfil.etapa('serializacao'):
+        agregado_final = de_buffers(recebidos[:3], chaves, nomes_faixas)
+        if quantis:
+            quantis_de_buffer(recebidos[3], agregado_final, chaves, nomes_faixas)
+        return agregado_final
+
+
+# Função para reduzir os cubos (caged.cubo) de todos os processos no processo root (os demais recebem None).
+# As células de cada processo são esparsas e em boa parte distintas; em vez de buffers densos do tamanho
+# do produto das dimensões, os cubos são recolhidos com comm.gather e combinados no root
+def reduzir_cubos(comm, cubo, root=0, perfil=None):
+    if perfil is None:
+        perfil = Perfil()
+    perfil.registrar_objeto('gather_cubo', cubo)
+    with perfil.etapa('reducao'):
+        cubos = comm.gather(cubo, root=root)
+    if comm.Get_rank() != root:
+        return None
+    with perfil.etapa('combinacao'):
+        total = cubos[0]
+        for outro in cubos[1:]:
+            total.combinar(outro)
+        return total
+
+
+# Função para reduzir os registros de erros (caged.erros) de todos os processos no processo root (os demais
+# recebem None): os registros são pequenos (contagens e amostras limitadas) e combinados com comm.reduce
+def reduzir_erros(comm, erros, root=0, perfil=None):
+    if perfil is None:
+        perfil = Perfil()
+    perfil.registrar_objeto('reduce_erros', erros)
+    with perfil.etapa('reducao'):
+        # A combinação não altera os registros de entrada (um deles é o do próprio processo)
+        return comm.reduce(erros, op=lambda a, b: RegistroErros(a.limite_amostras).combinar(a).combinar(b), root=root)
+
+
+# Separadores das chaves serializadas no embaralhamento (data, dimensão e chave de cada linha)
+_SEPARADOR_CAMPOS = '\x1f'
+_SEPARADOR_LINHAS = '\x1e'
+
+
+def _deslocamentos(contagens):
+    deslocamentos = np.zeros(len(contagens), dtype=np.int64)
+    np.cumsum(contagens[:-1], out=deslocamentos[1:])
+    return deslocamentos
+
+
+# Função para trocar com Alltoallv um array 1-D já ordenado por destino (`contagens` elementos para
+# cada processo). Devolve o array recebido e quantos elementos vieram de cada processo
+def _trocar(comm, enviados, contagens):
+    contagens = np.ascontiguousarray(contagens, dtype=np.int64)
+    recebidas = np.empty_like(contagens)
+    comm.Alltoall(contagens, recebidas)
+    recebidos = np.empty(int(recebidas.sum()), dtype=enviados.dtype)
+    comm.Alltoallv([np.ascontiguousarray(enviados), (contagens, _deslocamentos(contagens))],
+                   [recebidos, (recebidas, _deslocamentos(recebidas))])
+    return recebidos, recebidas
+
+
+# Função para embaralhar os agregados por mês de todos os processos pelo hash das chaves: cada processo
+# envia a cada outro as linhas (somas, mínimos, máximos e, com quantis, os esboços) das chaves que são
+# dele, recebe as das suas chaves e as combina. Devolve data -> agregado final com só as chaves do processo
+def embaralhar_agregados(comm, agregados, nomes_faixas, perfil=None, quantis=False):
+    if perfil is None:
+        perfil = Perfil()
+    size = comm.Get_size()
+
+    with perfil.etapa('serializacao'):
+        # Linhas locais de todos os meses: (data, dimensão, chave) e os buffers densos na mesma ordem
+        entradas = []
+        partes = [[buffer] for buffer in alocar_buffers(0, nomes_faixas, quantis)]
+        for formatted_date in sorted(agregados):
+            agregado = agregados[formatted_date]
+            chaves = (sorted(agregado.subclasses), sorted(agregado.ocupacoes))
+            buffers = list(para_buffers(agregado, chaves, nomes_faixas))
+            if quantis:
+                buffers.append(quantis_para_buffer(agregado, chaves, nomes_faixas))
+            for parte, buffer in zip(partes, buffers):
+                parte.append(buffer)
+            for dimensao, lista in enumerate(chaves):
+                entradas.extend((formatted_date, dimensao, chave) for chave in lista)
+        buffers = [np.concatenate(parte) for parte in partes]
+
+        destinos = np.array([dono_chave(chave, size) for _, _, chave in entradas], dtype=np.int64)
+        ordem = np.argsort(destinos, kind='stable')
+        linhas_por_destino = np.bincount(destinos, minlength=size)
+        textos = [[] for _ in range(size)]
+        for i in ordem.tolist():
+            textos[destinos[i]].append(_SEPARADOR_CAMPOS.join(map(str, entradas[i])))
+        codificados = [_SEPARADOR_LINHAS.join(linhas).encode('utf-8') for linhas in textos]
+        bytes_chaves = np.frombuffer(b''.join(codificados), dtype=np.uint8)
+    perfil.registrar_mensagem('alltoallv_chaves', bytes_chaves.nbytes)
+    perfil.registrar_mensagem('alltoallv_buffers', sum(buffer.nbytes for buffer in buffers))
+
+    with perfil.etapa('embaralhamento'):
+        recebidos_chaves, bytes_por_origem = _trocar(comm, bytes_chaves, [len(texto) for texto in codificados])
+        recebidos = []
+        for buffer in buffers:
+            largura = int(np.prod(buffer.shape[1:]))
+            valores, _ = _trocar(comm, buffer[ordem].reshape(-1), linhas_por_destino * largura)
+            recebidos.append(valores.reshape((-1,) + buffer.shape[1:]))
+
+    with perfil.etapa('combinacao'):
+        # Uma mesma (data, dimensão, chave) pode vir de vários processos
+        indices = {}
+        codigos = []
+        inicio = 0
+        for n_bytes in bytes_por_origem.tolist():
+            texto = recebidos_chaves[inicio:inicio + n_bytes].tobytes().decode('utf-8')
+            inicio += n_bytes
+            if not texto:
+                continue
+            for linha in texto.split(_SEPARADOR_LINHAS):
+                formatted_date, dimensao, chave = linha.split(_SEPARADOR_CAMPOS, 2)
+                codigos.append(indices.setdefault((formatted_date, int(dimensao), chave), len(indices)))
+        codigos = np.array(codigos, dtype=np.int64)
+        combinados = alocar_buffers(len(indices), nomes_faixas, quantis)
+        np.add.at(combinados[0], codigos, recebidos[0])
+        np.minimum.at(combinados[1], codigos, recebidos[1])
+        np.maximum.at(combinados[2], codigos, recebidos[2])
+        if quantis:
+            np.add.at(combinados[3], codigos, recebidos[3])
+
+        # Agregados finais por mês, com as chaves (subclasses e depois ocupações) na numeração de de_buffers
+        por_data = {}
+        for (formatted_date, dimensao, chave), indice in indices.items():
+            por_data.setdefault(formatted_date, ([], []))[dimensao].append((chave, indice))
+        finais = {}
+        for formatted_date, (subclasses, ocupacoes) in por_data.items():
+            subclasses.sort()
+            ocupacoes.sort()
+            linhas = [indice for _, indice in subclasses + ocupacoes]
+            chaves = ([chave for chave, _ in subclasses], [chave for chave, _ in ocupacoes])
+            agregado = de_buffers([buffer[linhas] for buffer in combinados[:3]], chaves, nomes_faixas)
+            if quantis:
+                quantis_de_buffer(combinados[3][linhas], agregado, chaves, nomes_faixas)
+            finais[formatted_date] = agregado
+        return finais
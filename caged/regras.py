@@ -0,0 +1,129 @@
+import hashlib
+import json
+
+import numpy as np
+
+# Regras de filtragem e normalização dos salários e faixas etárias, numa especificação declarativa
+# (dicionário ou arquivo JSON) compilada uma única vez em tabelas de consulta:
+#   - unidades: código da unidade salarial -> multiplicador para o salário mensal; códigos fora da
+#     lista são rejeitados (os 99, 6 e 7 do CAGED, por exemplo)
+#   - unidades_por_hora: unidades em que o multiplicador vale por hora contratual
+#     (salário x horas x multiplicador), exigindo ao menos horas_minimas
+#   - salario_minimo e salario_maximo: faixa aceita do salário mensal normalizado (com --quantis, dentro
+#     da faixa dos buckets dos esboços, caged.quantis)
+#   - faixas_etarias: nome -> [idade mínima, idade máxima] (a primeira faixa que contém a idade vale)
+# O motor de linhas, o vetorizado, o colunar e o pré-filtro usam as mesmas tabelas compiladas
+# (multiplicador por código, idade -> faixa), então trocar uma regra muda todos os backends juntos.
+#
+#   python -m caged.execucao --regras minhas_regras.json
+
+ESPECIFICACAO_PADRAO = {
+    'unidades': {'5': 1.0, '1': 4.33, '3': 4.33, '4': 2.0},
+    'unidades_por_hora': ['1'],
+    'horas_minimas': 20,
+    'salario_minimo': 1000,
+    'salario_maximo': 25000,
+    'faixas_etarias': {
+        '18-29': [18, 29],
+        '30-39': [30, 39],
+        '40-49': [40, 49],
+        '50-59': [50, 59],
+        '60+': [60, 200],  # 200 é um valor arbitrário para representar 60+
+    },
+}
+
+# Os códigos de unidade são comparados como texto exato; na forma vetorizada, como inteiros de 1 ou 2
+# dígitos sem zero à esquerda
+_MAXIMO_CODIGO = 100
+
+
+class Regras:
+    __slots__ = ('especificacao', 'multiplicadores', 'por_hora', 'horas_minimas', 'salario_minimo', 'salario_maximo',
+                 'faixas_etarias', 'nomes_faixas', 'tabela_multiplicadores', 'tabela_por_hora', 'tabela_faixas',
+                 '_faixa_por_idade', 'identificador')
+
+    def __init__(self, especificacao=None):
+        especificacao = dict(ESPECIFICACAO_PADRAO if especificacao is None else especificacao)
+        faltando = set(ESPECIFICACAO_PADRAO) - set(especificacao)
+        if faltando:
+            raise ValueError(f"Regras incompletas, faltam: {', '.join(sorted(faltando))}")
+        self.especificacao = especificacao
+        self.multiplicadores = {str(codigo): float(valor) for codigo, valor in especificacao['unidades'].items()}
+        self.por_hora = frozenset(str(codigo) for codigo in especificacao['unidades_por_hora'])
+        if not self.por_hora <= set(self.multiplicadores):
+            raise ValueError('Toda unidade por hora precisa de um multiplicador em unidades')
+        self.horas_minimas = especificacao['horas_minimas']
+        self.salario_minimo = especificacao['salario_minimo']
+        self.salario_maximo = especificacao['salario_maximo']
+        self.faixas_etarias = {str(nome): (int(minimo), int(maximo))
+                               for nome, (minimo, maximo) in especificacao['faixas_etarias'].items()}
+        if not self.faixas_etarias:
+            raise ValueError('Defina ao menos uma faixa etária')
+        self.nomes_faixas = list(self.faixas_etarias)
+
+        # Tabelas por código de unidade (NaN: unidade rejeitada)
+        self.tabela_multiplicadores = np.full(_MAXIMO_CODIGO, np.nan)
+        self.tabela_por_hora = np.zeros(_MAXIMO_CODIGO, dtype=bool)
+        for codigo, multiplicador in self.multiplicadores.items():
+            if not (codigo.isdigit() and len(codigo) <= 2 and (codigo == '0' or codigo[0] != '0')):
+                raise ValueError(f'Código de unidade salarial inválido: {codigo!r} (use inteiros de 1 ou 2 dígitos)')
+            self.tabela_multiplicadores[int(codigo)] = multiplicador
+            self.tabela_por_hora[int(codigo)] = codigo in self.por_hora
+
+        # Tabela idade -> índice da faixa etária (-1 fora das faixas); a primeira faixa que contém a idade vale
+        limite = max(maximo for _, maximo in self.faixas_etarias.values())
+        self.tabela_faixas = np.full(max(limite, 0) + 1, -1, dtype=np.int64)
+        for indice, (minimo, maximo) in reversed(list(enumerate(self.faixas_etarias.values()))):
+            self.tabela_faixas[max(minimo, 0):maximo + 1] = indice
+        # A mesma tabela com os nomes, para o motor de linhas (uma consulta de lista por linha)
+        self._faixa_por_idade = [self.nomes_faixas[indice] if indice >= 0 else None for indice in self.tabela_faixas.tolist()]
+
+        canonica = json.dumps(especificacao, sort_keys=True, ensure_ascii=False)
+        self.identificador = hashlib.sha256(canonica.encode('utf-8')).hexdigest()[:12]
+
+    def __getstate__(self):
+        return self.especificacao
+
+    def __setstate__(self, especificacao):
+        self.__init__(especificacao)
+
+    @property
+    def padrao(self):
+        return self.identificador == REGRAS_PADRAO.identificador
+
+    # Faixa etária de uma idade inteira (None fora das faixas), por consulta à tabela
+    def faixa(self, idade):
+        if 0 <= idade < len(self._faixa_por_idade):
+            return self._faixa_por_idade[idade]
+        return None
+
+    # Índices das faixas de um array de idades (-1 fora das faixas)
+    def faixas(self, idades):
+        inteiras = idades.astype(np.int64)
+        dentro = (inteiras >= 0) & (inteiras < len(self.tabela_faixas))
+        return np.where(dentro, self.tabela_faixas[np.where(dentro, inteiras, 0)], -1)
+
+    def __repr__(self):
+        return f'Regras({self.identificador}, unidades={sorted(self.multiplicadores)}, faixas={self.nomes_faixas})'
+
+
+# Função para carregar uma especificação de regras em JSON (as chaves ausentes ficam com o padrão)
+def carregar_regras(caminho):
+    with open(caminho, encoding='utf-8') as f:
+        especificacao = json.load(f)
+    return Regras({**ESPECIFICACAO_PADRAO, **especificacao})
+
+
+# Aceita regras compiladas ou só as faixas etárias (como nas versões anteriores: dicionário
+# nome -> (mínima, máxima)), que são combinadas com as demais regras padrão
+def como_regras(regras):
+    if regras is None:
+        return REGRAS_PADRAO
+    if isinstance(regras, Regras):
+        return regras
+    if regras is REGRAS_PADRAO.faixas_etarias:
+        return REGRAS_PADRAO
+    return Regras({**ESPECIFICACAO_PADRAO, 'faixas_etarias': {nome: list(limites) for nome, limites in regras.items()}})
+
+
+REGRAS_PADRAO = Regras()
@@ -0,0 +1,398 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# Processo residente: um pool de processos já iniciado, com os motores importados e aquecidos, que recebe
+# execuções por um socket local (Unix). Para os trabalhos pequenos e frequentes (um mês, um arquivo
+# reprocessado), o custo de iniciar o Python, importar o NumPy e os motores e subir o pool (ou o
+# LocalCluster do Dask, ou o mpirun) deixa de ser pago a cada execução. Os agregados dos meses lidos mais
+# recentemente (um por arquivo, identificado pelo caminho, tamanho, data de modificação e versão das
+# regras) ficam em memória, até um limite de bytes, com descarte do menos usado; um mês residente não é
+# relido. As execuções recebem as mesmas opções de caged.execucao e produzem as mesmas saídas, no
+# diretório de quem pediu; são atendidas uma de cada vez.
+#
+#   python -m caged.residente iniciar --memoria 1024 &
+#   python -m caged.residente executar -- --motor vetorizado --quantis
+#   python -m caged.residente estado
+#   python -m caged.residente parar
+#
+# O cliente (executar, estado, parar) só importa a biblioteca padrão
+
+SOCKET_PADRAO = os.path.join(tempfile.gettempdir(), f'caged-residente-{os.getuid()}.sock')
+
+# Limite padrão (MB) da memória dos meses residentes
+MEMORIA_MESES = 512
+
+_MB = 1024 * 1024
+
+
+# Meses residentes: agregado e erros de cada arquivo de entrada, com descarte do menos usado quando o
+# tamanho total (serializado) passa do limite
+class MesesResidentes:
+    __slots__ = ('limite', 'itens', 'bytes', 'acertos', 'faltas', 'descartes', 'trava')
+
+    def __init__(self, limite=MEMORIA_MESES * _MB):
+        self.limite = limite
+        # chave -> (agregado, erros, tamanho)
+        self.itens = OrderedDict()
+        self.bytes = 0
+        self.acertos = 0
+        self.faltas = 0
+        self.descartes = 0
+        self.trava = threading.Lock()
+
+    # Identificação de um arquivo de entrada: muda quando o arquivo ou as regras mudam
+    @staticmethod
+    def chave(caminho, versao):
+        info = os.stat(caminho)
+        return os.path.abspath(caminho), info.st_size, info.st_mtime_ns, versao
+
+    def obter(self, chave):
+        with self.trava:
+            item = self.itens.get(chave)
+            if item is None:
+                self.faltas += 1
+                return None
+            self.itens.move_to_end(chave)
+            self.acertos += 1
+            return item[0], item[1]
+
+    def guardar(self, chave, agregado, erros):
+        from caged.perfil import tamanho_pickle
+
+        tamanho = tamanho_pickle((agregado, erros))
+        with self.trava:
+            if chave in self.itens:
+                self.bytes -= self.itens.pop(chave)[2]
+            if tamanho > self.limite:
+                return
+            self.itens[chave] = (agregado, erros, tamanho)
+            self.bytes += tamanho
+            while self.bytes > self.limite:
+                _, (_, _, tamanho_descartado) = self.itens.popitem(last=False)
+                self.bytes -= tamanho_descartado
+                self.descartes += 1
+
+    def limpar(self):
+        with self.trava:
+            self.itens.clear()
+            self.bytes = 0
+
+    def estado(self):
+        with self.trava:
+            return {
+                'meses': [{'arquivo': os.path.basename(caminho), 'versao': versao, 'bytes': tamanho}
+                          for (caminho, _, _, versao), (_, _, tamanho) in self.itens.items()],
+                'bytes': self.bytes,
+                'limite_bytes': self.limite,
+                'acertos': self.acertos,
+                'faltas': self.faltas,
+                'descartes': self.descartes,
+            }
+
+
+# Inicialização de cada processo do pool: importa os motores e processa um bloco mínimo em cada um, para
+# que a primeira tarefa real não pague as importações e a primeira passagem pelo NumPy
+def _aquecer():
+    from caged.colunar import processar_entrada_colunar  # noqa: F401
+    from caged.erros import RegistroErros
+    from caged.estatisticas import AgregadoParcial
+    from caged.nucleo import COLUNAS_NECESSARIAS
+    from caged.regras import REGRAS_PADRAO
+    from caged.vetorizado import agregar_bloco
+
+    indices_colunas = {nome: i for i, nome in enumerate(COLUNAS_NECESSARIAS)}
+    bloco = b'4711302;411005;2500,00;30;1;5;44\n4711302;411005;abc;40;1;5;44\n'
+    agregar_bloco(AgregadoParcial(), bloco, indices_colunas, REGRAS_PADRAO, REGRAS_PADRAO.nomes_faixas,
+                  erros=RegistroErros(), nome_arquivo='aquecimento')
+
+
+def _pronto():
+    return os.getpid()
+
+
+# Tarefa do pool residente: o agregado da fatia (None se ela falhou), o perfil e os erros da tarefa
+def _tarefa_residente(tarefa, configuracao, cache=None, hash_tarefa=None):
+    from caged.erros import RegistroErros
+    from caged.execucao import executar_tarefa
+    from caged.perfil import Perfil
+
+    perfil = Perfil(os.getpid())
+    erros = RegistroErros()
+    agregado = executar_tarefa(tarefa, configuracao, perfil, cache, hash_tarefa, erros)
+    return agregado, perfil, erros
+
+
+class ProcessadorResidente:
+    def __init__(self, trabalhadores=None, memoria=MEMORIA_MESES * _MB):
+        from concurrent.futures import ProcessPoolExecutor
+
+        import caged.execucao  # noqa: F401  (os motores já ficam importados antes do fork dos processos)
+
+        self.trabalhadores = trabalhadores or os.cpu_count() or 1
+        self.meses = MesesResidentes(memoria)
+        self.executor = ProcessPoolExecutor(max_workers=self.trabalhadores, initializer=_aquecer)
+        # Todos os processos do pool sobem agora, não na primeira execução
+        for future in [self.executor.submit(_pronto) for _ in range(self.trabalhadores)]:
+            future.result()
+        self.trava = threading.Lock()
+        self.execucoes = 0
+        self.iniciado_em = time.time()
+
+    def encerrar(self):
+        self.executor.shutdown(cancel_futures=True)
+
+    # Função para atender uma execução com as opções de caged.execucao, no diretório de quem pediu.
+    # Devolve o que a execução imprimiu (as mesmas mensagens de python -m caged.execucao)
+    def executar(self, argumentos, diretorio):
+        from caged.execucao import Configuracao, criar_parser
+
+        with self.trava:
+            saida = io.StringIO()
+            anterior = os.getcwd()
+            os.chdir(diretorio)
+            try:
+                with contextlib.redirect_stdout(saida), contextlib.redirect_stderr(saida):
+                    parser = criar_parser('Execução no processo residente', backend='residente')
+                    parser.prog = 'python -m caged.residente executar --'
+                    try:
+                        args = parser.parse_args(argumentos)
+                    except SystemExit as e:
+                        # Opções inválidas (ou --help): a mensagem do argparse volta para o cliente
+                        return {'ok': e.code == 0, 'saida': saida.getvalue()}
+                    self._executar(Configuracao.de_argumentos(args))
+            finally:
+                os.chdir(anterior)
+            self.execucoes += 1
+            return {'ok': True, 'saida': saida.getvalue()}
+
+    def _executar(self, configuracao):
+        from concurrent.futures import as_completed
+
+        from caged.erros import RegistroErros
+        from caged.execucao import _gravar_perfil, dimensionar, imprimir_resumo, listar_entradas, preparar_cache
+        from caged.fatias import dividir_arquivos
+        from caged.nucleo import format_string
+        from caged.perfil import Perfil, combinar_perfis
+
+        inicio = time.perf_counter()
+        # Os processos do pool não mudam de diretório: os caminhos que eles usam ficam absolutos
+        for nome in ('diretorio_entrada', 'diretorio_cache', 'diretorio_armazenamento'):
+            valor = getattr(configuracao, nome)
+            if valor:
+                setattr(configuracao, nome, os.path.abspath(valor))
+        # O pool é o do processo residente (--trabalhadores de uma execução não muda o número de processos)
+        configuracao.trabalhadores = self.trabalhadores
+        perfil = Perfil('residente')
+        erros = RegistroErros()
+        try:
+            with perfil.etapa('listagem'):
+                entradas, caminhos, bytes_total = listar_entradas(configuracao, erros)
+                _, configuracao.tamanho_fatia = dimensionar(bytes_total, self.trabalhadores, self.trabalhadores,
+                                                            configuracao.tamanho_fatia)
+
+            # Cada arquivo de entrada (um mês) vem da memória ou é processado no pool
+            versao = configuracao.versao_cache
+            datas = {}
+            resultados = {}
+            a_processar = []
+            for caminho, nome in [(entrada.caminho, entrada.nome) for entrada in entradas] + [(c, os.path.basename(c)) for c in caminhos]:
+                chave = MesesResidentes.chave(caminho, versao)
+                datas[chave] = format_string(nome)
+                resultados[chave] = self.meses.obter(chave)
+                if resultados[chave] is None:
+                    a_processar.append(caminho)
+            print(f"Processo residente: {len(resultados) - len(a_processar)} meses em memória, "
+                  f"{len(a_processar)} a processar ({self.trabalhadores} trabalhadores)")
+
+            with perfil.etapa('listagem'):
+                tarefas = [entrada for entrada in entradas if entrada.caminho in a_processar]
+                tarefas += dividir_arquivos([caminho for caminho in caminhos if caminho in a_processar],
+                                            configuracao.tamanho_fatia, erros)
+            cache, hashes = None, {}
+            if configuracao.diretorio_cache:
+                with perfil.etapa('cache'):
+                    cache, hashes = preparar_cache(configuracao, [tarefa for tarefa in tarefas if not tarefa.armazenada])
+
+            parciais = {}
+            perfis = {}
+            perfil.iniciar_etapa('espera')
+            futures = {self.executor.submit(_tarefa_residente, tarefa, configuracao, cache, hashes.get(tarefa.caminho)):
+                       MesesResidentes.chave(tarefa.caminho, versao) for tarefa in tarefas}
+            for future in as_completed(futures):
+                chave = futures[future]
+                agregado, perfil_tarefa, erros_tarefa = future.result()
+                combinar_perfis(perfis, {perfil_tarefa.processo: perfil_tarefa})
+                if chave not in parciais:
+                    parciais[chave] = [configuracao.novo_agregado(), RegistroErros(), True]
+                parcial = parciais[chave]
+                parcial[1].combinar(erros_tarefa)
+                if agregado is None:
+                    parcial[2] = False
+                else:
+                    with perfil.etapa('combinacao'):
+                        parcial[0].combinar(agregado)
+            perfil.encerrar_etapa()
+            for chave, (agregado, erros_arquivo, completo) in parciais.items():
+                resultados[chave] = (agregado, erros_arquivo)
+                # Arquivos com alguma tarefa que falhou não ficam em memória (a falha pode ser passageira)
+                if completo:
+                    self.meses.guardar(chave, agregado, erros_arquivo)
+
+            # Os agregados residentes não são alterados: cada mês é combinado num agregado novo
+            # (arquivos sem nenhuma tarefa, como os sem as colunas necessárias, não geram mês, como nos backends)
+            por_data = {}
+            for chave, formatted_date in datas.items():
+                if resultados[chave] is not None:
+                    por_data.setdefault(formatted_date, []).append(chave)
+            with configuracao.criar_escritor(por_data) as escritor:
+                for formatted_date in sorted(por_data):
+                    agregado = configuracao.novo_agregado()
+                    for chave in por_data[formatted_date]:
+                        agregado.combinar(resultados[chave][0])
+                        erros.combinar(resultados[chave][1])
+                    with perfil.etapa('escrita'):
+                        escritor.concluir(formatted_date, agregado)
+            _gravar_perfil(configuracao, [perfil] + sorted(perfis.values(), key=lambda p: str(p.processo)), 'residente',
+                           self.trabalhadores, inicio, erros=erros.como_dict(), meses_residentes=self.meses.estado())
+        finally:
+            erros.gravar()
+        imprimir_resumo(escritor, erros, inicio)
+
+    def estado(self):
+        return {
+            'ok': True,
+            'pid': os.getpid(),
+            'trabalhadores': self.trabalhadores,
+            'execucoes': self.execucoes,
+            'ativo_ha_s': round(time.time() - self.iniciado_em, 3),
+            'memoria': self.meses.estado(),
+        }
+
+
+class _Tratador(socketserver.StreamRequestHandler):
+    def handle(self):
+        linha = self.rfile.readline()
+        # Conexão sem pedido (como a verificação de socket em uso de outro processo): nada a responder
+        if not linha.strip():
+            return
+        try:
+            pedido = json.loads(linha)
+            resposta = self.server.atender(pedido)
+        except Exception as e:
+            resposta = {'ok': False, 'erro': f'{type(e).__name__}: {e}'}
+        self.wfile.write(json.dumps(resposta, ensure_ascii=False).encode('utf-8') + b'\n')
+
+
+class ServidorResidente(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, processador, caminho_socket=SOCKET_PADRAO):
+        self.processador = processador
+        self.caminho_socket = caminho_socket
+        _remover_socket_antigo(caminho_socket)
+        super().__init__(caminho_socket, _Tratador)
+        # Só o próprio usuário pode submeter execuções
+        os.chmod(caminho_socket, 0o600)
+
+    def atender(self, pedido):
+        acao = pedido.get('acao')
+        if acao == 'executar':
+            return self.processador.executar(list(pedido.get('argumentos', [])), pedido['diretorio'])
+        if acao == 'estado':
+            return self.processador.estado()
+        if acao == 'limpar':
+            self.processador.meses.limpar()
+            return {'ok': True}
+        if acao == 'parar':
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return {'ok': True}
+        return {'ok': False, 'erro': f'Ação desconhecida: {acao!r}'}
+
+    def server_close(self):
+        super().server_close()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.caminho_socket)
+
+
+# Um socket que sobrou de um processo residente que terminou é removido; um em uso não
+def _remover_socket_antigo(caminho_socket):
+    if not os.path.exists(caminho_socket):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conexao:
+        try:
+            conexao.connect(caminho_socket)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.remove(caminho_socket)
+            return
+    raise RuntimeError(f'Já existe um processo residente em {caminho_socket}')
+
+
+# Função para enviar um pedido ao processo residente e receber a resposta (dicionários JSON)
+def enviar(pedido, caminho_socket=SOCKET_PADRAO):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conexao:
+        conexao.connect(caminho_socket)
+        conexao.sendall(json.dumps(pedido, ensure_ascii=False).encode('utf-8') + b'\n')
+        with conexao.makefile('rb') as f:
+            return json.loads(f.readline())
+
+
+def iniciar(caminho_socket=SOCKET_PADRAO, trabalhadores=None, memoria=MEMORIA_MESES * _MB):
+    processador = ProcessadorResidente(trabalhadores, memoria)
+    try:
+        with ServidorResidente(processador, caminho_socket) as servidor:
+            print(f'Processo residente em {caminho_socket}: {processador.trabalhadores} trabalhadores, '
+                  f'até {memoria // _MB} MB de meses em memória', flush=True)
+            try:
+                servidor.serve_forever()
+            except KeyboardInterrupt:
+                pass
+    finally:
+        processador.encerrar()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Processo residente para execuções pequenas e frequentes')
+    parser.add_argument('--socket', default=SOCKET_PADRAO, help=f'socket local (padrão: {SOCKET_PADRAO})')
+    comandos = parser.add_subparsers(dest='comando', required=True)
+    comando_iniciar = comandos.add_parser('iniciar', help='inicia o processo residente (em primeiro plano)')
+    comando_iniciar.add_argument('--trabalhadores', type=int, default=None,
+                                 help='processos do pool (padrão: número de núcleos)')
+    comando_iniciar.add_argument('--memoria', type=int, default=MEMORIA_MESES,
+                                 help='limite (MB) dos agregados de meses mantidos em memória (0 desliga)')
+    comandos.add_parser('executar', help='executa no processo residente; as opções depois de -- são as de '
+                                         'python -m caged.execucao')
+    comandos.add_parser('estado', help='mostra os meses em memória e os contadores do processo residente')
+    comandos.add_parser('limpar', help='descarta os meses em memória')
+    comandos.add_parser('parar', help='encerra o processo residente')
+    args, argumentos = parser.parse_known_args()
+    if argumentos and argumentos[0] == '--':
+        argumentos = argumentos[1:]
+    if argumentos and args.comando != 'executar':
+        parser.error(f"opções não reconhecidas: {' '.join(argumentos)}")
+
+    if args.comando == 'iniciar':
+        iniciar(args.socket, args.trabalhadores, args.memoria * _MB)
+        sys.exit(0)
+    try:
+        if args.comando == 'executar':
+            resposta = enviar({'acao': 'executar', 'argumentos': argumentos, 'diretorio': os.getcwd()}, args.socket)
+        else:
+            resposta = enviar({'acao': args.comando}, args.socket)
+    except (FileNotFoundError, ConnectionRefusedError):
+        sys.exit(f'Nenhum processo residente em {args.socket} (inicie com python -m caged.residente iniciar)')
+    if 'saida' in resposta:
+        print(resposta['saida'], end='')
+    elif args.comando == 'estado':
+        print(json.dumps(resposta, ensure_ascii=False, indent=1))
+    if not resposta.get('ok'):
+        sys.exit(resposta.get('erro', 1))
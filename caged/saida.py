@@ -0,0 +1,183 @@
+import csv
+import os
+
+from caged.amostragem import colunas_intervalos
+from caged.cubo import Cubo
+from caged.quantis import colunas_quantis, valores_quantis
+
+# Escrita das saídas subclasse_output.csv e ocupacoes_output.csv, igual em todos os backends.
+# Cada linha é uma chave (subclasse ou ocupação) num mês, com a data preenchida. Os meses podem ficar
+# prontos em qualquer ordem (o pool e o Dask terminam os meses fora de ordem); o escritor não guarda
+# os agregados dos que chegam adiantados: as linhas deles vão na hora para arquivos temporários do mês,
+# copiados (com o id renumerado) quando os meses anteriores forem escritos. As saídas ficam sempre em
+# ordem de data, com as chaves ordenadas dentro do mês, de modo que a mesma entrada produz as mesmas linhas em qualquer backend (as médias podem diferir na
+# última casa decimal, porque a ordem das somas muda com as fatias e o escalonamento). Os arquivos são escritos
+# com nomes temporários e trocados pelos definitivos ao fechar, então quem os lê (ex.: caged.consulta)
+# nunca vê uma saída pela metade.
+# Com `caminho_cubo`, cada mês chega como um cubo (caged.cubo): as saídas são projeções dele e os
+# cubos dos meses são combinados num cubo único, gravado ao fechar. Com `fragmento`, o nome dele entra no
+# nome dos arquivos (fragmentos por hash das chaves, caged.fragmentos). Com `intervalos` (modo aproximado,
+# caged.amostragem), cada média ganha o intervalo de confiança e o tamanho efetivo da amostra
+
+DIRETORIO_SAIDA = 'output_caged'
+
+# Dimensões das saídas: atributo do agregado e coluna da chave
+DIMENSOES_SAIDA = (('subclasses', 'cnae'), ('ocupacoes', 'ocupacao'))
+
+
+# Colunas de uma saída (a coluna da chave é 'cnae' ou 'ocupacao')
+def campos_saida(coluna, nomes_faixas, quantis=False, intervalos=False):
+    fieldnames = ['id', coluna, 'media_salarial_geral'] + list(nomes_faixas) + ['media_idade_geral', 'date']
+    if quantis:
+        # Colunas dos quantis no fim, para não mudar a posição das colunas existentes
+        fieldnames += colunas_quantis(nomes_faixas)
+    if intervalos:
+        fieldnames += colunas_intervalos(nomes_faixas)
+    return fieldnames
+
+
+# Função para montar as linhas (sem o id) de uma dimensão num mês, com as chaves em ordem:
+# médias salariais e de idade de cada chave, no geral e por faixa etária. `intervalos` tem, por chave, os
+# valores das colunas do modo aproximado
+def linhas_saida(estatisticas_por_chave, coluna, nomes_faixas, formatted_date, quantis=False, intervalos=None):
+    for chave in sorted(estatisticas_por_chave):
+        estatisticas = estatisticas_por_chave[chave]
+        row = {
+            coluna: chave,
+            'media_salarial_geral': f'{estatisticas.salario.media():.2f}',
+            'media_idade_geral': f'{estatisticas.idade.media():.2f}',
+            'date': formatted_date
+        }
+        for faixa in nomes_faixas:
+            row[faixa] = f'{estatisticas.media_faixa(faixa):.2f}'
+        if quantis:
+            row.update(valores_quantis(estatisticas, nomes_faixas))
+        if intervalos is not None:
+            row.update(intervalos[chave])
+        yield row
+
+
+class EscritorSaidas:
+    def __init__(self, datas, nomes_faixas, quantis=False, diretorio=DIRETORIO_SAIDA, caminho_cubo=None, fragmento=None,
+                 intervalos=False):
+        self.nomes_faixas = list(nomes_faixas)
+        self.quantis = quantis
+        self.intervalos = intervalos
+        self.caminho_cubo = caminho_cubo
+        self.cubo = Cubo() if caminho_cubo else None
+        self.datas = sorted(set(datas))
+        self.proxima = 0
+        # data -> {dimensão: (arquivo temporário, linhas)} dos meses escritos antes dos anteriores
+        self.adiantados = {}
+        self.linhas = {'subclasses': 0, 'ocupacoes': 0}
+        self.chaves = {'subclasses': set(), 'ocupacoes': set()}
+
+        os.makedirs(diretorio, exist_ok=True)
+        sufixo = f'.{fragmento}' if fragmento else ''
+        self.caminho_subclasses = f'./{diretorio}/subclasse_output{sufixo}.csv'
+        self.caminho_ocupacoes = f'./{diretorio}/ocupacoes_output{sufixo}.csv'
+        self.arquivos = []
+        self.temporarios = []
+        self.escritores = {}
+        for (dimensao, coluna), caminho in zip(DIMENSOES_SAIDA, (self.caminho_subclasses, self.caminho_ocupacoes)):
+            fieldnames = campos_saida(coluna, self.nomes_faixas, quantis, intervalos)
+            temporario = f'{caminho}.{os.getpid()}.tmp'
+            arquivo = open(temporario, mode='w', newline='', encoding='utf-8')
+            self.arquivos.append(arquivo)
+            self.temporarios.append((temporario, caminho))
+            writer = csv.DictWriter(arquivo, fieldnames=fieldnames, delimiter=';')
+            writer.writeheader()
+            self.escritores[dimensao] = (writer, coluna)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, *exc):
+        # Depois de uma falha, as saídas anteriores continuam no lugar
+        self.fechar(publicar=tipo is None)
+
+    # Função para entregar o agregado de um mês concluído: é escrito nas saídas se os meses anteriores já o
+    # foram, ou nos arquivos temporários do mês se chegou adiantado (o agregado não fica guardado)
+    def concluir(self, formatted_date, agregado):
+        if self.proxima < len(self.datas) and self.datas[self.proxima] == formatted_date:
+            self._escrever_mes(agregado, formatted_date)
+            self.proxima += 1
+            self._copiar_adiantados()
+        else:
+            self._adiantar_mes(agregado, formatted_date)
+
+    # Linhas de cada dimensão de um mês (com o cubo, também o combina no cubo único)
+    def _linhas_mes(self, agregado, formatted_date):
+        if isinstance(agregado, Cubo):
+            self.cubo.combinar(agregado)
+            agregado = agregado.agregado_parcial()
+        for dimensao in ('subclasses', 'ocupacoes'):
+            coluna = self.escritores[dimensao][1]
+            estatisticas_por_chave = getattr(agregado, dimensao)
+            self.chaves[dimensao].update(estatisticas_por_chave)
+            intervalos = agregado.intervalos[dimensao] if self.intervalos else None
+            yield dimensao, linhas_saida(estatisticas_por_chave, coluna, self.nomes_faixas, formatted_date,
+                                         self.quantis, intervalos)
+
+    def _escrever_mes(self, agregado, formatted_date):
+        for dimensao, linhas in self._linhas_mes(agregado, formatted_date):
+            writer = self.escritores[dimensao][0]
+            for row in linhas:
+                self.linhas[dimensao] += 1
+                row['id'] = self.linhas[dimensao]
+                writer.writerow(row)
+
+    # Mês adiantado: as linhas vão para um arquivo temporário por dimensão, com o id contado dentro do mês
+    def _adiantar_mes(self, agregado, formatted_date):
+        arquivos = {}
+        for (dimensao, linhas), (temporario_saida, _) in zip(self._linhas_mes(agregado, formatted_date),
+                                                             self.temporarios):
+            temporario = f'{temporario_saida}.{formatted_date}'
+            quantidade = 0
+            with open(temporario, mode='w', newline='', encoding='utf-8') as arquivo:
+                writer = csv.DictWriter(arquivo, fieldnames=self.escritores[dimensao][0].fieldnames, delimiter=';')
+                for quantidade, row in enumerate(linhas, 1):
+                    row['id'] = quantidade
+                    writer.writerow(row)
+            arquivos[dimensao] = (temporario, quantidade)
+        self.adiantados[formatted_date] = arquivos
+
+    # Copia para as saídas, em ordem de data, os meses adiantados que já podem ser escritos
+    def _copiar_adiantados(self, ate_o_fim=False):
+        while self.proxima < len(self.datas):
+            data = self.datas[self.proxima]
+            if data in self.adiantados:
+                for dimensao, (temporario, quantidade) in self.adiantados.pop(data).items():
+                    writer = self.escritores[dimensao][0].writer
+                    with open(temporario, newline='', encoding='utf-8') as arquivo:
+                        for row in csv.reader(arquivo, delimiter=';'):
+                            row[0] = str(self.linhas[dimensao] + int(row[0]))
+                            writer.writerow(row)
+                    self.linhas[dimensao] += quantidade
+                    os.remove(temporario)
+            elif not ate_o_fim:
+                return
+            self.proxima += 1
+
+    def _remover_adiantados(self):
+        for arquivos in self.adiantados.values():
+            for temporario, _ in arquivos.values():
+                os.remove(temporario)
+        self.adiantados.clear()
+
+    # Meses sem nenhum agregado (todas as tarefas falharam) não geram linhas
+    def fechar(self, publicar=True):
+        if publicar:
+            self._copiar_adiantados(ate_o_fim=True)
+        self._remover_adiantados()
+        for arquivo in self.arquivos:
+            arquivo.close()
+        for temporario, caminho in self.temporarios:
+            if publicar:
+                os.replace(temporario, caminho)
+            else:
+                os.remove(temporario)
+        if self.arquivos and self.caminho_cubo and publicar:
+            self.cubo.salvar(self.caminho_cubo)
+        self.arquivos = []
+        self.temporarios = []
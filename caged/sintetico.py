@@ -0,0 +1,155 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+# Gerador determinístico de arquivos no formato CAGEDMOV (mesmas colunas, separador ';' e decimais com
+# vírgula dos arquivos do Novo CAGED), para medir desempenho sem depender dos dados reais.
+# A mesma semente gera sempre os mesmos bytes. Subclasses e ocupações seguem uma distribuição de Zipf
+# (poucas chaves concentram a maior parte das linhas), como nos arquivos reais
+
+COLUNAS = [
+    'competênciamov', 'região', 'uf', 'município', 'seção', 'subclasse', 'saldomovimentação', 'categoria',
+    'cbo2002ocupação', 'graudeinstrução', 'idade', 'horascontratuais', 'raçacor', 'sexo', 'tipoempregador',
+    'tipoestabelecimento', 'tipomovimentação', 'tipodedeficiência', 'indtrabintermitente', 'indtrabparcial',
+    'salário', 'tamestabjan', 'indicadoraprendiz', 'origemdainformação', 'competênciadec',
+    'indicadordeforadoprazo', 'unidadesaláriocódigo', 'valorsaláriofixo',
+]
+
+N_SUBCLASSES = 1300
+N_OCUPACOES = 2600
+
+# Unidades salariais e sua frequência aproximada: 5 mensal, 1 hora, 3 semana, 4 quinzena,
+# 6 tarefa, 7 variável, 99 não identificado
+UNIDADES = ['5', '1', '3', '4', '6', '7', '99']
+PESOS_UNIDADES = [0.90, 0.04, 0.01, 0.01, 0.01, 0.01, 0.02]
+
+# Fração das admissões (saldomovimentação = 1); as demais linhas são desligamentos (-1)
+FRACAO_ADMISSOES = 0.52
+FRACAO_SALARIO_VAZIO = 0.01
+
+LINHAS_POR_LOTE = 100_000
+
+
+# Chaves numéricas de tamanho fixo (7 dígitos para a subclasse CNAE, 6 para a ocupação CBO)
+def _chaves(rng, quantidade, digitos):
+    valores = rng.choice(10 ** digitos - 10 ** (digitos - 1), size=quantidade, replace=False) + 10 ** (digitos - 1)
+    return np.array([str(valor) for valor in valores], dtype=object)
+
+
+# Índices com distribuição de Zipf truncada em `quantidade` chaves
+def _zipf(rng, quantidade, tamanho, expoente=1.1):
+    pesos = 1.0 / np.arange(1, quantidade + 1) ** expoente
+    return rng.choice(quantidade, size=tamanho, p=pesos / pesos.sum())
+
+
+def _decimal(valores):
+    return np.char.replace(np.char.mod('%.2f', valores), '.', ',')
+
+
+# Função para gerar as linhas de um lote
+def _lote(rng, competencia, tamanho, subclasses, ocupacoes):
+    unidade = rng.choice(len(UNIDADES), size=tamanho, p=PESOS_UNIDADES)
+    # Salário mensal log-normal; nas outras unidades o valor é o de uma hora, semana ou quinzena
+    mensal = np.exp(rng.normal(7.6, 0.55, size=tamanho))
+    divisor = np.select([unidade == 1, unidade == 2, unidade == 3], [44 * 4.33, 4.33, 2.0], 1.0)
+    salario = _decimal(mensal / divisor).astype(object)
+    salario[rng.random(tamanho) < FRACAO_SALARIO_VAZIO] = ''
+    horas = np.where(unidade == 1, rng.choice([10, 20, 30, 36, 40, 44], size=tamanho), rng.choice([40, 44], size=tamanho))
+
+    colunas = [
+        np.full(tamanho, competencia, dtype=object),
+        rng.integers(1, 6, size=tamanho).astype(str),
+        rng.integers(11, 54, size=tamanho).astype(str),
+        rng.integers(110000, 530000, size=tamanho).astype(str),
+        np.array(list('ABCDEFGHIJKLMNOPQRSTU'))[rng.integers(0, 21, size=tamanho)],
+        subclasses[_zipf(rng, len(subclasses), tamanho)],
+        np.where(rng.random(tamanho) < FRACAO_ADMISSOES, '1', '-1'),
+        rng.choice(['101', '103', '104', '105', '106', '111'], size=tamanho),
+        ocupacoes[_zipf(rng, len(ocupacoes), tamanho)],
+        rng.integers(1, 12, size=tamanho).astype(str),
+        np.clip(np.round(rng.gamma(6.0, 5.5, size=tamanho) + 14), 14, 90).astype(int).astype(str),
+        _decimal(horas),
+        rng.integers(1, 7, size=tamanho).astype(str),
+        rng.choice(['1', '3'], size=tamanho),
+        rng.choice(['0', '1'], size=tamanho),
+        rng.choice(['1', '3', '5'], size=tamanho),
+        rng.choice(['10', '20', '25', '31', '32', '35', '40', '43', '45', '50', '60', '80', '90', '97', '98'], size=tamanho),
+        rng.choice(['0', '1', '2', '3', '4', '5', '6'], size=tamanho, p=[0.97, 0.005, 0.005, 0.005, 0.005, 0.005, 0.005]),
+        rng.choice(['0', '1'], size=tamanho, p=[0.97, 0.03]),
+        rng.choice(['0', '1'], size=tamanho, p=[0.93, 0.07]),
+        salario,
+        rng.integers(1, 11, size=tamanho).astype(str),
+        rng.choice(['0', '1'], size=tamanho, p=[0.95, 0.05]),
+        rng.choice(['1', '2'], size=tamanho, p=[0.9, 0.1]),
+        np.full(tamanho, competencia, dtype=object),
+        rng.choice(['0', '1'], size=tamanho, p=[0.95, 0.05]),
+        np.array(UNIDADES, dtype=object)[unidade],
+        salario,
+    ]
+    return ''.join(';'.join(campos) + '\n' for campos in zip(*(coluna.tolist() for coluna in colunas)))
+
+
+# Função para gerar um arquivo mensal com `linhas` linhas de dados
+def gerar_arquivo(caminho, competencia, linhas, semente=0):
+    # As chaves dependem só da semente (iguais em todos os meses); as linhas, da semente e do mês
+    rng_chaves = np.random.default_rng(semente)
+    subclasses = _chaves(rng_chaves, N_SUBCLASSES, 7)
+    ocupacoes = _chaves(rng_chaves, N_OCUPACOES, 6)
+    rng = np.random.default_rng([semente, int(competencia)])
+
+    temporario = f'{caminho}.{os.getpid()}.tmp'
+    with open(temporario, mode='w', newline='', encoding='utf-8') as arquivo:
+        arquivo.write(';'.join(COLUNAS) + '\n')
+        for inicio in range(0, linhas, LINHAS_POR_LOTE):
+            arquivo.write(_lote(rng, competencia, min(LINHAS_POR_LOTE, linhas - inicio), subclasses, ocupacoes))
+    os.replace(temporario, caminho)
+
+
+# Competências mensais consecutivas (AAAAMM) a partir de janeiro de `ano`
+def competencias(meses, ano=2021):
+    return [f'{ano + mes // 12}{mes % 12 + 1:02d}' for mes in range(meses)]
+
+
+# Função para gerar um conjunto de arquivos em destino/CAGEDMOV_downloads, com um resumo em dados.json.
+# Se o resumo indicar os mesmos parâmetros, os arquivos existentes são reaproveitados
+def gerar_conjunto(destino, meses, linhas_por_mes, semente=0):
+    pasta = os.path.join(destino, 'CAGEDMOV_downloads')
+    caminho_resumo = os.path.join(destino, 'dados.json')
+    parametros = {'meses': meses, 'linhas_por_mes': linhas_por_mes, 'semente': semente}
+    try:
+        with open(caminho_resumo, encoding='utf-8') as f:
+            resumo = json.load(f)
+        if resumo['parametros'] == parametros and all(os.path.exists(os.path.join(pasta, nome)) for nome in resumo['arquivos']):
+            return resumo
+    except (OSError, ValueError, KeyError):
+        pass
+
+    os.makedirs(pasta, exist_ok=True)
+    arquivos = []
+    for competencia in competencias(meses):
+        nome = f'CAGEDMOV{competencia}.txt'
+        gerar_arquivo(os.path.join(pasta, nome), competencia, linhas_por_mes, semente)
+        arquivos.append(nome)
+    resumo = {
+        'parametros': parametros,
+        'arquivos': arquivos,
+        'linhas': meses * linhas_por_mes,
+        'bytes': sum(os.path.getsize(os.path.join(pasta, nome)) for nome in arquivos),
+    }
+    with open(caminho_resumo, mode='w', encoding='utf-8') as f:
+        json.dump(resumo, f, indent=1)
+    return resumo
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gera arquivos CAGEDMOV sintéticos (determinísticos) para benchmarks')
+    parser.add_argument('destino', help='diretório onde será criada a pasta CAGEDMOV_downloads')
+    parser.add_argument('--meses', type=int, default=3)
+    parser.add_argument('--linhas-por-mes', type=int, default=1_000_000)
+    parser.add_argument('--semente', type=int, default=0)
+    args = parser.parse_args()
+
+    resumo = gerar_conjunto(args.destino, args.meses, args.linhas_por_mes, args.semente)
+    print(f"{len(resumo['arquivos'])} arquivos, {resumo['linhas']} linhas, {resumo['bytes'] / (1024 * 1024):.1f} MB")
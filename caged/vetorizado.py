@@ -0,0 +1,463 @@
+import contextlib
+import os
+
+import numpy as np
+
+from caged.cubo import Cubo
+from caged.estatisticas import AgregadoParcial, Estatistica, EstatisticasChave
+from caged.fatias import TAMANHO_BLOCO, fatia_inteira, ler_blocos
+from caged.nucleo import format_string
+from caged.perfil import MOTIVOS_REJEICAO, Perfil
+from caged.quantis import INDICE_MINIMO, LOG_GAMMA, N_BUCKETS, VALOR_MAXIMO, VALOR_MINIMO, EsbocoQuantis
+from caged.regras import como_regras
+
+# Motor colunar: lê o arquivo em blocos grandes de bytes, delimita apenas as sete colunas
+# necessárias com NumPy e aplica as mesmas regras do laço linha a linha como máscaras vetorizadas
+
+COLUNAS_NECESSARIAS = ['subclasse', 'cbo2002ocupação', 'salário', 'idade', 'saldomovimentação', 'unidadesaláriocódigo', 'horascontratuais']
+
+# Estados da conversão numérica de um campo
+OK = 0
+VAZIO = 1
+ERRO = 2
+
+# Campos com mais dígitos que isso vão para a conversão do Python, para manter o arredondamento exato
+_MAX_DIGITOS = 15
+
+_NOVA_LINHA = ord('\n')
+_RETORNO = ord('\r')
+_SEPARADOR = ord(';')
+_VIRGULA = ord(',')
+_PONTO = ord('.')
+_MENOS = ord('-')
+_ZERO = ord('0')
+_NOVE = ord('9')
+
+
+# Posições de separadores com índice possivelmente fora do vetor (o resultado só é usado onde a máscara permite)
+def _separador(separadores, indices):
+    if len(separadores) == 0:
+        return np.zeros(len(indices), dtype=np.int64)
+    return separadores[np.minimum(indices, len(separadores) - 1)]
+
+
+# Função para delimitar início e fim de cada coluna pedida em todas as linhas do bloco
+def delimitar_campos(dados, indices_colunas):
+    arr = np.frombuffer(dados, dtype=np.uint8)
+    fins = np.flatnonzero(arr == _NOVA_LINHA)
+    inicios = np.empty_like(fins)
+    if len(fins):
+        inicios[0] = 0
+        inicios[1:] = fins[:-1] + 1
+
+    # Remove o '\r' final e descarta linhas em branco, como o csv.DictReader
+    com_retorno = (fins > inicios) & (arr[np.maximum(fins - 1, 0)] == _RETORNO)
+    fins = fins - com_retorno
+    nao_vazias = fins > inicios
+    inicios = inicios[nao_vazias]
+    fins = fins[nao_vazias]
+
+    separadores = np.flatnonzero(arr == _SEPARADOR)
+    primeiro = np.searchsorted(separadores, inicios)
+    n_separadores = np.searchsorted(separadores, fins) - primeiro
+
+    campos = {}
+    for nome, j in indices_colunas.items():
+        presente = n_separadores >= j
+        if j == 0:
+            inicio = inicios.copy()
+        else:
+            inicio = _separador(separadores, primeiro + j - 1) + 1
+        fim = np.where(n_separadores > j, _separador(separadores, primeiro + j), fins)
+        inicio[~presente] = 0
+        fim[~presente] = 0
+        campos[nome] = (inicio, fim, presente)
+    return arr, campos
+
+
+# Matriz (linhas x largura) com os bytes de cada campo, preenchida com zeros após o fim
+def _matriz_bytes(arr, inicio, fim, largura):
+    deslocamentos = np.arange(largura)
+    dentro = deslocamentos < (fim - inicio)[:, None]
+    posicoes = np.minimum(inicio[:, None] + deslocamentos, max(len(arr) - 1, 0))
+    matriz = arr[posicoes]
+    matriz[~dentro] = 0
+    return matriz, dentro
+
+
+def _texto(arr, inicio, fim):
+    return arr[inicio:fim].tobytes().decode('utf-8', errors='replace')
+
+
+# Texto da linha do bloco que contém a posição (só para as amostras de erros)
+def _linha_texto(arr, posicao):
+    inicio = posicao
+    while inicio > 0 and arr[inicio - 1] != _NOVA_LINHA:
+        inicio -= 1
+    fim = posicao
+    while fim < len(arr) and arr[fim] != _NOVA_LINHA and arr[fim] != _RETORNO:
+        fim += 1
+    return _texto(arr, inicio, fim)
+
+
+# Conversões do Python usadas como referência nos campos fora do formato simples
+def _converter_decimal_python(texto):
+    try:
+        return float(texto.replace(',', '.')), OK
+    except ValueError:
+        return 0.0, ERRO
+
+
+def _converter_inteiro_python(texto):
+    texto = texto.strip()
+    if texto == '':
+        return 0.0, VAZIO
+    try:
+        return float(int(texto)), OK
+    except ValueError:
+        return 0.0, ERRO
+
+
+# Função para converter campos numéricos em lote.
+# O caminho rápido cobre o formato do CAGED ('-'?, dígitos, um separador decimal opcional);
+# qualquer outro texto não vazio é convertido pela regra do Python, linha a linha
+def converter_numeros(arr, inicio, fim, decimal=True):
+    n = len(inicio)
+    valores = np.zeros(n, dtype=np.float64)
+    estados = np.full(n, OK, dtype=np.int8)
+    comprimentos = fim - inicio
+    vazios = comprimentos == 0
+    if decimal:
+        estados[vazios] = VAZIO
+
+    largura = int(min(comprimentos.max(initial=0), _MAX_DIGITOS + 2))
+    simples = ~vazios & (comprimentos <= largura)
+    if largura > 0:
+        matriz, dentro = _matriz_bytes(arr, inicio, np.minimum(fim, inicio + largura), largura)
+        digitos = dentro & (matriz >= _ZERO) & (matriz <= _NOVE)
+        if decimal:
+            separadores = dentro & ((matriz == _VIRGULA) | (matriz == _PONTO))
+        else:
+            separadores = np.zeros_like(digitos)
+        negativo = matriz[:, 0] == _MENOS
+        outros = dentro & ~digitos & ~separadores
+        outros[:, 0] &= ~negativo
+        n_digitos = digitos.sum(axis=1)
+        simples &= ~outros.any(axis=1) & (separadores.sum(axis=1) <= 1) & (n_digitos >= 1) & (n_digitos <= _MAX_DIGITOS)
+
+        # Cada dígito vale 10 elevado ao número de dígitos à sua direita
+        a_direita = n_digitos[:, None] - np.cumsum(digitos, axis=1)
+        potencias = np.where(digitos, np.power(10, a_direita, dtype=np.int64), 0)
+        mantissa = (potencias * np.where(digitos, matriz - _ZERO, 0)).sum(axis=1)
+        decimais = np.where(separadores.any(axis=1), (digitos & (np.cumsum(separadores, axis=1) > 0)).sum(axis=1), 0)
+        # mantissa < 2**53 e 10**decimais exato: a divisão dá o mesmo arredondamento de float()
+        convertidos = mantissa.astype(np.float64) / np.power(10.0, decimais)
+        convertidos[negativo] = -convertidos[negativo]
+        valores[simples] = convertidos[simples]
+
+    conversor = _converter_decimal_python if decimal else _converter_inteiro_python
+    restantes = ~simples if not decimal else ~simples & ~vazios
+    for i in np.flatnonzero(restantes):
+        valores[i], estados[i] = conversor(_texto(arr, inicio[i], fim[i]))
+    return valores, estados
+
+
+# Código de unidade salarial, comparado como texto exato ('5' é válido, '05' ou ' 5' não)
+def _codigos_unidade(arr, inicio, fim):
+    comprimentos = fim - inicio
+    matriz, dentro = _matriz_bytes(arr, inicio, np.minimum(fim, inicio + 2), 2)
+    digitos = dentro & (matriz >= _ZERO) & (matriz <= _NOVE)
+    valores = np.where(comprimentos == 1, matriz[:, 0].astype(np.int64) - _ZERO, (matriz[:, 0].astype(np.int64) - _ZERO) * 10 + matriz[:, 1] - _ZERO)
+    validos = ((comprimentos == 1) & digitos[:, 0]) | ((comprimentos == 2) & digitos.all(axis=1) & (matriz[:, 0] != _ZERO))
+    return np.where(validos, valores, -1)
+
+
+# Tabela idade -> índice da faixa etária (-1 fora das faixas), compilada pelas regras
+def tabela_faixas(faixas_etarias):
+    return como_regras(faixas_etarias).tabela_faixas
+
+
+# Função para extrair as colunas tipadas das linhas de admissão de um bloco.
+# Campos faltando viram None no csv.DictReader e geram erro quando o laço linha a linha os usa;
+# aqui isso é registrado no estado do campo
+def extrair_colunas(arr, campos):
+    ini_saldo, fim_saldo, presente_saldo = campos['saldomovimentação']
+    admissao = presente_saldo & (fim_saldo - ini_saldo == 1) & (arr[np.minimum(ini_saldo, max(len(arr) - 1, 0))] == ord('1'))
+    linhas = np.flatnonzero(admissao)
+
+    def campo(nome):
+        inicio, fim, presente = campos[nome]
+        return inicio[linhas], fim[linhas], presente[linhas]
+
+    inicio, fim, presente = campo('salário')
+    salario, estado_salario = converter_numeros(arr, inicio, fim)
+    completo = presente & campos['subclasse'][2][linhas] & campos['cbo2002ocupação'][2][linhas]
+    estado_salario[~completo] = ERRO
+
+    inicio, fim, _ = campo('unidadesaláriocódigo')
+    unidade = _codigos_unidade(arr, inicio, fim)
+
+    inicio, fim, presente = campo('horascontratuais')
+    horas, estado_horas = converter_numeros(arr, inicio, fim)
+    estado_horas[~presente] = ERRO
+
+    inicio, fim, presente = campo('idade')
+    idade, estado_idade = converter_numeros(arr, inicio, fim, decimal=False)
+    estado_idade[~presente] = ERRO
+
+    return {
+        'linhas': linhas,
+        'salario': salario,
+        'estado_salario': estado_salario,
+        'unidade': unidade,
+        'horas': horas,
+        'estado_horas': estado_horas,
+        'idade': idade,
+        'estado_idade': estado_idade,
+    }
+
+
+# Função para aplicar as regras compiladas (caged.regras) de unidade salarial, faixa salarial e faixa
+# etária às colunas tipadas, como consultas às tabelas das regras e máscaras sobre o bloco inteiro.
+# Um campo só conta como erro se o laço linha a linha chegaria a convertê-lo.
+# Devolve os índices aceitos, o salário normalizado, a idade, a faixa e os índices das linhas com erro.
+# Se `rejeicoes` for um dicionário, soma nele as linhas rejeitadas por motivo (os mesmos do laço)
+def aplicar_regras(colunas, regras, rejeicoes=None):
+    estado_salario = colunas['estado_salario']
+    com_erro = estado_salario == ERRO
+    manter = estado_salario == OK
+    if rejeicoes is not None:
+        rejeicoes['salario_ausente'] += int((estado_salario == VAZIO).sum())
+        antes = int(manter.sum())
+
+    # Multiplicador de cada linha pela tabela das regras (NaN: unidade rejeitada ou código inválido)
+    unidade = colunas['unidade']
+    codigo_valido = unidade >= 0
+    multiplicador = np.where(codigo_valido, regras.tabela_multiplicadores[np.where(codigo_valido, unidade, 0)], np.nan)
+    aceita = ~np.isnan(multiplicador)
+    manter &= aceita
+    if rejeicoes is not None:
+        rejeicoes['unidade'] += antes - int(manter.sum())
+    salario_bruto = colunas['salario']
+    salario = salario_bruto * np.where(aceita, multiplicador, 1.0)
+
+    por_hora = manter & codigo_valido & regras.tabela_por_hora[np.where(codigo_valido, unidade, 0)]
+    if por_hora.any():
+        horas = colunas['horas'][por_hora]
+        estado_horas = colunas['estado_horas'][por_hora]
+        # int(float(...)) falha para 'inf' e 'nan'
+        nao_finitas = (estado_horas == OK) & ~np.isfinite(horas)
+        erros_horas = (estado_horas == ERRO) | nao_finitas
+        com_erro[por_hora] = erros_horas
+        erros_horas = int(erros_horas.sum())
+        horas = np.trunc(horas)
+        validas = (estado_horas == OK) & ~nao_finitas & (horas >= regras.horas_minimas)
+        salario[por_hora] = salario_bruto[por_hora] * (np.where(validas, horas, 0) * multiplicador[por_hora])
+        manter[por_hora] = validas
+        if rejeicoes is not None:
+            rejeicoes['erro'] += erros_horas
+            rejeicoes['horas'] += int((~validas).sum()) - erros_horas
+
+    # Mesma comparação do laço linha a linha (um NaN não é rejeitado por ela)
+    if rejeicoes is not None:
+        antes = int(manter.sum())
+    manter &= ~((salario < regras.salario_minimo) | (salario > regras.salario_maximo))
+
+    estado_idade = colunas['estado_idade']
+    erros_idade = manter & (estado_idade == ERRO)
+    com_erro |= erros_idade
+    erros_idade = int(erros_idade.sum())
+    idade = colunas['idade']
+    faixa = regras.faixas(idade)
+    if rejeicoes is not None:
+        rejeicoes['faixa_salarial'] += antes - int(manter.sum())
+        antes = int(manter.sum())
+    manter &= (estado_idade == OK) & (faixa >= 0)
+
+    aceitas = np.flatnonzero(manter)
+    if rejeicoes is not None:
+        rejeicoes['erro'] += int((estado_salario == ERRO).sum()) + erros_idade
+        rejeicoes['idade'] += antes - len(aceitas) - erros_idade
+    return aceitas, salario[aceitas], idade[aceitas], faixa[aceitas], np.flatnonzero(com_erro)
+
+
+# Função para agrupar por chave (bytes do campo) preservando a ordem da primeira ocorrência
+def _codificar_chaves(arr, inicio, fim):
+    largura = int(max((fim - inicio).max(initial=0), 1))
+    matriz, _ = _matriz_bytes(arr, inicio, fim, largura)
+    brutas = np.ascontiguousarray(matriz).view(f'S{largura}').ravel()
+    unicas, primeiras, codigos = np.unique(brutas, return_index=True, return_inverse=True)
+    ordem = np.argsort(primeiras, kind='stable')
+    posicao = np.empty_like(ordem)
+    posicao[ordem] = np.arange(len(ordem))
+    chaves = [unicas[i].decode('utf-8', errors='replace').strip() for i in ordem]
+    return chaves, posicao[codigos.ravel()]
+
+
+def _estatisticas_por_codigo(codigos, valores, n_codigos):
+    n = np.bincount(codigos, minlength=n_codigos)
+    soma = np.bincount(codigos, weights=valores, minlength=n_codigos)
+    soma_quadrados = np.bincount(codigos, weights=valores * valores, minlength=n_codigos)
+    minimo = np.full(n_codigos, np.inf)
+    maximo = np.full(n_codigos, -np.inf)
+    np.minimum.at(minimo, codigos, valores)
+    np.maximum.at(maximo, codigos, valores)
+    return n, soma, soma_quadrados, minimo, maximo
+
+
+def _estatistica(colunas, i):
+    n, soma, soma_quadrados, minimo, maximo = colunas
+    return Estatistica(int(n[i]), float(soma[i]), float(soma_quadrados[i]), float(minimo[i]), float(maximo[i]))
+
+
+# Buckets do esboço de quantis em lote (mesma conta de quantis.indice_bucket)
+def _buckets(valores):
+    indices = np.ceil(np.log(np.clip(valores, VALOR_MINIMO, VALOR_MAXIMO)) / LOG_GAMMA).astype(np.int64) - INDICE_MINIMO
+    return np.clip(indices, 0, N_BUCKETS - 1)
+
+
+# Contagens (código, bucket) não vazias, ordenadas por código, e o início das de cada código.
+# NaN fica de fora, como em EsbocoQuantis.adicionar
+def _esbocos_por_codigo(codigos, valores, n_codigos):
+    validos = ~np.isnan(valores)
+    pares, contagens = np.unique(codigos[validos] * N_BUCKETS + _buckets(valores[validos]), return_counts=True)
+    limites = np.searchsorted(pares, np.arange(n_codigos + 1) * N_BUCKETS)
+    return pares % N_BUCKETS, contagens, limites
+
+
+def _esboco(esbocos, i):
+    buckets, contagens, limites = esbocos
+    inicio, fim = limites[i], limites[i + 1]
+    return EsbocoQuantis(dict(zip(buckets[inicio:fim].tolist(), contagens[inicio:fim].tolist())))
+
+
+# Função para acumular as linhas aceitas de um bloco no dicionário de uma dimensão
+# (com quantis=True, também os esboços de quantis do salário, no geral e por faixa)
+def acumular_dimensao(destino, chaves, codigos, salario, idade, faixa, nomes_faixas, quantis=False):
+    n_chaves = len(chaves)
+    n_faixas = len(nomes_faixas)
+    colunas_salario = _estatisticas_por_codigo(codigos, salario, n_chaves)
+    colunas_idade = _estatisticas_por_codigo(codigos, idade, n_chaves)
+    colunas_faixa = _estatisticas_por_codigo(codigos * n_faixas + faixa, salario, n_chaves * n_faixas)
+    if quantis:
+        esbocos_salario = _esbocos_por_codigo(codigos, salario, n_chaves)
+        esbocos_faixa = _esbocos_por_codigo(codigos * n_faixas + faixa, salario, n_chaves * n_faixas)
+
+    for i, chave in enumerate(chaves):
+        if not colunas_salario[0][i]:
+            continue
+        estatisticas = EstatisticasChave()
+        estatisticas.salario = _estatistica(colunas_salario, i)
+        estatisticas.idade = _estatistica(colunas_idade, i)
+        for f, nome in enumerate(nomes_faixas):
+            if colunas_faixa[0][i * n_faixas + f]:
+                estatisticas.faixas[nome] = _estatistica(colunas_faixa, i * n_faixas + f)
+        if quantis:
+            estatisticas.quantis = _esboco(esbocos_salario, i)
+            for f, nome in enumerate(nomes_faixas):
+                if colunas_faixa[0][i * n_faixas + f]:
+                    estatisticas.quantis_faixas[nome] = _esboco(esbocos_faixa, i * n_faixas + f)
+        if chave in destino:
+            destino[chave].combinar(estatisticas)
+        else:
+            destino[chave] = estatisticas
+
+
+# Função para acumular as linhas aceitas de um bloco num cubo: códigos das cinco dimensões por linha
+def acumular_cubo(cubo, arr, campos, linhas, salario, idade, faixa, nomes_faixas, mes):
+    codigos = np.empty((len(linhas), 5), dtype=np.int64)
+    codigos[:, 0] = cubo.codificar('mes', [mes])[0]
+    for d, dimensao, nome in ((1, 'subclasse', 'subclasse'), (2, 'cbo', 'cbo2002ocupação'), (4, 'uf', 'uf')):
+        if nome not in campos:
+            codigos[:, d] = cubo.codificar(dimensao, [''])[0]
+            continue
+        inicio, fim, _ = campos[nome]
+        chaves, codigos_chaves = _codificar_chaves(arr, inicio[linhas], fim[linhas])
+        codigos[:, d] = cubo.codificar(dimensao, chaves)[codigos_chaves]
+    codigos[:, 3] = cubo.codificar('faixa', nomes_faixas)[faixa]
+    cubo.adicionar_linhas(codigos, salario, idade)
+
+
+# Função para agregar um bloco de bytes no agregado ou no cubo do mês `mes` (retorna o número de linhas com erro).
+# Com `erros`, as linhas com erro são contadas nele para `nome_arquivo`, com o texto das primeiras como amostra
+def agregar_bloco(agregado, dados, indices_colunas, regras, nomes_faixas, perfil=None, mes=None, erros=None,
+                  nome_arquivo=''):
+    if perfil is None:
+        perfil = Perfil()
+    with perfil.etapa('parse'), np.errstate(invalid='ignore', over='ignore'):
+        arr, campos = delimitar_campos(dados, indices_colunas)
+        colunas = extrair_colunas(arr, campos)
+    rejeicoes = dict.fromkeys(MOTIVOS_REJEICAO, 0)
+    with perfil.etapa('filtro'), np.errstate(invalid='ignore', over='ignore'):
+        aceitas, salario, idade, faixa, com_erro = aplicar_regras(colunas, regras, rejeicoes)
+    lidas = len(campos['saldomovimentação'][0])
+    rejeicoes['desligamento'] = lidas - len(colunas['linhas'])
+    perfil.registrar_linhas(lidas, len(aceitas), rejeicoes)
+    if len(com_erro) and erros is not None:
+        inicios = campos['saldomovimentação'][0]
+        amostras = [_linha_texto(arr, inicios[linha])
+                    for linha in colunas['linhas'][com_erro[:erros.faltam_amostras(nome_arquivo, 'linha')]].tolist()]
+        erros.registrar(nome_arquivo, 'linha', len(com_erro), amostras)
+
+    linhas = colunas['linhas'][aceitas]
+    if len(linhas) and isinstance(agregado, Cubo):
+        with perfil.etapa('agregacao'), np.errstate(invalid='ignore', over='ignore'):
+            acumular_cubo(agregado, arr, campos, linhas, salario, idade, faixa, nomes_faixas, mes)
+    elif len(linhas):
+        with perfil.etapa('agregacao'):
+            for nome, destino in (('subclasse', agregado.subclasses), ('cbo2002ocupação', agregado.ocupacoes)):
+                inicio, fim, _ = campos[nome]
+                chaves, codigos = _codificar_chaves(arr, inicio[linhas], fim[linhas])
+                with np.errstate(invalid='ignore', over='ignore'):
+                    acumular_dimensao(destino, chaves, codigos, salario, idade, faixa, nomes_faixas, agregado.quantis)
+    return len(com_erro)
+
+
+# Função para processar uma fatia (faixa de bytes de um arquivo) com o motor vetorizado
+# (com cubo=True, devolve o cubo da fatia em vez do agregado)
+def processar_fatia_vetorizado(fatia, regras, erros, tamanho_bloco=TAMANHO_BLOCO, perfil=None, quantis=False,
+                               cubo=False):
+    nome_arquivo = os.path.basename(fatia.caminho)
+    if not all(field in fatia.colunas for field in COLUNAS_NECESSARIAS):
+        erros.registrar(nome_arquivo, 'colunas')
+        return None
+    indices_colunas = {nome: fatia.colunas.index(nome) for nome in COLUNAS_NECESSARIAS}
+    regras = como_regras(regras)
+    nomes_faixas = regras.nomes_faixas
+    mes = None
+    if cubo:
+        # A UF só é delimitada no modo cubo; arquivos sem a coluna ficam com UF vazia
+        if 'uf' in fatia.colunas:
+            indices_colunas['uf'] = fatia.colunas.index('uf')
+        mes = format_string(nome_arquivo)
+        agregado = Cubo()
+    else:
+        agregado = AgregadoParcial(quantis)
+    if perfil is None:
+        perfil = Perfil()
+    try:
+        blocos = ler_blocos(fatia, tamanho_bloco)
+        with contextlib.closing(blocos):
+            while True:
+                with perfil.etapa('leitura'):
+                    dados = next(blocos, None)
+                if dados is None:
+                    break
+                agregar_bloco(agregado, dados, indices_colunas, regras, nomes_faixas, perfil, mes, erros,
+                              nome_arquivo)
+        return agregado
+
+    except Exception as e:
+        erros.registrar(nome_arquivo, 'abertura', amostras=[str(e)])
+        return None
+
+
+# Função para processar um arquivo inteiro com o motor vetorizado
+def processar_arquivo_vetorizado(csv_file_path, regras, erros, tamanho_bloco=TAMANHO_BLOCO, perfil=None,
+                                 quantis=False):
+    try:
+        fatia = fatia_inteira(csv_file_path)
+    except Exception as e:
+        erros.registrar(os.path.basename(csv_file_path), 'abertura', amostras=[str(e)])
+        return None
+    return processar_fatia_vetorizado(fatia, regras, erros, tamanho_bloco, perfil, quantis)
@@ -0,0 +1,13 @@
+from caged.execucao import Configuracao, criar_parser, executar
+
+# Médias salariais e de idade do CAGEDMOV por subclasse, ocupação e data num pool de processos
+# (concurrent.futures): cada processo escreve o parcial da sua fatia em memória compartilhada
+# (caged.compartilhado) e o processo principal combina os parciais de cada mês sem serializá-los.
+# O núcleo de agregação e a escrita das saídas ficam no pacote caged, compartilhados com MPI e Dask
+
+# Função principal do programa
+if __name__ == '__main__':
+    parser = criar_parser('Médias salariais e de idade do CAGEDMOV por subclasse, ocupação e data '
+                          '(pool de processos com memória compartilhada)', backend='pool')
+    args = parser.parse_args()
+    executar(Configuracao.de_argumentos(args))
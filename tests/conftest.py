@@ -0,0 +1,108 @@
+import csv
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from caged.sintetico import COLUNAS, gerar_conjunto
+
+# Dados sintéticos (caged.sintetico) e execução de caged.execucao como na linha de comando, compartilhados
+# pelos testes
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAIDAS = ('subclasse_output.csv', 'ocupacoes_output.csv')
+COLUNAS_EXATAS = ('id', 'cnae', 'ocupacao')
+
+# Uma unidade na última casa decimal das saídas (médias com duas casas)
+TOLERANCIA = 0.0101
+
+
+@pytest.fixture(scope='session')
+def dados(tmp_path_factory):
+    destino = tmp_path_factory.mktemp('caged')
+    gerar_conjunto(str(destino), meses=2, linhas_por_mes=30_000, semente=7)
+    return destino
+
+
+def ambiente():
+    variaveis = dict(os.environ)
+    variaveis['PYTHONPATH'] = os.pathsep.join(filter(None, [RAIZ, variaveis.get('PYTHONPATH')]))
+    return variaveis
+
+
+def ler_csv(caminho):
+    with open(caminho, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f, delimiter=';'))
+
+
+def ler_saidas(diretorio):
+    return {nome: ler_csv(os.path.join(diretorio, 'output_caged', nome)) for nome in SAIDAS}
+
+
+# Compara linhas de saída: chaves e textos exatos; médias a menos do arredondamento de ponto flutuante
+# (a ordem das somas muda com o número e o tamanho das fatias e com o escalonamento)
+def comparar_linhas(linhas, esperadas, nome=''):
+    assert len(linhas) == len(esperadas), nome
+    assert len(linhas) > 0, nome
+    for linha, esperada in zip(linhas, esperadas):
+        assert linha.keys() == esperada.keys()
+        for coluna, valor in esperada.items():
+            try:
+                numero = float(valor)
+            except ValueError:
+                assert linha[coluna] == valor, (nome, coluna)
+                continue
+            if coluna in COLUNAS_EXATAS:
+                assert linha[coluna] == valor, (nome, coluna)
+            else:
+                assert float(linha[coluna]) == pytest.approx(numero, abs=TOLERANCIA), (nome, linha['id'], coluna)
+
+
+# Executa caged.execucao no diretório dos dados (com `prefixo`, ex.: mpirun), sem as saídas anteriores.
+# Devolve o processo concluído (saída padrão em stdout)
+def executar(diretorio, *opcoes, prefixo=(), limpar=True):
+    if limpar:
+        shutil.rmtree(os.path.join(diretorio, 'output_caged'), ignore_errors=True)
+    return subprocess.run([*prefixo, sys.executable, '-m', 'caged.execucao', *opcoes], cwd=diretorio, env=ambiente(),
+                          check=True, capture_output=True, text=True)
+
+
+# Prefixo do mpirun com `processos` processos (o teste é pulado sem mpirun ou mpi4py)
+def prefixo_mpi(processos):
+    mpirun = shutil.which('mpirun')
+    if mpirun is None:
+        pytest.skip('mpirun não encontrado')
+    pytest.importorskip('mpi4py')
+    versao = subprocess.run([mpirun, '--version'], capture_output=True, text=True).stdout
+    prefixo = [mpirun, '-n', str(processos)]
+    if 'Open MPI' in versao:
+        prefixo += ['--oversubscribe'] + (['--allow-run-as-root'] if os.geteuid() == 0 else [])
+    return prefixo
+
+
+# Compara dois agregados (caged.estatisticas.AgregadoParcial): mesmas chaves e contagens; somas, mínimos
+# e máximos a menos da ordem das somas
+def comparar_agregados(agregado, esperado):
+    for nome in ('subclasses', 'ocupacoes'):
+        chaves, esperadas = getattr(agregado, nome), getattr(esperado, nome)
+        assert chaves.keys() == esperadas.keys(), nome
+        for chave, estatisticas in esperadas.items():
+            obtidas = chaves[chave]
+            assert obtidas.faixas.keys() == estatisticas.faixas.keys(), (nome, chave)
+            pares = [(obtidas.salario, estatisticas.salario), (obtidas.idade, estatisticas.idade),
+                     *((obtidas.faixas[faixa], estatistica) for faixa, estatistica in estatisticas.faixas.items())]
+            for obtida, estatistica in pares:
+                assert obtida.n == estatistica.n, (nome, chave)
+                assert (obtida.soma, obtida.minimo, obtida.maximo) == pytest.approx(
+                    (estatistica.soma, estatistica.minimo, estatistica.maximo)), (nome, chave)
+
+
+# Uma linha de dados CAGEDMOV (uma admissão mensal válida), com os campos de `valores` trocados
+def linha_cagedmov(**valores):
+    campos = {coluna: '1' for coluna in COLUNAS}
+    campos.update({'subclasse': '4711302', 'cbo2002ocupação': '521110', 'idade': '30', 'salário': '1500,00',
+                   'unidadesaláriocódigo': '5', 'horascontratuais': '44,00'})
+    campos.update(valores)
+    return ';'.join(campos[coluna] for coluna in COLUNAS)
@@ -0,0 +1,119 @@
+import math
+
+import pytest
+
+from caged.amostragem import AmostraMes, EstimativaRazao, sortear_blocos
+from caged.estatisticas import Estatistica
+from caged.execucao import Configuracao
+from caged.fatias import dividir_arquivo
+from conftest import TOLERANCIA, comparar_linhas, executar, ler_saidas
+
+# Modo aproximado (caged.amostragem): com todos os blocos, as médias são as exatas e os intervalos têm
+# largura zero; com uma fração, os intervalos cobrem as médias exatas na maior parte das chaves, a mesma
+# semente dá as mesmas saídas e as médias vistas em um único bloco ficam sem intervalo
+
+
+def _estatistica(valores):
+    estatistica = Estatistica()
+    for valor in valores:
+        estatistica.adicionar(valor)
+    return estatistica
+
+
+def test_intervalo_da_razao():
+    blocos = [[1000.0, 2000.0], [1500.0], [3000.0, 2500.0, 2000.0]]
+    todas = _estatistica([valor for bloco in blocos for valor in bloco])
+
+    # Um único bloco: sem variância entre blocos, o intervalo fica indefinido
+    estimativa = EstimativaRazao()
+    estimativa.adicionar_bloco(_estatistica(blocos[0]))
+    assert estimativa.intervalo(_estatistica(blocos[0]), 3, 10) == (-math.inf, math.inf, 0.0)
+
+    for bloco in blocos[1:]:
+        estimativa.adicionar_bloco(_estatistica(bloco))
+    inferior, superior, n_efetivo = estimativa.intervalo(todas, 3, 10)
+    assert inferior < todas.media() < superior
+    assert superior - todas.media() == pytest.approx(todas.media() - inferior)
+    assert n_efetivo > 0
+    # Todos os blocos do mês lidos: a média exata, com largura zero
+    assert estimativa.intervalo(todas, 3, 3) == (todas.media(), todas.media(), float(todas.n))
+
+
+def test_sorteio_dos_blocos(dados):
+    caminhos = sorted(str(caminho) for caminho in (dados / 'CAGEDMOV_downloads').iterdir())
+    blocos = [bloco for caminho in caminhos for bloco in dividir_arquivo(caminho, 64 * 1024)]
+    sorteio = sortear_blocos(blocos, semente=1)
+    assert sorted(sorteio) == ['2021-01-01', '2021-02-01']
+    # Cada mês é um estrato com todos os seus blocos; a ordem só depende da semente
+    assert sum(len(blocos_mes) for blocos_mes in sorteio.values()) == len(blocos)
+    assert all({bloco.nome for bloco in blocos_mes} == {f'CAGEDMOV{data[:4]}{data[5:7]}.txt'}
+               for data, blocos_mes in sorteio.items())
+    assert sortear_blocos(list(reversed(blocos)), semente=1) == sorteio
+    assert sortear_blocos(blocos, semente=2) != sorteio
+
+    amostra = AmostraMes(sorteio['2021-01-01'])
+    assert len(amostra.proximos(0.01)) == 2
+
+
+@pytest.mark.parametrize('opcoes, mensagem', [
+    ({'amostragem': 0}, 'entre 0'),
+    ({'amostragem': 1.5}, 'entre 0'),
+    ({'erro_alvo': 0.05}, 'use com --amostragem'),
+    ({'amostragem': 0.1, 'cubo': True}, 'saídas únicas'),
+    ({'amostragem': 0.1, 'diretorio_cache': 'cache'}, 'saídas únicas'),
+])
+def test_opcoes_invalidas(opcoes, mensagem):
+    with pytest.raises(ValueError, match=mensagem):
+        Configuracao(**opcoes)
+
+
+@pytest.fixture(scope='module')
+def referencia(dados):
+    executar(dados, '--backend', 'sequencial')
+    return ler_saidas(dados)
+
+
+def test_amostra_completa_e_exata(dados, referencia):
+    executar(dados, '--backend', 'sequencial', '--amostragem', '1', '--bloco-amostra', '64')
+    for nome, linhas in ler_saidas(dados).items():
+        assert len(linhas) == len(referencia[nome])
+        for linha, esperada in zip(linhas, referencia[nome]):
+            media = float(esperada['media_salarial_geral'])
+            assert float(linha['media_salarial_geral']) == pytest.approx(media, abs=TOLERANCIA)
+            assert linha['media_salarial_geral_ic_inf'] == linha['media_salarial_geral_ic_sup'] == linha['media_salarial_geral']
+            assert linha['fracao_blocos'] == '1.0000'
+
+
+def test_amostra_parcial(dados, referencia):
+    opcoes = ('--amostragem', '0.3', '--bloco-amostra', '64', '--semente', '5')
+    executar(dados, '--backend', 'sequencial', *opcoes)
+    saidas = ler_saidas(dados)
+    # A mesma semente sorteia os mesmos blocos no pool (as médias só mudam pela ordem das somas)
+    executar(dados, '--backend', 'pool', '--trabalhadores', '2', *opcoes)
+    for nome, linhas in ler_saidas(dados).items():
+        comparar_linhas(linhas, saidas[nome], nome)
+
+    exatas = {(linha['cnae'], linha['date']): float(linha['media_salarial_geral'])
+              for linha in referencia['subclasse_output.csv']}
+    linhas = saidas['subclasse_output.csv']
+    assert 0 < len(linhas) <= len(exatas)
+    assert all(0 < float(linha['fracao_blocos']) < 1 for linha in linhas)
+    com_intervalo = [linha for linha in linhas if linha['media_salarial_geral_ic_inf']]
+    sem_intervalo = [linha for linha in linhas if not linha['media_salarial_geral_ic_inf']]
+    # Chaves raras aparecem em um único bloco sorteado: intervalo em branco e tamanho efetivo 0
+    assert sem_intervalo and all(linha['media_salarial_geral_n_efetivo'] == '0.0' for linha in sem_intervalo)
+    # Intervalos de 95%: com amostras efetivas razoáveis, a grande maioria cobre a média exata (com só 15
+    # blocos sorteados por mês a variância entre blocos é incerta, daí a folga; a semente fixa a amostra)
+    avaliadas = [linha for linha in com_intervalo if float(linha['media_salarial_geral_n_efetivo']) >= 30]
+    cobertas = sum(float(linha['media_salarial_geral_ic_inf']) - TOLERANCIA <= exatas[(linha['cnae'], linha['date'])]
+                   <= float(linha['media_salarial_geral_ic_sup']) + TOLERANCIA for linha in avaliadas)
+    assert len(avaliadas) > 50
+    assert cobertas >= 0.8 * len(avaliadas)
+
+
+def test_erro_alvo(dados):
+    resultado = executar(dados, '--backend', 'sequencial', '--amostragem', '0.1', '--erro-alvo', '0.05',
+                         '--bloco-amostra', '64')
+    rodadas = [linha for linha in resultado.stdout.splitlines() if linha.startswith('Amostragem, rodada')]
+    assert len(rodadas) > 1
+    assert rodadas[-1].endswith('0 meses a refinar')
@@ -0,0 +1,75 @@
+import os
+import re
+
+import pytest
+
+from caged import execucao
+from caged.execucao import Configuracao, executar
+from caged.sintetico import competencias, gerar_arquivo
+from conftest import SAIDAS, comparar_linhas, ler_saidas
+
+# Cache de parciais: as faixas das fatias não dependem do total de bytes nem do número de trabalhadores,
+# então uma execução com um mês a mais (ou outro número de trabalhadores) reaproveita os parciais dos
+# arquivos que não mudaram e só processa os novos ou alterados
+
+LINHAS_POR_MES = 10_000
+
+
+def _gerar(diretorio, competencia, semente=0):
+    os.makedirs(diretorio, exist_ok=True)
+    gerar_arquivo(os.path.join(diretorio, f'CAGEDMOV{competencia}.txt'), competencia, LINHAS_POR_MES, semente)
+
+
+def _executar(capsys, cache=None, **opcoes):
+    # Caminhos relativos ao diretório do teste, como na linha de comando
+    executar(Configuracao(diretorio_entrada='CAGEDMOV_downloads', diretorio_saida='output_caged',
+                          diretorio_cache=cache, **opcoes))
+    saida = capsys.readouterr().out
+    contagem = re.search(r'Cache: (\d+) fatias reaproveitadas, (\d+) fatias a processar', saida)
+    return tuple(map(int, contagem.groups())) if contagem else None
+
+
+@pytest.fixture
+def meses(tmp_path, monkeypatch):
+    # Fatias pequenas (várias por arquivo), e um dimensionamento automático que mudaria com o total de bytes
+    monkeypatch.setattr(execucao, 'TAMANHO_FATIA_CACHE', 256 * 1024)
+    monkeypatch.setattr(execucao, 'TAMANHO_FATIA_MINIMO', 64 * 1024)
+    monkeypatch.setattr(execucao, 'BYTES_POR_TRABALHADOR', 64 * 1024)
+    monkeypatch.chdir(tmp_path)
+    return competencias(3)
+
+
+def test_mes_novo_reaproveita_os_demais(tmp_path, capsys, meses):
+    entrada = tmp_path / 'CAGEDMOV_downloads'
+    cache = 'cache'
+    for competencia in meses[:2]:
+        _gerar(entrada, competencia)
+    reaproveitadas, processadas = _executar(capsys, cache, backend='sequencial')
+    assert reaproveitadas == 0
+    assert processadas > 2
+
+    # Um mês a mais e outro número de trabalhadores: só as fatias do arquivo novo são processadas
+    _gerar(entrada, meses[2])
+    reaproveitadas_novo, processadas_novo = _executar(capsys, cache, backend='pool', trabalhadores=2)
+    assert reaproveitadas_novo == processadas
+    assert processadas_novo > 0
+    com_cache = ler_saidas(tmp_path)
+
+    # Um arquivo alterado é processado de novo; os demais continuam no cache
+    _gerar(entrada, meses[0], semente=1)
+    reaproveitadas_alterado, processadas_alterado = _executar(capsys, cache, backend='sequencial')
+    assert reaproveitadas_alterado + processadas_alterado == reaproveitadas_novo + processadas_novo
+    assert 0 < processadas_alterado < reaproveitadas_novo + processadas_novo
+
+    # As saídas com o cache são as de uma execução sem ele
+    _gerar(entrada, meses[0])
+    _executar(capsys, backend='sequencial')
+    sem_cache = ler_saidas(tmp_path)
+    for nome in SAIDAS:
+        comparar_linhas(com_cache[nome], sem_cache[nome], nome)
+
+
+def test_tamanho_fatia_explicito_e_mantido():
+    assert Configuracao(diretorio_cache='cache').tamanho_fatia == execucao.TAMANHO_FATIA_CACHE
+    assert Configuracao(diretorio_cache='cache', tamanho_fatia=1024).tamanho_fatia == 1024
+    assert Configuracao().tamanho_fatia is None
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from caged.colunar import converter_arquivo, entrada_atualizada, processar_entrada_colunar, separar_armazenados
+from caged.erros import RegistroErros
+from caged.fatias import fatia_inteira
+from caged.nucleo import processar_tarefa
+from caged.regras import ESPECIFICACAO_PADRAO, REGRAS_PADRAO, Regras
+from caged.sintetico import gerar_arquivo
+from conftest import comparar_agregados
+
+# Armazenamento colunar (caged.colunar): a entrada convertida dá o mesmo agregado que o texto, com as
+# regras padrão ou outras (sem nova conversão); uma origem alterada invalida a entrada e uma entrada
+# danificada vira erro de abertura, não uma exceção
+
+
+@pytest.fixture
+def arquivo(tmp_path):
+    caminho = tmp_path / 'CAGEDMOV202101.txt'
+    gerar_arquivo(str(caminho), '202101', 20_000, semente=11)
+    return str(caminho)
+
+
+@pytest.mark.parametrize('regras', [REGRAS_PADRAO, Regras({**ESPECIFICACAO_PADRAO, 'salario_minimo': 500,
+                                                           'unidades': {'5': 1.0, '1': 4.33, '6': 1.0}})],
+                         ids=['padrao', 'outras'])
+def test_mesmo_agregado_que_o_texto(arquivo, tmp_path, regras):
+    converter_arquivo(arquivo, str(tmp_path / 'armazenamento'))
+    entrada = entrada_atualizada(arquivo, str(tmp_path / 'armazenamento'))
+    assert entrada is not None
+
+    erros = RegistroErros()
+    armazenado = processar_entrada_colunar(entrada, regras, erros)
+    texto = processar_tarefa(fatia_inteira(arquivo), regras, RegistroErros(), motor='linhas')
+    assert erros.total() == 0
+    comparar_agregados(armazenado, texto)
+
+
+def test_origem_alterada_invalida_a_entrada(arquivo, tmp_path):
+    armazenamento = str(tmp_path / 'armazenamento')
+    converter_arquivo(arquivo, armazenamento)
+    assert separar_armazenados([arquivo], armazenamento)[1] == []
+
+    with open(arquivo, 'a', encoding='utf-8') as f:
+        f.write('\n')
+    assert entrada_atualizada(arquivo, armazenamento) is None
+    assert separar_armazenados([arquivo], armazenamento) == ([], [arquivo])
+
+
+def test_entrada_danificada_vira_erro(arquivo, tmp_path):
+    armazenamento = str(tmp_path / 'armazenamento')
+    destino = converter_arquivo(arquivo, armazenamento)
+    os.remove(os.path.join(destino, 'salario.npy'))
+
+    erros = RegistroErros()
+    assert processar_entrada_colunar(entrada_atualizada(arquivo, armazenamento), REGRAS_PADRAO, erros) is None
+    assert erros.contagens == {(os.path.basename(arquivo), 'abertura'): 1}
+
+
+def test_colunas_ausentes(tmp_path):
+    caminho = tmp_path / 'CAGEDMOV202101.txt'
+    caminho.write_text('subclasse;salário\n4711302;1500,00\n', encoding='utf-8')
+    armazenamento = tmp_path / 'armazenamento'
+    with pytest.raises(ValueError, match='colunas necessárias'):
+        converter_arquivo(str(caminho), str(armazenamento))
+    # Nenhuma entrada (nem temporária) fica para trás
+    assert not armazenamento.exists() or os.listdir(armazenamento) == []
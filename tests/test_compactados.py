@@ -0,0 +1,127 @@
+import bz2
+import gzip
+import lzma
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import zipfile
+
+import pytest
+
+from caged.compactados import fatias_compactadas
+from caged.erros import RegistroErros
+from caged.fatias import fatia_inteira, ler_blocos
+from caged.nucleo import processar_tarefa
+from caged.sintetico import gerar_arquivo
+
+# Leitura dos compactados: os blocos de cada formato são as linhas de dados do texto original, e um 7z que
+# termina com erro (truncado, corrompido, sem o membro) vira um erro de abertura em vez de um mês parcial
+
+NOME = 'CAGEDMOV202101.txt'
+
+# Programa 7z de teste: lista um único membro e, na extração, escreve o arquivo em SAIDA_7Z (até
+# BYTES_7Z bytes) e termina com o código CODIGO_7Z
+_FALSO_7Z = f'''#!{sys.executable}
+import os, sys
+if sys.argv[1] == 'l':
+    print('----------')
+    print('Path = {NOME}')
+    print('Size = ' + str(os.path.getsize(os.environ['SAIDA_7Z'])))
+    sys.exit(0)
+with open(os.environ['SAIDA_7Z'], 'rb') as f:
+    dados = f.read(int(os.environ.get('BYTES_7Z', -1)))
+sys.stdout.buffer.write(dados)
+sys.stdout.flush()
+codigo = int(os.environ.get('CODIGO_7Z', 0))
+if codigo:
+    print('ERROR: Unexpected end of archive', file=sys.stderr)
+sys.exit(codigo)
+'''
+
+
+@pytest.fixture(scope='module')
+def texto(tmp_path_factory):
+    caminho = tmp_path_factory.mktemp('texto') / NOME
+    gerar_arquivo(str(caminho), '202101', 5_000, semente=3)
+    return caminho
+
+
+def _linhas_dados(caminho):
+    with open(caminho, mode='rb') as f:
+        f.readline()
+        return f.read()
+
+
+def _blocos(fatia):
+    return b''.join(ler_blocos(fatia, 4096))
+
+
+def _compactar(texto, destino, formato):
+    caminho = destino / f'{NOME}.{formato}'
+    if formato == 'zip':
+        with zipfile.ZipFile(caminho, mode='w', compression=zipfile.ZIP_DEFLATED) as compactado:
+            compactado.write(texto, NOME)
+    else:
+        abrir = {'gz': gzip.open, 'xz': lzma.open, 'bz2': bz2.open}[formato]
+        with open(texto, mode='rb') as origem, abrir(caminho, mode='wb') as saida:
+            shutil.copyfileobj(origem, saida)
+    return caminho
+
+
+@pytest.mark.parametrize('formato', ['zip', 'gz', 'xz', 'bz2'])
+def test_blocos_dos_compactados(texto, tmp_path, formato):
+    [fatia] = fatias_compactadas(str(_compactar(texto, tmp_path, formato)))
+    assert fatia.nome == NOME
+    assert fatia.colunas == fatia_inteira(str(texto)).colunas
+    assert _blocos(fatia) == _linhas_dados(texto)
+
+
+@pytest.fixture
+def falso_7z(texto, tmp_path, monkeypatch):
+    programas = tmp_path / 'bin'
+    programas.mkdir()
+    programa = programas / '7z'
+    programa.write_text(_FALSO_7Z)
+    programa.chmod(programa.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv('PATH', os.pathsep.join([str(programas), os.environ.get('PATH', '')]))
+    monkeypatch.setenv('SAIDA_7Z', str(texto))
+    compactado = tmp_path / 'CAGEDMOV202101.7z'
+    compactado.write_bytes(b'')
+    return compactado
+
+
+def test_7z_completo(falso_7z, texto):
+    [fatia] = fatias_compactadas(str(falso_7z))
+    assert _blocos(fatia) == _linhas_dados(texto)
+
+
+@pytest.mark.parametrize('motor', ['linhas', 'vetorizado'])
+def test_7z_com_erro_registra_abertura(falso_7z, texto, monkeypatch, motor):
+    [fatia] = fatias_compactadas(str(falso_7z))
+    monkeypatch.setenv('BYTES_7Z', str(os.path.getsize(texto) // 2))
+    monkeypatch.setenv('CODIGO_7Z', '2')
+    with pytest.raises(RuntimeError, match='Unexpected end of archive'):
+        _blocos(fatia)
+
+    erros = RegistroErros()
+    assert processar_tarefa(fatia, erros=erros, motor=motor) is None
+    # A última linha cortada ao meio também pode contar como linha inválida
+    assert erros.contagens[(falso_7z.name, 'abertura')] == 1
+    assert 'código 2' in erros.amostras[(falso_7z.name, 'abertura')][0]
+
+
+def test_7z_truncado(texto, tmp_path):
+    programa = next(filter(None, map(shutil.which, ('7z', '7za', '7zz'))), None)
+    if programa is None:
+        pytest.skip('programa 7z não encontrado')
+    compactado = tmp_path / 'CAGEDMOV202101.7z'
+    subprocess.run([programa, 'a', str(compactado), str(texto)], check=True, capture_output=True)
+    [fatia] = fatias_compactadas(str(compactado))
+    with open(compactado, mode='r+b') as f:
+        f.truncate(os.path.getsize(compactado) // 2)
+
+    erros = RegistroErros()
+    assert processar_tarefa(fatia, erros=erros) is None
+    assert (compactado.name, 'abertura') in erros.contagens
@@ -0,0 +1,106 @@
+import json
+import os
+import shutil
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from caged.consulta import ServicoConsulta, criar_servidor
+from conftest import executar, ler_saidas
+
+# Serviço de consulta (caged.consulta) sobre as saídas e o cubo de uma execução sequencial: respostas da API
+# Python e do servidor HTTP, inclusive para consultas inválidas e falhas internas
+
+
+@pytest.fixture(scope='module')
+def saidas(dados, tmp_path_factory):
+    executar(str(dados), '--backend', 'sequencial', '--cubo', 'cubo.npz')
+    destino = tmp_path_factory.mktemp('consulta')
+    shutil.copytree(os.path.join(dados, 'output_caged'), destino / 'output_caged')
+    shutil.copy(os.path.join(dados, 'cubo.npz'), destino / 'cubo.npz')
+    return destino
+
+
+@pytest.fixture
+def servico(saidas):
+    with ServicoConsulta(str(saidas / 'output_caged'), str(saidas / 'cubo.npz')) as servico:
+        yield servico
+
+
+@pytest.fixture
+def url(servico):
+    servidor = criar_servidor(servico, porta=0)
+    linha = threading.Thread(target=servidor.serve_forever, daemon=True)
+    linha.start()
+    yield f'http://127.0.0.1:{servidor.server_address[1]}'
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def obter(endereco):
+    try:
+        with urllib.request.urlopen(endereco, timeout=30) as resposta:
+            return resposta.status, json.loads(resposta.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_consultas_batem_com_as_saidas(servico, saidas):
+    linhas = ler_saidas(str(saidas))['subclasse_output.csv']
+    esperada = linhas[0]
+    registros = servico.subclasse(esperada['cnae'], mes=esperada['date'])
+    assert len(registros) == 1
+    assert registros[0]['media_salarial_geral'] == pytest.approx(float(esperada['media_salarial_geral']))
+    assert servico.meses() == sorted({linha['date'] for linha in linhas})
+
+    # Um rollup por mês tem uma linha para cada mês das saídas
+    assert [linha['mes'] for linha in servico.rollup(['mes'])] == servico.meses()
+
+
+def test_rollup_rejeita_dimensao_desconhecida(servico):
+    with pytest.raises(ValueError, match='municipio'):
+        servico.rollup(['municipio'])
+    with pytest.raises(ValueError, match='municipio'):
+        servico.rollup(['mes'], municipio='3550308')
+
+
+def test_http_respostas(url, servico):
+    status, meses = obter(f'{url}/meses')
+    assert status == 200 and meses == {'meses': servico.meses()}
+
+    status, corpo = obter(f'{url}/rollup?por=mes,uf')
+    assert status == 200 and corpo
+
+    status, corpo = obter(f'{url}/subclasse/0000000')
+    assert status == 404
+    status, corpo = obter(f'{url}/inexistente')
+    assert status == 404 and 'erro' in corpo
+
+
+def test_http_consulta_invalida(url, saidas):
+    # Dimensão desconhecida no agrupamento e no filtro: 400 com o erro, sem derrubar a conexão
+    for caminho in ('/rollup?por=municipio', '/rollup?por=mes&municipio=3550308'):
+        status, corpo = obter(url + caminho)
+        assert status == 400, caminho
+        assert 'municipio' in corpo['erro']
+
+    cnae = ler_saidas(str(saidas))['subclasse_output.csv'][0]['cnae']
+    status, corpo = obter(f'{url}/subclasse/{cnae}?faixa=idosos')
+    assert status == 400 and 'idosos' in corpo['erro']
+
+
+def test_http_erro_interno(url, servico, monkeypatch, capsys):
+    def falhar(*args, **kwargs):
+        raise RuntimeError('arquivo trocado durante a leitura')
+
+    monkeypatch.setattr(servico, 'meses', falhar)
+    status, corpo = obter(f'{url}/meses')
+    assert status == 500
+    assert 'arquivo trocado' in corpo['erro']
+
+    # O servidor continua atendendo depois da falha
+    monkeypatch.undo()
+    status, _ = obter(f'{url}/meses')
+    assert status == 200
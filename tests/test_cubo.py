@@ -0,0 +1,101 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from caged import cubo as modulo_cubo
+from caged.cubo import DIMENSOES, AcumuladorCubo, Cubo
+from caged.estatisticas import AgregadoParcial
+
+# Cubo: acrescentar células por blocos (com partes pendentes) dá o mesmo cubo de uma vez só, combinar,
+# gravar e serializar preservam as células, e as projeções batem com o agregado das mesmas linhas
+
+TAMANHOS = (3, 40, 60, 5, 27)
+
+
+def _linhas(semente, n):
+    rng = np.random.default_rng(semente)
+    codigos = np.column_stack([rng.integers(0, tamanho, n) for tamanho in TAMANHOS])
+    return codigos, rng.random(n) * 5000 + 1000, rng.integers(18, 70, n).astype(np.float64)
+
+
+def _cubo_vazio():
+    cubo = Cubo()
+    for dimensao, tamanho in zip(DIMENSOES, TAMANHOS):
+        cubo.codificar(dimensao, [f'{dimensao}{i}' for i in range(tamanho)])
+    return cubo
+
+
+def _mesmas_celulas(a, b):
+    assert a.dicionarios == b.dicionarios
+    np.testing.assert_array_equal(a.codigos, b.codigos)
+    np.testing.assert_allclose(a.somas, b.somas)
+    np.testing.assert_array_equal(a.minimos, b.minimos)
+    np.testing.assert_array_equal(a.maximos, b.maximos)
+
+
+@pytest.fixture
+def blocos():
+    return [_linhas(semente, 2_000) for semente in range(30)]
+
+
+@pytest.mark.parametrize('pendentes', [1, 500, 10 ** 9])
+def test_blocos_e_de_uma_vez(blocos, monkeypatch, pendentes):
+    monkeypatch.setattr(modulo_cubo, 'CELULAS_PENDENTES', pendentes)
+    por_blocos = _cubo_vazio()
+    for codigos, salario, idade in blocos:
+        por_blocos.adicionar_linhas(codigos, salario, idade)
+    de_uma_vez = _cubo_vazio().adicionar_linhas(*(np.concatenate(partes) for partes in zip(*blocos)))
+    _mesmas_celulas(por_blocos, de_uma_vez)
+    # Ler as células agrupa as partes pendentes
+    assert not por_blocos.pendentes
+    assert por_blocos.somas[:, 0].sum() == sum(len(codigos) for codigos, _, _ in blocos)
+
+
+def test_combinar_serializar_e_gravar(blocos, tmp_path):
+    total = _cubo_vazio()
+    partes = []
+    for inicio in range(0, len(blocos), 10):
+        parte = _cubo_vazio()
+        for bloco in blocos[inicio:inicio + 10]:
+            parte.adicionar_linhas(*bloco)
+        # Serializado com partes pendentes, como nas mensagens entre processos
+        partes.append(pickle.loads(pickle.dumps(parte)))
+    for parte in partes:
+        total.combinar(parte)
+    esperado = _cubo_vazio()
+    for bloco in blocos:
+        esperado.adicionar_linhas(*bloco)
+    _mesmas_celulas(total, esperado)
+
+    caminho = tmp_path / 'cubo.npz'
+    total.salvar(str(caminho))
+    _mesmas_celulas(Cubo.carregar(str(caminho)), esperado)
+
+
+def test_projecao_e_rollup():
+    linhas = [('2021-01-01', '4711302', '411005', 2500.0, 25, '18-29', 'SP'),
+              ('2021-01-01', '4711302', '411010', 3500.0, 41, '40-49', 'RJ'),
+              ('2021-02-01', '8121400', '411005', 1800.0, 33, '30-39', 'SP')]
+    cubo = Cubo()
+    agregado = AgregadoParcial()
+    for mes, subclasse, cbo, salario, idade, faixa, uf in linhas:
+        acumulador = AcumuladorCubo(mes)
+        acumulador.registrar(subclasse, cbo, salario, idade, faixa, uf)
+        cubo.combinar(acumulador.cubo())
+        agregado.registrar(subclasse, cbo, salario, idade, faixa)
+
+    projecao = cubo.agregado_parcial()
+    for dimensao in ('subclasses', 'ocupacoes'):
+        esperado = getattr(agregado, dimensao)
+        obtido = getattr(projecao, dimensao)
+        assert sorted(obtido) == sorted(esperado)
+        for chave, estatisticas in esperado.items():
+            assert obtido[chave].salario.media() == pytest.approx(estatisticas.salario.media())
+            assert obtido[chave].idade.media() == pytest.approx(estatisticas.idade.media())
+            assert sorted(obtido[chave].faixas) == sorted(estatisticas.faixas)
+
+    por_uf = cubo.rollup('uf', cbo='411005')
+    assert dict(zip([chave[0] for chave in por_uf.chaves()], por_uf.n().tolist())) == {'SP': 2}
+    with pytest.raises(ValueError, match='Dimensão desconhecida'):
+        cubo.rollup('municipio')
@@ -0,0 +1,46 @@
+import pytest
+
+from conftest import SAIDAS, comparar_linhas, executar, ler_saidas, prefixo_mpi
+
+# Equivalência dos motores e backends: a mesma entrada sintética (caged.sintetico) processada pelo motor
+# de linhas e pelo vetorizado, no backend sequencial, no pool de processos, no Dask e no MPI, deve produzir as
+# mesmas linhas (chaves, meses e ids) e as mesmas médias, a menos do arredondamento de ponto flutuante
+# (a ordem das somas muda com o número e o tamanho das fatias e com o escalonamento)
+
+
+def _comparar(saidas, referencia):
+    for nome in SAIDAS:
+        comparar_linhas(saidas[nome], referencia[nome], nome)
+
+
+@pytest.fixture(scope='module')
+def referencia(dados):
+    executar(dados, '--backend', 'sequencial', '--motor', 'vetorizado')
+    return ler_saidas(dados)
+
+
+@pytest.mark.parametrize('opcoes', [
+    ('--backend', 'sequencial', '--motor', 'linhas'),
+    ('--backend', 'sequencial', '--motor', 'linhas', '--sem-prefiltro'),
+    ('--backend', 'sequencial', '--motor', 'vetorizado', '--tamanho-fatia', '1'),
+    ('--backend', 'pool', '--trabalhadores', '2', '--motor', 'vetorizado', '--tamanho-fatia', '1'),
+    ('--backend', 'pool', '--trabalhadores', '2', '--motor', 'linhas', '--tamanho-fatia', '1'),
+])
+def test_motores_e_backends_locais(dados, referencia, opcoes):
+    executar(dados, *opcoes)
+    _comparar(ler_saidas(dados), referencia)
+
+
+def test_backend_dask(dados, referencia):
+    pytest.importorskip('dask.distributed')
+    executar(dados, '--backend', 'dask', '--trabalhadores', '2', '--tamanho-fatia', '1')
+    _comparar(ler_saidas(dados), referencia)
+
+
+@pytest.mark.parametrize('opcoes', [
+    ('--motor', 'vetorizado', '--tamanho-fatia', '1'),
+    ('--motor', 'linhas', '--tamanho-fatia', '1', '--escalonamento', 'dinamico'),
+])
+def test_backend_mpi(dados, referencia, opcoes):
+    executar(dados, '--backend', 'mpi', *opcoes, prefixo=prefixo_mpi(2))
+    _comparar(ler_saidas(dados), referencia)
@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+from caged.erros import ARQUIVO_LOG, RegistroErros
+from caged.sintetico import gerar_arquivo
+from conftest import executar, linha_cagedmov, prefixo_mpi
+
+# Contabilidade dos erros (caged.erros): contagens completas com amostras limitadas, combinação dos
+# registros dos trabalhadores e um único bloco no log por execução, em todos os backends
+
+
+def test_amostras_limitadas():
+    erros = RegistroErros(limite_amostras=2)
+    erros.registrar('a.txt', 'linha', 3, ['l1', 'l2', 'l3'])
+    assert erros.faltam_amostras('a.txt', 'linha') == 0
+    outro = RegistroErros(limite_amostras=2)
+    outro.registrar('a.txt', 'linha', 2, ['l4', 'l5'])
+    outro.registrar('b.txt', 'abertura', amostras=['sem permissão'])
+    outro('Arquivo ignorado: c.zip')
+
+    erros.combinar(outro)
+    assert erros.total() == 7
+    assert erros.como_dict() == {
+        '': {'mensagem': {'quantidade': 1, 'amostras': ['Arquivo ignorado: c.zip']}},
+        'a.txt': {'linha': {'quantidade': 5, 'amostras': ['l1', 'l2']}},
+        'b.txt': {'abertura': {'quantidade': 1, 'amostras': ['sem permissão']}},
+    }
+    assert list(erros.linhas_log()) == [
+        'Arquivo ignorado: c.zip',
+        'Erros no arquivo a.txt: 5 linhas com valor inválido', '    l1', '    l2',
+        'Erros no arquivo b.txt: 1 erros ao abrir ou processar o arquivo', '    sem permissão',
+    ]
+
+
+def test_gravar(tmp_path):
+    caminho = tmp_path / ARQUIVO_LOG
+    RegistroErros().gravar(str(caminho))
+    assert not caminho.exists()
+
+    erros = RegistroErros()
+    erros.registrar('a.txt', 'colunas')
+    erros.gravar(str(caminho))
+    erros.gravar(str(caminho))
+    linhas = caminho.read_text(encoding='utf-8').splitlines()
+    assert len(linhas) == 4
+    assert linhas[0].endswith(': 1 erros') and linhas[1] == 'Erros no arquivo a.txt: 1 colunas necessárias não encontradas'
+
+
+# Dois meses com linhas inválidas espalhadas por várias fatias
+@pytest.fixture(scope='module')
+def dados_com_erros(tmp_path_factory):
+    destino = tmp_path_factory.mktemp('erros')
+    pasta = destino / 'CAGEDMOV_downloads'
+    pasta.mkdir()
+    for competencia in ('202101', '202102'):
+        caminho = pasta / f'CAGEDMOV{competencia}.txt'
+        gerar_arquivo(str(caminho), competencia, 20_000, semente=17)
+        with open(caminho, encoding='utf-8') as f:
+            linhas = f.read().splitlines()
+        for posicao in range(1000, len(linhas), 2000):
+            linhas[posicao] = linha_cagedmov(idade='trinta')
+        caminho.write_text('\n'.join(linhas) + '\n', encoding='utf-8')
+    return destino
+
+
+def _ler_log(diretorio):
+    with open(os.path.join(diretorio, ARQUIVO_LOG), encoding='utf-8') as f:
+        return f.read().splitlines()
+
+
+@pytest.mark.parametrize('opcoes', [
+    ('--backend', 'sequencial'),
+    ('--backend', 'pool', '--trabalhadores', '2', '--tamanho-fatia', '1'),
+    ('--backend', 'mpi', '--tamanho-fatia', '1'),
+], ids=['sequencial', 'pool', 'mpi'])
+def test_log_unico_por_execucao(dados_com_erros, opcoes):
+    prefixo = prefixo_mpi(2) if 'mpi' in opcoes else ()
+    diretorio = str(dados_com_erros)
+    if os.path.exists(os.path.join(diretorio, ARQUIVO_LOG)):
+        os.remove(os.path.join(diretorio, ARQUIVO_LOG))
+    executar(diretorio, *opcoes, '--motor', 'linhas', prefixo=prefixo)
+
+    linhas = _ler_log(diretorio)
+    # Um cabeçalho, e por arquivo um resumo com as 10 linhas inválidas e no máximo 5 amostras
+    assert sum(linha.startswith('# ') for linha in linhas) == 1
+    assert linhas[0].endswith(': 20 erros')
+    resumos = [linha for linha in linhas if linha.startswith('Erros no arquivo')]
+    assert resumos == [f'Erros no arquivo CAGEDMOV{competencia}.txt: 10 linhas com valor inválido'
+                       for competencia in ('202101', '202102')]
+    assert len(linhas) == 1 + 2 * (1 + 5)
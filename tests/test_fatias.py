@@ -0,0 +1,58 @@
+import threading
+
+import pytest
+
+from caged.fatias import dividir_arquivo, fatias_antecipadas, ler_blocos
+from caged.sintetico import gerar_arquivo
+
+# Divisão em fatias e leitura antecipada: as fatias cobrem o arquivo em linhas inteiras, a leitura
+# antecipada entrega os mesmos blocos e, com antecipar_proxima=False, a próxima fatia só é pedida
+# depois que a atual foi processada (escalonamento dinâmico do MPI)
+
+
+@pytest.fixture(scope='module')
+def arquivo(tmp_path_factory):
+    caminho = tmp_path_factory.mktemp('fatias') / 'CAGEDMOV202101.txt'
+    gerar_arquivo(str(caminho), '202101', 5_000, semente=5)
+    return str(caminho)
+
+
+def _dados(caminho):
+    with open(caminho, mode='rb') as f:
+        f.readline()
+        return f.read()
+
+
+def test_fatias_cobrem_o_arquivo(arquivo):
+    fatias = dividir_arquivo(arquivo, 64 * 1024)
+    assert len(fatias) > 3
+    assert all(a.fim == b.inicio for a, b in zip(fatias, fatias[1:]))
+    blocos = [b''.join(ler_blocos(fatia, 4096)) for fatia in fatias]
+    assert all(bloco.endswith(b'\n') for bloco in blocos)
+    assert b''.join(blocos) == _dados(arquivo)
+
+
+def _leituras_ativas():
+    return sum(thread.name == 'caged-leitura-antecipada' for thread in threading.enumerate())
+
+
+@pytest.mark.parametrize('antecipar_proxima', [True, False])
+def test_leitura_antecipada(arquivo, antecipar_proxima):
+    fatias = dividir_arquivo(arquivo, 64 * 1024)
+    pedidas = []
+    processadas = []
+
+    # Como receber_tarefas: cada fatia é um pedido ao mestre
+    def pedir():
+        for fatia in fatias:
+            pedidas.append(fatia)
+            yield fatia
+
+    blocos = []
+    for fatia in fatias_antecipadas(pedir(), 4096, 2, antecipar_proxima=antecipar_proxima):
+        blocos.append(b''.join(fatia.consumir_blocos()))
+        # Sem antecipar a próxima, nada além da fatia atual foi pedido
+        assert len(pedidas) == min(len(processadas) + (2 if antecipar_proxima else 1), len(fatias))
+        processadas.append(fatia)
+    assert b''.join(blocos) == _dados(arquivo)
+    assert _leituras_ativas() == 0
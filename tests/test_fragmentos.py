@@ -0,0 +1,77 @@
+import json
+import os
+
+import pytest
+
+from caged.execucao import Configuracao, executar as executar_configuracao
+from caged.fragmentos import diretorio_fragmentos, dono_chave
+from caged.particoes import ARQUIVO_MANIFESTO
+from conftest import SAIDAS, comparar_linhas, executar, ler_csv, ler_saidas, prefixo_mpi
+
+# Fragmentos por hash das chaves (MPI com --embaralhamento): cada processo escreve só as chaves que são
+# dele, a união dos fragmentos tem as linhas das saídas únicas e uma nova execução troca os fragmentos
+# descritos pelo manifesto sem reescrevê-los
+
+_ARQUIVOS = dict(zip(('subclasses', 'ocupacoes'), SAIDAS))
+_COLUNA_CHAVE = {'subclasses': 'cnae', 'ocupacoes': 'ocupacao'}
+
+
+@pytest.fixture(scope='module')
+def referencia(dados):
+    executar(dados, '--backend', 'sequencial')
+    return ler_saidas(dados)
+
+
+# Linhas ordenadas por mês e chave, com o id renumerado nessa ordem
+def _ordenar(linhas, coluna):
+    linhas = sorted(linhas, key=lambda linha: (linha['date'], linha[coluna]))
+    return [dict(linha, id=str(i)) for i, linha in enumerate(linhas, 1)]
+
+
+def _conferir_fragmentos(dados, referencia, processos):
+    raiz = diretorio_fragmentos(os.path.join(dados, 'output_caged'))
+    with open(os.path.join(raiz, ARQUIVO_MANIFESTO), encoding='utf-8') as f:
+        manifesto = json.load(f)
+    assert manifesto['n_fragmentos'] == processos
+    assert [fragmento['rank'] for fragmento in manifesto['fragmentos']] == list(range(processos))
+    for dimensao, coluna in _COLUNA_CHAVE.items():
+        uniao = []
+        for fragmento in manifesto['fragmentos']:
+            linhas = ler_csv(os.path.join(raiz, fragmento['arquivos'][dimensao]))
+            assert fragmento['linhas'][dimensao] == len(linhas)
+            # Só as chaves do processo, em todos os meses
+            assert {dono_chave(linha[coluna], processos) for linha in linhas} <= {fragmento['rank']}
+            uniao.extend(linhas)
+        comparar_linhas(_ordenar(uniao, coluna), _ordenar(referencia[_ARQUIVOS[dimensao]], coluna), dimensao)
+    return raiz, manifesto
+
+
+def test_dono_chave():
+    chaves = [str(4711302 + i) for i in range(1000)]
+    donos = [dono_chave(chave, 3) for chave in chaves]
+    assert set(donos) == {0, 1, 2}
+    assert donos == [dono_chave(chave, 3) for chave in chaves]
+
+
+def test_opcoes_incompativeis(tmp_path, monkeypatch):
+    for opcoes in ({'cubo': True}, {'particoes': True}):
+        with pytest.raises(ValueError, match='embaralhamento'):
+            Configuracao(embaralhamento=True, **opcoes)
+    # Fora do MPI não há embaralhamento (nenhuma saída é escrita)
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(ValueError, match='MPI'):
+        executar_configuracao(Configuracao(backend='sequencial', embaralhamento=True))
+    assert not os.path.exists(tmp_path / 'output_caged')
+
+
+def test_fragmentos_mpi(dados, referencia):
+    executar(dados, '--backend', 'mpi', '--embaralhamento', '--tamanho-fatia', '1', prefixo=prefixo_mpi(3))
+    raiz, anterior = _conferir_fragmentos(dados, referencia, 3)
+    arquivos_anteriores = set(os.listdir(raiz))
+
+    executar(dados, '--backend', 'mpi', '--embaralhamento', '--motor', 'linhas', '--escalonamento', 'dinamico',
+             prefixo=prefixo_mpi(2), limpar=False)
+    _, manifesto = _conferir_fragmentos(dados, referencia, 2)
+    assert manifesto['execucao'] != anterior['execucao']
+    # Só o manifesto sobrevive da execução anterior
+    assert set(os.listdir(raiz)) & arquivos_anteriores == {ARQUIVO_MANIFESTO}
@@ -0,0 +1,100 @@
+import pytest
+
+from caged import execucao
+from caged.erros import RegistroErros
+from caged.execucao import dimensionar, escolher_backend
+from caged.fatias import fatia_inteira
+from caged.nucleo import MOTORES, processar_tarefa
+from caged.perfil import Perfil
+from caged.sintetico import COLUNAS, gerar_arquivo
+from conftest import comparar_agregados, linha_cagedmov
+
+# Núcleo comum (caged.nucleo) e escolha do backend (caged.execucao): os dois motores aplicam as mesmas
+# regras linha a linha e dão o mesmo agregado; a execução é dimensionada pelos bytes de entrada e o
+# backend automático segue o mpirun e o número de trabalhadores
+
+_MB = 1024 * 1024
+
+
+@pytest.fixture
+def arquivo(tmp_path):
+    caminho = tmp_path / 'CAGEDMOV202101.txt'
+    linhas = [
+        linha_cagedmov(),
+        # Unidade sem multiplicador nas regras
+        linha_cagedmov(**{'unidadesaláriocódigo': '8', 'salário': '2000,00'}),
+        # Salário vazio logo depois de uma linha válida (não reaproveita o salário anterior)
+        linha_cagedmov(**{'salário': ''}),
+        # Idade fora das faixas etárias
+        linha_cagedmov(**{'idade': '15'}),
+        # Salário por hora: 10 x 40 horas x 4,33
+        linha_cagedmov(**{'unidadesaláriocódigo': '1', 'salário': '10,00', 'horascontratuais': '40,00', 'idade': '45'}),
+        linha_cagedmov(**{'unidadesaláriocódigo': '1', 'salário': '10,00', 'horascontratuais': '10,00'}),
+        linha_cagedmov(**{'salário': '30000,00'}),
+        linha_cagedmov(**{'saldomovimentação': '-1'}),
+    ]
+    caminho.write_text(';'.join(COLUNAS) + '\n' + '\n'.join(linhas) + '\n', encoding='utf-8')
+    return str(caminho)
+
+
+@pytest.mark.parametrize('motor', MOTORES)
+def test_regras_linha_a_linha(arquivo, motor):
+    perfil = Perfil()
+    erros = RegistroErros()
+    agregado = processar_tarefa(fatia_inteira(arquivo), erros=erros, motor=motor, perfil=perfil)
+    assert erros.total() == 0
+    assert list(agregado.subclasses) == ['4711302'] and list(agregado.ocupacoes) == ['521110']
+    estatisticas = agregado.subclasses['4711302']
+    assert estatisticas.salario.n == 2
+    assert estatisticas.salario.soma == pytest.approx(1500 + 10 * 40 * 4.33)
+    assert estatisticas.idade.soma == 30 + 45
+    assert {faixa: estatistica.n for faixa, estatistica in estatisticas.faixas.items()} == {'30-39': 1, '40-49': 1}
+    assert (perfil.lidas, perfil.aceitas) == (8, 2)
+    assert {motivo: n for motivo, n in perfil.rejeicoes.items() if n} == \
+        {'desligamento': 1, 'unidade': 1, 'salario_ausente': 1, 'idade': 1, 'horas': 1, 'faixa_salarial': 1}
+
+
+def test_motores_dao_o_mesmo_agregado(tmp_path):
+    caminho = tmp_path / 'CAGEDMOV202101.txt'
+    gerar_arquivo(str(caminho), '202101', 20_000, semente=13)
+    linhas, vetorizado = (processar_tarefa(fatia_inteira(str(caminho)), erros=RegistroErros(), motor=motor,
+                                           tamanho_bloco=64 * 1024) for motor in MOTORES)
+    comparar_agregados(vetorizado, linhas)
+
+
+@pytest.mark.parametrize('motor', MOTORES)
+def test_falhas_viram_erros(tmp_path, motor):
+    sem_colunas = tmp_path / 'CAGEDMOV202101.txt'
+    sem_colunas.write_text('subclasse;salário\n4711302;1500,00\n', encoding='utf-8')
+    erros = RegistroErros()
+    assert processar_tarefa(fatia_inteira(str(sem_colunas)), erros=erros, motor=motor) is None
+    assert erros.contagens == {('CAGEDMOV202101.txt', 'colunas'): 1}
+
+    # Arquivo removido depois da divisão em fatias
+    fatia = fatia_inteira(str(sem_colunas))
+    fatia.colunas = COLUNAS
+    sem_colunas.unlink()
+    erros = RegistroErros()
+    assert processar_tarefa(fatia, erros=erros, motor=motor) is None
+    assert list(erros.contagens) == [('CAGEDMOV202101.txt', 'abertura')]
+
+
+def test_dimensionar():
+    # Poucos dados: um trabalhador e fatias do tamanho mínimo
+    assert dimensionar(10 * _MB, 8) == (1, execucao.TAMANHO_FATIA_MINIMO)
+    # Muitos dados: limitado aos núcleos, fatias para FATIAS_POR_TRABALHADOR tarefas, em MB inteiros
+    trabalhadores, tamanho_fatia = dimensionar(4096 * _MB + 123, 4)
+    assert trabalhadores == 4
+    assert tamanho_fatia == 4096 * _MB // (4 * execucao.FATIAS_POR_TRABALHADOR)
+    assert dimensionar(10 ** 6 * _MB, 2)[1] == execucao.TAMANHO_FATIA
+    # Valores já definidos são mantidos
+    assert dimensionar(4096 * _MB, 4, trabalhadores=3, tamanho_fatia=5 * _MB) == (3, 5 * _MB)
+
+
+def test_escolher_backend(monkeypatch):
+    for variavel in execucao._AMBIENTE_MPI:
+        monkeypatch.delenv(variavel, raising=False)
+    assert escolher_backend(1) == 'sequencial'
+    assert escolher_backend(4) == 'pool'
+    monkeypatch.setenv('OMPI_COMM_WORLD_SIZE', '4')
+    assert escolher_backend(1) == 'mpi'
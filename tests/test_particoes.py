@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+from caged.estatisticas import AgregadoParcial
+from caged.particoes import EscritorParticoes, diretorio_particoes, ler_manifesto
+from conftest import SAIDAS, comparar_linhas, executar, ler_csv, ler_saidas, prefixo_mpi
+
+# Partições por mês: o manifesto liga as partições da execução, cada partição tem as linhas do mês das
+# saídas únicas, e os arquivos de execuções anteriores saem depois da troca do manifesto
+
+_ARQUIVOS = dict(zip(('subclasses', 'ocupacoes'), SAIDAS))
+
+
+@pytest.fixture(scope='module')
+def referencia(dados):
+    executar(dados, '--backend', 'sequencial')
+    return ler_saidas(dados)
+
+
+# Linhas ordenadas pela chave (a segunda coluna), com o id renumerado nessa ordem
+def _por_chave(linhas):
+    linhas = sorted(linhas, key=lambda linha: list(linha.values())[1])
+    return [dict(linha, id=str(i)) for i, linha in enumerate(linhas, 1)]
+
+
+def _conferir_particoes(dados, referencia):
+    raiz = diretorio_particoes(os.path.join(dados, 'output_caged'))
+    manifesto = ler_manifesto(raiz)
+    datas = sorted({linha['date'] for linha in referencia[SAIDAS[0]]})
+    assert [particao['date'] for particao in manifesto['particoes']] == datas
+    for particao in manifesto['particoes']:
+        for dimensao, descricao in particao['arquivos'].items():
+            linhas = ler_csv(os.path.join(raiz, particao['diretorio'], descricao['csv']))
+            esperadas = [linha for linha in referencia[_ARQUIVOS[dimensao]] if linha['date'] == particao['date']]
+            assert descricao['linhas'] == len(linhas)
+            comparar_linhas(_por_chave(linhas), _por_chave(esperadas), descricao['csv'])
+    return raiz, manifesto
+
+
+def _arquivos(raiz):
+    return {os.path.join(diretorio, nome) for diretorio, _, nomes in os.walk(raiz) for nome in nomes}
+
+
+def test_particoes_e_troca_do_manifesto(dados, referencia):
+    executar(dados, '--backend', 'sequencial', '--particoes')
+    raiz, anterior = _conferir_particoes(dados, referencia)
+    arquivos_anteriores = _arquivos(raiz)
+
+    executar(dados, '--backend', 'pool', '--trabalhadores', '2', '--particoes', '--tamanho-fatia', '1', limpar=False)
+    _, manifesto = _conferir_particoes(dados, referencia)
+    assert manifesto['execucao'] != anterior['execucao']
+    # Só o manifesto sobrevive da execução anterior
+    assert _arquivos(raiz) & arquivos_anteriores == {os.path.join(raiz, 'manifesto.json')}
+
+
+def test_particoes_mpi(dados, referencia):
+    executar(dados, '--backend', 'mpi', '--particoes', '--tamanho-fatia', '1', prefixo=prefixo_mpi(2))
+    _, manifesto = _conferir_particoes(dados, referencia)
+    # O mês i é escrito pelo processo i % size
+    assert [particao['escritor'] for particao in manifesto['particoes']] == ['rank 0', 'rank 1']
+
+
+def test_falha_mantem_o_manifesto_anterior(tmp_path):
+    with EscritorParticoes(['2023-01-01'], ['18-29'], diretorio=str(tmp_path)) as escritor:
+        escritor.concluir('2023-01-01', AgregadoParcial())
+    anterior = ler_manifesto(escritor.raiz)
+
+    with pytest.raises(RuntimeError):
+        with EscritorParticoes(['2023-01-01'], ['18-29'], diretorio=str(tmp_path)) as escritor:
+            escritor.concluir('2023-01-01', AgregadoParcial())
+            raise RuntimeError('falha no meio da escrita')
+    assert ler_manifesto(escritor.raiz) == anterior
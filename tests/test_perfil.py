@@ -0,0 +1,65 @@
+import json
+import os
+import pickle
+
+from caged.cubo import AcumuladorCubo
+from caged.erros import RegistroErros
+from caged.estatisticas import AgregadoParcial
+from caged.perfil import Perfil
+from conftest import executar, prefixo_mpi
+
+# Tamanho das mensagens no perfil: agregados e cubos pelos bytes dos seus números, sem serializá-los de
+# novo; as mensagens de controle só no perfil detalhado
+
+
+def _agregado(n_chaves, quantis=False):
+    agregado = AgregadoParcial(quantis)
+    for i in range(n_chaves):
+        for salario in (1500.0, 2500.0, 4000.0):
+            agregado.registrar(f'{4711302 + i}', f'{411005 + i}', salario, 30, '30-39')
+    return agregado
+
+
+def test_estimativa_do_agregado():
+    agregado = _agregado(200)
+    # Da mesma ordem do pickle, sem precisar dele
+    assert 0.25 < agregado.nbytes / len(pickle.dumps(agregado)) < 4
+    assert _agregado(400).nbytes > agregado.nbytes
+    assert _agregado(200, quantis=True).nbytes > agregado.nbytes
+    assert AgregadoParcial().nbytes == 0
+
+
+def test_registrar_objeto():
+    acumulador = AcumuladorCubo('2021-01-01')
+    acumulador.registrar('4711302', '411005', 2500.0, 30, '30-39', 'SP')
+    cubo = acumulador.cubo()
+    erros = RegistroErros()
+    erros.registrar('CAGEDMOV202101.txt', 'linha', 3, ['valor inválido'])
+
+    perfil = Perfil()
+    perfil.registrar_objeto('agregado', _agregado(10))
+    perfil.registrar_objeto('cubo', cubo)
+    perfil.registrar_objeto('erros', erros)
+    assert perfil.mensagens == {'agregado': [1, _agregado(10).nbytes], 'cubo': [1, cubo.nbytes]}
+
+    detalhado = Perfil(detalhado=True)
+    detalhado.registrar_objeto('erros', erros)
+    assert detalhado.mensagens == {'erros': [1, len(pickle.dumps(erros, protocol=pickle.HIGHEST_PROTOCOL))]}
+
+
+def _mensagens(diretorio):
+    with open(os.path.join(diretorio, 'output_caged', 'perfil_execucao.json'), encoding='utf-8') as f:
+        perfil = json.load(f)
+    return perfil['total']['mensagens']
+
+
+def test_perfil_mpi(dados):
+    executar(dados, '--backend', 'mpi', '--tamanho-fatia', '1', prefixo=prefixo_mpi(2))
+    mensagens = _mensagens(dados)
+    assert mensagens['reduce_buffers']['bytes'] > 0
+    assert 'gather_perfis' not in mensagens
+
+    executar(dados, '--backend', 'mpi', '--tamanho-fatia', '1', '--perfil-detalhado', prefixo=prefixo_mpi(2))
+    mensagens = _mensagens(dados)
+    assert mensagens['gather_perfis']['quantidade'] == 2
+    assert mensagens['gather_cargas']['bytes'] > 0
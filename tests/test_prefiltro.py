@@ -0,0 +1,66 @@
+import pytest
+
+from caged.erros import RegistroErros
+from caged.fatias import dividir_arquivo, fatia_inteira, ler_linhas
+from caged.nucleo import processar_fatia_linhas
+from caged.perfil import Perfil
+from caged.prefiltro import ler_linhas_admissao
+from caged.sintetico import gerar_arquivo
+from conftest import comparar_agregados, linha_cagedmov
+
+# Pré-filtro em bytes (caged.prefiltro): com e sem ele, o motor de linhas dá o mesmo agregado, os mesmos
+# erros e as mesmas contagens do perfil, inclusive nas linhas que o pré-filtro não pode decidir (aspas,
+# '\r', salário inválido numa unidade descartada, linha incompleta)
+
+
+@pytest.fixture(scope='module')
+def arquivo(tmp_path_factory):
+    caminho = tmp_path_factory.mktemp('prefiltro') / 'CAGEDMOV202101.txt'
+    gerar_arquivo(str(caminho), '202101', 10_000, semente=3)
+    especiais = [
+        linha_cagedmov(**{'unidadesaláriocódigo': '99', 'salário': 'abc'}),
+        linha_cagedmov(**{'unidadesaláriocódigo': '99', 'subclasse': '"4711302"'}),
+        linha_cagedmov(**{'subclasse': '"4711302"', 'salário': '"2000,00"'}),
+        linha_cagedmov(**{'município': '"355;030"'}),
+        linha_cagedmov() + '\r',
+        linha_cagedmov(**{'unidadesaláriocódigo': '6'}) + '\r',
+        '',
+        linha_cagedmov(**{'saldomovimentação': '-1', 'salário': 'abc'}),
+        ';'.join(linha_cagedmov().split(';')[:8]),
+        linha_cagedmov(**{'idade': 'trinta'}),
+    ]
+    with open(caminho, 'a', encoding='utf-8', newline='') as f:
+        f.write('\n'.join(especiais) + '\n')
+    return str(caminho)
+
+
+def _processar(fatias, prefiltro):
+    erros = RegistroErros()
+    perfil = Perfil()
+    agregados = [processar_fatia_linhas(fatia, None, erros, 4096, perfil=perfil, prefiltro=prefiltro) for fatia in fatias]
+    total = agregados[0]
+    for agregado in agregados[1:]:
+        total.combinar(agregado)
+    return total, erros, perfil
+
+
+@pytest.mark.parametrize('tamanho_fatia', [None, 64 * 1024])
+def test_mesmo_resultado_com_e_sem_prefiltro(arquivo, tamanho_fatia):
+    fatias = [fatia_inteira(arquivo)] if tamanho_fatia is None else dividir_arquivo(arquivo, tamanho_fatia)
+    agregado, erros, perfil = _processar(fatias, prefiltro=True)
+    esperado, erros_esperados, perfil_esperado = _processar(fatias, prefiltro=False)
+
+    comparar_agregados(agregado, esperado)
+    # O salário inválido da unidade 99 e a idade inválida continuam aparecendo como erros
+    assert erros.contagens == erros_esperados.contagens
+    assert erros.contagens[('CAGEDMOV202101.txt', 'linha')] >= 2
+    assert (perfil.lidas, perfil.aceitas, perfil.rejeicoes) == \
+        (perfil_esperado.lidas, perfil_esperado.aceitas, perfil_esperado.rejeicoes)
+    assert perfil.rejeicoes['desligamento'] > 0 and perfil.rejeicoes['unidade'] > 0
+
+
+def test_sem_colunas_le_sem_prefiltro(tmp_path):
+    caminho = tmp_path / 'CAGEDMOV202101.txt'
+    caminho.write_bytes(b'subclasse;sal\xc3\xa1rio\n4711302;1500,00\n\n9999999;-1\n')
+    fatia = fatia_inteira(str(caminho))
+    assert list(ler_linhas_admissao(fatia, 4096)) == list(ler_linhas(fatia, 4096))
@@ -0,0 +1,87 @@
+import json
+import pickle
+
+import numpy as np
+import pytest
+
+from caged.execucao import Configuracao
+from caged.regras import ESPECIFICACAO_PADRAO, REGRAS_PADRAO, Regras, carregar_regras, como_regras
+from conftest import executar, ler_saidas
+
+# Regras compiladas (caged.regras): especificações inválidas são recusadas ao compilar, as tabelas de
+# faixas etárias concordam com a consulta por idade, e uma especificação em JSON (--regras) muda as
+# saídas de todos os motores do mesmo jeito
+
+
+def _regras(**trocas):
+    return Regras({**ESPECIFICACAO_PADRAO, **trocas})
+
+
+@pytest.mark.parametrize('trocas, mensagem', [
+    ({'unidades_por_hora': ['2']}, 'por hora'),
+    ({'unidades': {'05': 1.0}, 'unidades_por_hora': []}, 'inválido'),
+    ({'unidades': {'100': 1.0}, 'unidades_por_hora': []}, 'inválido'),
+    ({'faixas_etarias': {}}, 'faixa etária'),
+])
+def test_especificacao_invalida(trocas, mensagem):
+    with pytest.raises(ValueError, match=mensagem):
+        _regras(**trocas)
+
+
+def test_especificacao_incompleta():
+    especificacao = dict(ESPECIFICACAO_PADRAO)
+    del especificacao['horas_minimas']
+    with pytest.raises(ValueError, match='horas_minimas'):
+        Regras(especificacao)
+
+
+def test_faixas_etarias():
+    # Faixas sobrepostas: vale a primeira que contém a idade
+    regras = _regras(faixas_etarias={'jovens': [18, 29], 'todos': [18, 65], 'idosos': [60, 200]})
+    idades = np.array([17, 18, 29, 30, 64, 66, 200, 201, -1, 45.9])
+    esperadas = [regras.faixa(int(idade)) for idade in idades]
+    assert esperadas == [None, 'jovens', 'jovens', 'todos', 'todos', 'idosos', 'idosos', None, None, 'todos']
+    assert [regras.nomes_faixas[i] if i >= 0 else None for i in regras.faixas(idades).tolist()] == esperadas
+
+
+def test_identificador_e_serializacao(tmp_path):
+    regras = _regras(salario_minimo=500)
+    assert regras.identificador != REGRAS_PADRAO.identificador and not regras.padrao
+    assert REGRAS_PADRAO.padrao
+    copia = pickle.loads(pickle.dumps(regras))
+    assert copia.identificador == regras.identificador
+    assert np.array_equal(copia.tabela_faixas, regras.tabela_faixas)
+
+    # No JSON, as chaves ausentes ficam com o padrão
+    caminho = tmp_path / 'regras.json'
+    caminho.write_text(json.dumps({'salario_minimo': 500}), encoding='utf-8')
+    assert carregar_regras(str(caminho)).identificador == regras.identificador
+
+    # Só as faixas etárias (forma antiga) equivalem às regras padrão com essas faixas
+    faixas = {'jovens': (18, 29), 'demais': (30, 200)}
+    assert como_regras(faixas).identificador == _regras(faixas_etarias={'jovens': [18, 29],
+                                                                        'demais': [30, 200]}).identificador
+    assert como_regras(REGRAS_PADRAO.faixas_etarias) is REGRAS_PADRAO
+
+
+def test_quantis_recusam_faixa_salarial_maior_que_os_esbocos():
+    with pytest.raises(ValueError, match='esboços'):
+        Configuracao(quantis=True, regras=_regras(salario_maximo=100_000))
+    with pytest.raises(ValueError, match='esboços'):
+        Configuracao(quantis=True, regras=_regras(salario_minimo=0))
+    Configuracao(quantis=True, regras=_regras(salario_maximo=20_000))
+
+
+def test_regras_da_linha_de_comando(dados, tmp_path):
+    caminho = tmp_path / 'regras.json'
+    caminho.write_text(json.dumps({'salario_maximo': 5000, 'faixas_etarias': {'jovens': [18, 34], 'demais': [35, 200]}}),
+                       encoding='utf-8')
+    saidas = {}
+    for motor in ('linhas', 'vetorizado'):
+        executar(str(dados), '--backend', 'sequencial', '--motor', motor, '--regras', str(caminho))
+        saidas[motor] = ler_saidas(str(dados))
+    assert saidas['linhas'] == saidas['vetorizado']
+
+    linhas = saidas['linhas']['subclasse_output.csv']
+    assert list(linhas[0]) == ['id', 'cnae', 'media_salarial_geral', 'jovens', 'demais', 'media_idade_geral', 'date']
+    assert max(float(linha['media_salarial_geral']) for linha in linhas) <= 5000
@@ -0,0 +1,112 @@
+import os
+import shutil
+import threading
+
+import pytest
+
+from caged.residente import MesesResidentes, ProcessadorResidente, ServidorResidente, enviar
+from conftest import comparar_linhas, executar, ler_saidas
+
+# Processo residente (caged.residente): os meses ficam em memória até o limite de bytes, com descarte do
+# menos usado; uma execução pelo socket dá as mesmas saídas de caged.execucao e só reprocessa os arquivos
+# que mudaram; pedidos inválidos voltam como erro para o cliente, sem derrubar o processo
+
+
+def test_meses_residentes_descarte(tmp_path):
+    caminhos = []
+    for nome in ('a.txt', 'b.txt', 'c.txt'):
+        caminho = tmp_path / nome
+        caminho.write_text(nome, encoding='utf-8')
+        caminhos.append(str(caminho))
+    chaves = [MesesResidentes.chave(caminho, 'v1') for caminho in caminhos]
+    valor = 'x' * 1000
+
+    meses = MesesResidentes(limite=2500)
+    meses.guardar(chaves[0], valor, None)
+    meses.guardar(chaves[1], valor, None)
+    assert meses.obter(chaves[0]) == (valor, None)
+    # O terceiro mês passa do limite: sai o menos usado (b, porque a acabou de ser lido)
+    meses.guardar(chaves[2], valor, None)
+    assert meses.obter(chaves[1]) is None
+    assert meses.obter(chaves[0]) is not None and meses.obter(chaves[2]) is not None
+    estado = meses.estado()
+    assert [mes['arquivo'] for mes in estado['meses']] == ['a.txt', 'c.txt']
+    assert estado['bytes'] <= 2500 and estado['descartes'] == 1
+
+    # Um mês maior que o limite não fica em memória (e substitui a versão anterior da mesma chave)
+    meses.guardar(chaves[0], 'x' * 5000, None)
+    assert meses.obter(chaves[0]) is None
+    assert [mes['arquivo'] for mes in meses.estado()['meses']] == ['c.txt']
+
+    # A chave muda com o arquivo e com a versão das regras
+    assert MesesResidentes.chave(caminhos[0], 'v2') != chaves[0]
+    os.utime(caminhos[0], ns=(0, 0))
+    assert MesesResidentes.chave(caminhos[0], 'v1') != chaves[0]
+
+
+@pytest.fixture(scope='module')
+def residente(tmp_path_factory):
+    caminho_socket = str(tmp_path_factory.mktemp('residente') / 'residente.sock')
+    processador = ProcessadorResidente(trabalhadores=2)
+    servidor = ServidorResidente(processador, caminho_socket)
+    linha = threading.Thread(target=servidor.serve_forever, daemon=True)
+    linha.start()
+    yield caminho_socket
+    servidor.shutdown()
+    servidor.server_close()
+    processador.encerrar()
+
+
+def test_execucoes_no_residente(dados, tmp_path, residente):
+    executar(dados, '--backend', 'sequencial')
+    referencia = ler_saidas(dados)
+    shutil.copytree(os.path.join(dados, 'CAGEDMOV_downloads'), tmp_path / 'CAGEDMOV_downloads')
+    diretorio = str(tmp_path)
+
+    resposta = enviar({'acao': 'executar', 'argumentos': ['--tamanho-fatia', '1'], 'diretorio': diretorio}, residente)
+    assert resposta['ok'], resposta
+    assert '0 meses em memória, 2 a processar' in resposta['saida']
+    saidas = ler_saidas(diretorio)
+    for nome, linhas in referencia.items():
+        comparar_linhas(saidas[nome], linhas, nome)
+
+    # Nada mudou: os dois meses vêm da memória, com as mesmas saídas
+    resposta = enviar({'acao': 'executar', 'argumentos': [], 'diretorio': diretorio}, residente)
+    assert '2 meses em memória, 0 a processar' in resposta['saida']
+    assert ler_saidas(diretorio) == saidas
+
+    # Um arquivo alterado é processado de novo
+    os.utime(tmp_path / 'CAGEDMOV_downloads' / 'CAGEDMOV202101.txt')
+    resposta = enviar({'acao': 'executar', 'argumentos': [], 'diretorio': diretorio}, residente)
+    assert '1 meses em memória, 1 a processar' in resposta['saida']
+    estado = enviar({'acao': 'estado'}, residente)
+    assert estado['execucoes'] >= 3 and estado['memoria']['acertos'] >= 3
+
+
+def test_pedidos_invalidos(tmp_path, residente):
+    resposta = enviar({'acao': 'executar', 'argumentos': ['--motor', 'inexistente'], 'diretorio': str(tmp_path)},
+                      residente)
+    assert not resposta['ok'] and 'inexistente' in resposta['saida']
+    resposta = enviar({'acao': 'reiniciar'}, residente)
+    assert not resposta['ok'] and 'reiniciar' in resposta['erro']
+    # Pedido sem o diretório: o erro volta para o cliente
+    resposta = enviar({'acao': 'executar'}, residente)
+    assert not resposta['ok'] and 'KeyError' in resposta['erro']
+    assert enviar({'acao': 'estado'}, residente)['ok']
+
+
+def test_socket_em_uso(residente):
+    with pytest.raises(RuntimeError, match='Já existe'):
+        ServidorResidente(None, residente)
+
+
+def test_socket_antigo_removido(tmp_path):
+    import socket
+
+    caminho_socket = str(tmp_path / 'antigo.sock')
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as antigo:
+        antigo.bind(caminho_socket)
+    assert os.path.exists(caminho_socket)
+    servidor = ServidorResidente(None, caminho_socket)
+    servidor.server_close()
+    assert not os.path.exists(caminho_socket)
@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+from caged.estatisticas import AgregadoParcial
+from caged.saida import EscritorSaidas
+from conftest import SAIDAS, ler_csv
+
+# Escritor das saídas: meses entregues fora de ordem produzem os mesmos arquivos da entrega em ordem, e
+# os adiantados vão para arquivos temporários em vez de ficarem guardados na memória
+
+FAIXAS = ['18-29', '30-39']
+DATAS = ['2021-01-01', '2021-02-01', '2021-03-01', '2021-04-01']
+
+
+def _agregado(mes):
+    agregado = AgregadoParcial()
+    for i in range(mes + 2):
+        agregado.registrar(f'47{mes}{i:04d}', f'41{i:04d}', 1000.0 * (mes + i + 1), 25 + i, FAIXAS[i % 2])
+    return agregado
+
+
+# Diretórios de saída relativos ao diretório do teste, como na linha de comando
+@pytest.fixture(autouse=True)
+def no_diretorio(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+
+def _escrever(diretorio, ordem):
+    with EscritorSaidas(DATAS, FAIXAS, diretorio=diretorio) as escritor:
+        for i in ordem:
+            escritor.concluir(DATAS[i], _agregado(i))
+            # Nenhum agregado fica guardado: só os arquivos temporários dos meses adiantados
+            assert all(isinstance(arquivos, dict) for arquivos in escritor.adiantados.values())
+    assert not escritor.adiantados
+    return {nome: ler_csv(os.path.join(diretorio, nome)) for nome in SAIDAS}
+
+
+@pytest.mark.parametrize('ordem', [[3, 2, 1, 0], [1, 3, 0, 2], [2, 0, 1, 3]])
+def test_meses_fora_de_ordem(ordem):
+    esperado = _escrever('ordem', range(len(DATAS)))
+    assert _escrever('fora', ordem) == esperado
+    assert [linha['id'] for linha in esperado[SAIDAS[0]]] == [str(i) for i in range(1, len(esperado[SAIDAS[0]]) + 1)]
+    assert sorted(os.listdir('fora')) == sorted(SAIDAS)
+
+
+def test_mes_sem_agregado():
+    # O mês 2021-02-01 nunca chega: os seguintes são escritos ao fechar
+    saidas = _escrever('saidas', [3, 2, 0])
+    assert sorted({linha['date'] for linha in saidas[SAIDAS[0]]}) == [DATAS[0], DATAS[2], DATAS[3]]
+
+
+def test_falha_remove_temporarios():
+    with pytest.raises(RuntimeError):
+        with EscritorSaidas(DATAS, FAIXAS, diretorio='saidas') as escritor:
+            escritor.concluir(DATAS[2], _agregado(2))
+            escritor.concluir(DATAS[0], _agregado(0))
+            raise RuntimeError('falha antes do fim')
+    assert os.listdir('saidas') == []